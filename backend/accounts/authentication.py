@@ -0,0 +1,166 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_RECHECK_SECONDS = 2
+VERSION_KEY = 'accounts:auth-version:{user_id}'
+# User fields whose change must revoke cached tokens.
+AUTH_FIELDS = ('password', 'is_active')
+
+
+class TokenCache:
+	"""Per-process LRU of resolved tokens, revoked through a shared per-user version stamp.
+
+	Revocations drop the entries in the worker that made them at once. Other
+	workers read the stamp again once an entry is ``recheck`` seconds old, so
+	hits in between cost no query.
+	"""
+
+	def __init__(
+		self,
+		max_entries: int = DEFAULT_MAX_ENTRIES,
+		ttl: float = DEFAULT_TTL_SECONDS,
+		recheck: float = DEFAULT_RECHECK_SECONDS,
+	):
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.recheck = recheck
+		self._lock = threading.Lock()
+		# token key -> (version, expires_at, checked_at, user, token)
+		self._entries: 'OrderedDict[str, Tuple[int, float, float, object, Token]]' = OrderedDict()
+
+	@staticmethod
+	def version(user_id: int) -> int:
+		return cache.get(VERSION_KEY.format(user_id=user_id), 0)
+
+	def get(self, key: str) -> Optional[Tuple[object, Token]]:
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				return None
+			self._entries.move_to_end(key)
+		version, expires_at, checked_at, user, token = entry
+		now = time.monotonic()
+		if expires_at <= now:
+			self.discard(key)
+			return None
+		if now - checked_at >= self.recheck:
+			if version != self.version(user.pk):
+				self.discard(key)
+				return None
+			with self._lock:
+				if self._entries.get(key) is entry:
+					self._entries[key] = (version, expires_at, now, user, token)
+		return user, token
+
+	def set(self, key: str, version: int, user, token: Token) -> None:
+		now = time.monotonic()
+		with self._lock:
+			self._entries[key] = (version, now + self.ttl, now, user, token)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def discard(self, key: str) -> None:
+		with self._lock:
+			self._entries.pop(key, None)
+
+	def revoke_user(self, user_id: int) -> None:
+		self._bump(user_id)
+		# Signals fire before the change commits. Bump again afterwards, so an
+		# entry built from the old row after the first bump is stale as well.
+		transaction.on_commit(lambda: self._bump(user_id))
+
+	def _bump(self, user_id: int) -> None:
+		key = VERSION_KEY.format(user_id=user_id)
+		if not cache.add(key, 1, timeout=None):
+			try:
+				cache.incr(key)
+			except ValueError:
+				cache.set(key, 1, timeout=None)
+		with self._lock:
+			stale = [token_key for token_key, entry in self._entries.items() if entry[3].pk == user_id]
+			for token_key in stale:
+				del self._entries[token_key]
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+
+
+token_cache = TokenCache(
+	max_entries=getattr(settings, 'AUTH_TOKEN_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+	ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', DEFAULT_TTL_SECONDS),
+	recheck=getattr(settings, 'AUTH_TOKEN_CACHE_RECHECK', DEFAULT_RECHECK_SECONDS),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+	"""Drop-in ``TokenAuthentication`` that skips the token/user join on cache hits."""
+
+	def authenticate_credentials(self, key):
+		cached = token_cache.get(key)
+		if cached is not None:
+			user, token = cached
+			return copy.copy(user), token
+
+		token = Token.objects.select_related('user').filter(key=key).first()
+		if token is None:
+			raise exceptions.AuthenticationFailed(_('Invalid token.'))
+		if not token.user.is_active:
+			raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+		# Take the stamp after the read: a revoke that raced the read either is
+		# visible in it or bumps the stamp past this entry once it commits.
+		token_cache.set(key, token_cache.version(token.user_id), token.user, token)
+		return copy.copy(token.user), token
+
+
+def revoke_on_token_delete(sender, instance, **kwargs):
+	token_cache.revoke_user(instance.user_id)
+
+
+def auth_state(user) -> Tuple:
+	# Read __dict__ so deferred fields are not loaded just to be remembered.
+	return tuple(user.__dict__.get(field) for field in AUTH_FIELDS)
+
+
+def remember_auth_state(sender, instance, **kwargs):
+	instance._token_auth_state = auth_state(instance)
+
+
+def revoke_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+	"""Revoke cached tokens when the password or ``is_active`` changed.
+
+	Other saves, such as the ``last_login`` update on every login, keep them.
+	"""
+	previous = getattr(instance, '_token_auth_state', None)
+	instance._token_auth_state = auth_state(instance)
+	if created:
+		return
+	if update_fields is not None and not set(AUTH_FIELDS) & set(update_fields):
+		return
+	if previous == instance._token_auth_state:
+		return
+	token_cache.revoke_user(instance.pk)
+
+
+def connect_signals():
+	post_delete.connect(revoke_on_token_delete, sender=Token, dispatch_uid='accounts.revoke_on_token_delete')
+	post_init.connect(remember_auth_state, sender=User, dispatch_uid='accounts.remember_auth_state')
+	post_save.connect(revoke_on_user_save, sender=User, dispatch_uid='accounts.revoke_on_user_save')
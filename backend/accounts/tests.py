@@ -1,3 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .authentication import CachedTokenAuthentication, TokenCache, token_cache
+
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTests(TestCase):
+	def setUp(self):
+		# Per-process caches outlive the rolled back test transactions.
+		token_cache.clear()
+		self.user = User.objects.create_user('alice')
+		self.token = Token.objects.create(user=self.user)
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+	def me(self):
+		return self.client.get('/api/auth/me/')
+
+	def test_cached_token_is_used_without_a_query(self):
+		self.assertEqual(self.me().status_code, 200)
+		with self.assertNumQueries(0):
+			user, token = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+		self.assertEqual((user, token), (self.user, self.token))
+
+	def test_unknown_token(self):
+		self.client.credentials(HTTP_AUTHORIZATION='Token nope')
+		self.assertEqual(self.me().status_code, 401)
+
+	def test_deleted_token_is_rejected(self):
+		self.assertEqual(self.me().status_code, 200)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.token.delete()
+		self.assertEqual(self.me().status_code, 401)
+
+	def test_deactivated_user_is_rejected(self):
+		self.assertEqual(self.me().status_code, 200)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.user.is_active = False
+			self.user.save()
+		self.assertEqual(self.me().status_code, 401)
+
+	def test_password_change_revokes(self):
+		self.me()
+		self.user.set_password('new-password-1')
+		self.user.save(update_fields=['password'])
+		self.assertIsNone(token_cache.get(self.token.key))
+
+	def test_other_saves_keep_cached_tokens(self):
+		self.me()
+		update_last_login(None, self.user)
+		self.user.first_name = 'Alice'
+		self.user.save()
+		self.assertIsNotNone(token_cache.get(self.token.key))
+
+	def test_other_workers_see_revocation_on_recheck(self):
+		key = self.token.key
+		other_worker = TokenCache(recheck=60)
+		other_worker.set(key, other_worker.version(self.user.pk), self.user, self.token)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.token.delete()
+		# Only the shared stamp tells the other worker about the revocation.
+		self.assertIsNotNone(other_worker.get(key))
+		other_worker.recheck = 0
+		self.assertIsNone(other_worker.get(key))
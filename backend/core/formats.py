@@ -0,0 +1,45 @@
+"""MessagePack renderer and parser for the REST API.
+
+Clients opt in with ``Accept: application/msgpack`` (or ``?format=msgpack``)
+and may send request bodies as ``Content-Type: application/msgpack``. JSON
+stays the default. Both classes need the optional ``msgpack`` package; the
+settings only enable them when it is installed.
+"""
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # Only negotiated when installed; see REST_FRAMEWORK in settings.
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    # Types msgpack cannot pack natively (dates, decimals, UUIDs, lazy strings)
+    # get the same representation the JSON renderer gives them.
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self._encoder.default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except ValueError as exc:  # Every msgpack decoding error subclasses ValueError.
+            raise ParseError(f'MessagePack parse error - {exc or "malformed data"}') from exc
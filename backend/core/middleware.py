@@ -0,0 +1,137 @@
+"""Brotli/gzip response compression.
+
+Works like Django's ``GZipMiddleware``, with two differences. Brotli is
+preferred when the client accepts it and the optional ``brotli`` package is
+installed. Bodies smaller than ``RESPONSE_COMPRESSION_MIN_BYTES`` are left
+alone, since compressing them costs more CPU than it saves on the wire.
+Streaming responses are compressed chunk by chunk and flushed after each
+chunk, so clients keep receiving data as it is produced.
+"""
+
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available.
+    brotli = None
+
+DEFAULT_MIN_BYTES = 1024
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each listed content coding to its q-value."""
+    accepted = {}
+    for part in header.split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted
+
+
+class StreamCompressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(chunk) + self._brotli.flush()
+        return self._zlib.compress(chunk) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_bytes = getattr(settings, 'RESPONSE_COMPRESSION_MIN_BYTES', DEFAULT_MIN_BYTES)
+        self.gzip_level = getattr(settings, 'RESPONSE_COMPRESSION_GZIP_LEVEL', DEFAULT_GZIP_LEVEL)
+        self.brotli_quality = getattr(settings, 'RESPONSE_COMPRESSION_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY)
+        self.encodings: Tuple[str, ...] = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def choose_encoding(self, request) -> Optional[str]:
+        accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding in self.encodings:
+            if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+                return encoding
+        return None
+
+    def compressor(self, encoding: str) -> StreamCompressor:
+        return StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+
+    def process_response(self, request, response):
+        if self.min_bytes < 0 or response.has_header('Content-Encoding'):
+            return response
+        if response.status_code == 304:
+            # Answer with the validator the client holds, which is the weak one
+            # when it came from a compressed 200.
+            etag = response.get('ETag')
+            if etag and etag.startswith('"') and f'W/{etag}' in request.META.get('HTTP_IF_NONE_MATCH', ''):
+                response.headers['ETag'] = 'W/' + etag
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+        if not response.streaming and len(response.content) < self.min_bytes:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.compress_async(encoding, response.streaming_content)
+            else:
+                response.streaming_content = self.compress_sequence(encoding, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressor = self.compressor(encoding)
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The representation changed, so a strong validator no longer applies.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress_sequence(self, encoding: str, chunks: Iterable[bytes]):
+        compressor = self.compressor(encoding)
+        for chunk in chunks:
+            if chunk:
+                yield compressor.compress(chunk)
+        yield compressor.finish()
+
+    async def compress_async(self, encoding: str, chunks):
+        compressor = self.compressor(encoding)
+        async for chunk in chunks:
+            if chunk:
+                yield compressor.compress(chunk)
+        yield compressor.finish()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import importlib.util
 import os
 from pathlib import Path
 
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -131,15 +133,94 @@ USE_TZ = True
 STATIC_URL = 'static/'
 
 
+# MessagePack (application/msgpack) is negotiated alongside JSON when the optional
+# `msgpack` package is installed.
+MSGPACK_ENABLED = importlib.util.find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # JSON stays first, so it is the default for clients that accept anything.
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        *(['core.formats.MessagePackRenderer'] if MSGPACK_ENABLED else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        *(['core.formats.MessagePackParser'] if MSGPACK_ENABLED else []),
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Responses at least this large are compressed (brotli if the `brotli` package is
+# installed and the client accepts it, gzip otherwise); -1 disables compression.
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+RESPONSE_COMPRESSION_GZIP_LEVEL = 6
+RESPONSE_COMPRESSION_BROTLI_QUALITY = 4
+
+# Pub/sub backend used to push new messages to WebSocket subscribers.
+MESSAGING_REALTIME_BROKER = os.environ.get('MESSAGING_REALTIME_BROKER', 'messaging.realtime.InProcessBroker')
+
+# Limits for POST /api/messages/<username>/import/; larger uploads get 413.
+MESSAGE_IMPORT_MAX_BYTES = int(os.environ.get('MESSAGE_IMPORT_MAX_BYTES', str(64 * 1024 * 1024)))
+MESSAGE_IMPORT_MAX_RECORDS = int(os.environ.get('MESSAGE_IMPORT_MAX_RECORDS', '100000'))
+
+# The token, friend-set and encryption-mode caches below keep their entries in
+# each worker's memory and revoke them through version stamps in the default
+# cache, so that cache must be shared by every worker. Redis when REDIS_URL is
+# set, otherwise a table in the main database (`manage.py createcachetable`).
+# Workers read a stamp at most every *_RECHECK seconds, so hits stay off both.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+# Per-process cache of resolved auth tokens. A token deleted or a user
+# deactivated through another worker stops working within
+# AUTH_TOKEN_CACHE_RECHECK seconds; in the same worker at once.
+AUTH_TOKEN_CACHE_MAX_ENTRIES = 10_000
+AUTH_TOKEN_CACHE_TTL = 300
+AUTH_TOKEN_CACHE_RECHECK = 2
+
+# Per-process friend-set cache; friendship changes made through other workers
+# are seen within FRIENDSHIP_CACHE_RECHECK seconds.
+FRIENDSHIP_CACHE_MAX_ENTRIES = 10_000
+FRIENDSHIP_CACHE_TTL = 300
+FRIENDSHIP_CACHE_RECHECK = 2
+
+# Seconds a worker may serve the active encryption mode from memory; a lost
+# version bump is not noticed for longer than this. Mode changes made through
+# other workers are seen within ENCRYPTION_MODE_CACHE_RECHECK seconds.
+ENCRYPTION_MODE_CACHE_TTL = 60
+ENCRYPTION_MODE_CACHE_RECHECK = 2
+
+# Base64 X25519 keys for the END_TO_END codec. Both are required: selecting or
+# re-encrypting into END_TO_END without them raises ImproperlyConfigured.
+ENCRYPTION_E2E_PRIVATE_KEY = os.environ.get('ENCRYPTION_E2E_PRIVATE_KEY', '')
+ENCRYPTION_E2E_PEER_PUBLIC_KEY = os.environ.get('ENCRYPTION_E2E_PEER_PUBLIC_KEY', '')
+
+# Cover image for END_TO_END_STEGO (needs NumPy and Pillow as well). Deterministic
+# noise is used when unset; 1, 2 or 4 low bits of every channel carry the payload.
+ENCRYPTION_STEGO_COVER = os.environ.get('ENCRYPTION_STEGO_COVER', '')
+ENCRYPTION_STEGO_BITS_PER_SAMPLE = int(os.environ.get('ENCRYPTION_STEGO_BITS_PER_SAMPLE', '1'))
+
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
     'http://localhost:5174',
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class EncryptionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'encryption'
+
+    def ready(self):
+        from .services import connect_signals
+
+        connect_signals()
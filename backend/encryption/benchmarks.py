@@ -0,0 +1,190 @@
+"""Throughput, latency and memory benchmarks for the registered codecs.
+
+Each case encrypts and then decrypts ``batch`` messages of ``size`` bytes with
+one codec. A batch of one goes through ``encrypt``/``decrypt``, larger batches
+through ``encrypt_many``/``decrypt_many``. Calls repeat until both
+``min_runs`` and ``min_time`` are reached. Peak memory comes from a separate,
+untimed pass under ``tracemalloc``, so tracing does not distort the timings.
+"""
+
+import base64
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.utils import timezone
+
+from .codecs import Codec, available_modes, get_codec, np
+
+DEFAULT_SIZES = (16, 256, 4096, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024)
+DEFAULT_BATCH_SIZES = (1, 16, 256)
+# Cases whose batch holds more plaintext than this are skipped.
+DEFAULT_MAX_BATCH_BYTES = 64 * 1024 * 1024
+PERCENTILES = (50, 95, 99)
+OPERATIONS = ('encrypt', 'decrypt')
+
+CaseKey = Tuple[str, int, int, str]
+
+
+@dataclass
+class BenchmarkResult:
+    mode: str
+    size: int
+    batch: int
+    operation: str
+    runs: int
+    mb_per_s: float
+    latency_us: Dict[str, float] = field(default_factory=dict)
+    peak_bytes: int = 0
+
+    @property
+    def key(self) -> CaseKey:
+        return self.mode, self.size, self.batch, self.operation
+
+
+def sample_message(size: int, seed: int = 0) -> str:
+    """``size`` bytes of printable ASCII, the same for a given ``seed``."""
+    raw = random.Random(seed).randbytes(math.ceil(size * 3 / 4) + 3)
+    return base64.b64encode(raw).decode('ascii')[:size]
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _calls(codec: Codec, batch: int) -> Tuple[Callable, Callable]:
+    if batch == 1:
+        return (lambda messages: codec.encrypt(messages[0])), (lambda ciphertexts: codec.decrypt(ciphertexts[0]))
+    return codec.encrypt_many, codec.decrypt_many
+
+
+def _peak_bytes(call: Callable, argument) -> int:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        call(argument)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(
+    codec: Codec,
+    size: int,
+    batch: int,
+    min_runs: int = 3,
+    min_time: float = 0.2,
+    max_runs: int = 1000,
+    measure_memory: bool = True,
+) -> List[BenchmarkResult]:
+    messages = [sample_message(size, seed=index) for index in range(batch)]
+    encrypt, decrypt = _calls(codec, batch)
+    ciphertexts = codec.encrypt_many(messages)
+    timings: Dict[str, List[float]] = {operation: [] for operation in OPERATIONS}
+
+    started = time.perf_counter()
+    while len(timings['encrypt']) < max_runs and (
+        len(timings['encrypt']) < min_runs or time.perf_counter() - started < min_time
+    ):
+        before = time.perf_counter()
+        encrypt(messages)
+        middle = time.perf_counter()
+        decrypt(ciphertexts)
+        timings['encrypt'].append(middle - before)
+        timings['decrypt'].append(time.perf_counter() - middle)
+
+    results = []
+    megabytes = size * batch / (1024 * 1024)
+    for operation, call, argument in (('encrypt', encrypt, messages), ('decrypt', decrypt, ciphertexts)):
+        samples = timings[operation]
+        total = sum(samples)
+        latency = {f'p{q}': percentile(samples, q) * 1e6 for q in PERCENTILES}
+        latency['mean'] = total / len(samples) * 1e6
+        results.append(BenchmarkResult(
+            mode=str(codec.mode),
+            size=size,
+            batch=batch,
+            operation=operation,
+            runs=len(samples),
+            mb_per_s=megabytes * len(samples) / total if total else 0.0,
+            latency_us=latency,
+            peak_bytes=_peak_bytes(call, argument) if measure_memory else 0,
+        ))
+    return results
+
+
+def run_suite(
+    modes: Optional[Iterable[str]] = None,
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    progress: Optional[Callable[[BenchmarkResult], None]] = None,
+    **case_options,
+) -> List[BenchmarkResult]:
+    results = []
+    for mode in modes or available_modes():
+        codec = get_codec(mode)
+        if codec is None:
+            raise ValueError(f'No codec is registered for mode {mode!r}.')
+        for size in sizes:
+            for batch in batch_sizes:
+                if size * batch > max_batch_bytes:
+                    continue
+                for result in run_case(codec, size, batch, **case_options):
+                    results.append(result)
+                    if progress is not None:
+                        progress(result)
+    return results
+
+
+def environment() -> Dict[str, object]:
+    return {
+        'created_at': timezone.now().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__ if np is not None else None,
+        'modes': available_modes(),
+    }
+
+
+def to_report(results: Sequence[BenchmarkResult]) -> Dict[str, object]:
+    return {'environment': environment(), 'results': [asdict(result) for result in results]}
+
+
+def from_report(report: Dict[str, object]) -> List[BenchmarkResult]:
+    return [BenchmarkResult(**entry) for entry in report.get('results', [])]
+
+
+@dataclass
+class Comparison:
+    key: CaseKey
+    baseline_mb_per_s: float
+    current_mb_per_s: float
+
+    @property
+    def change(self) -> float:
+        """Relative throughput change; negative is slower than the baseline."""
+        if not self.baseline_mb_per_s:
+            return 0.0
+        return self.current_mb_per_s / self.baseline_mb_per_s - 1
+
+
+def compare(baseline: Sequence[BenchmarkResult], current: Sequence[BenchmarkResult]) -> List[Comparison]:
+    """Pair up cases present in both runs."""
+    previous = {result.key: result for result in baseline}
+    return [
+        Comparison(key=result.key, baseline_mb_per_s=previous[result.key].mb_per_s, current_mb_per_s=result.mb_per_s)
+        for result in current
+        if result.key in previous
+    ]
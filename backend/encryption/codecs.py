@@ -0,0 +1,296 @@
+"""Cipher codecs, one class per ``EncryptionSetting.EncryptionMode``.
+
+``get_codec`` builds each codec once per process, so key schedules, keystreams
+and cipher contexts are prepared up front and per-message work is only the
+cipher itself. A new mode plugs in by subclassing ``Codec`` and decorating it
+with ``register``. Every mode has a codec; one whose keys or packages are
+missing raises ``ImproperlyConfigured`` when it is built rather than storing
+messages under a weaker cipher.
+"""
+
+import base64
+import binascii
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Type
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import EncryptionSetting
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; big-int XOR is the fallback.
+    np = None
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+    from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:  # END_TO_END raises ImproperlyConfigured when it is used without it.
+    X25519PrivateKey = None
+
+try:
+    from . import stego
+except ImportError:  # END_TO_END_STEGO raises ImproperlyConfigured when used without NumPy.
+    stego = None
+
+Mode = EncryptionSetting.EncryptionMode
+
+WEAK_XOR_KEY = b"stego-key"
+# Below this size converting to and from NumPy arrays costs more than it saves.
+NUMPY_MIN_BYTES = 4096
+# Longest keystream a WEAK_XOR codec keeps; longer buffers tile the key on demand.
+KEYSTREAM_CACHE_BYTES = 1024 * 1024
+
+
+class CodecError(ValueError):
+    """Raised when a ciphertext cannot be decoded or fails authentication."""
+
+
+class Codec:
+    mode: str = ''
+
+    def encrypt(self, message: str) -> str:
+        raise NotImplementedError
+
+    def decrypt(self, ciphertext: str) -> str:
+        raise NotImplementedError
+
+    def encrypt_many(self, messages: Sequence[str]) -> List[str]:
+        return [self.encrypt(message) for message in messages]
+
+    def decrypt_many(self, ciphertexts: Sequence[str]) -> List[str]:
+        return [self.decrypt(ciphertext) for ciphertext in ciphertexts]
+
+
+_registry: Dict[str, Type[Codec]] = {}
+
+
+def register(codec_class: Type[Codec]) -> Type[Codec]:
+    _registry[codec_class.mode] = codec_class
+    return codec_class
+
+
+@lru_cache(maxsize=None)
+def get_codec(mode: str) -> Optional[Codec]:
+    """Shared codec instance for ``mode``, or None when no codec is registered for it.
+
+    Raises ``ImproperlyConfigured`` when the mode's keys or packages are missing.
+    """
+    codec_class = _registry.get(mode)
+    return codec_class() if codec_class is not None else None
+
+
+def registered_modes() -> List[str]:
+    return sorted(str(mode) for mode in _registry)
+
+
+def available_modes() -> List[str]:
+    """Registered modes whose codec can be built with the current settings and packages."""
+    modes = []
+    for mode in registered_modes():
+        try:
+            get_codec(mode)
+        except ImproperlyConfigured:
+            continue
+        modes.append(mode)
+    return modes
+
+
+def reset_codecs() -> None:
+    """Drop the built codecs, e.g. after changing key settings."""
+    get_codec.cache_clear()
+
+
+def tile_key(key: bytes, length: int) -> bytes:
+    repeats, remainder = divmod(length, len(key))
+    return key * repeats + key[:remainder]
+
+
+def xor_with_stream(data: bytes, stream: bytes) -> bytes:
+    """XOR two equally long buffers in a single C-level operation."""
+    if np is not None and len(data) >= NUMPY_MIN_BYTES:
+        return np.bitwise_xor(np.frombuffer(data, dtype=np.uint8), np.frombuffer(stream, dtype=np.uint8)).tobytes()
+    mixed = int.from_bytes(data, 'little') ^ int.from_bytes(stream, 'little')
+    return mixed.to_bytes(len(data), 'little')
+
+
+@register
+class PlaintextCodec(Codec):
+    mode = Mode.PLAINTEXT
+
+    def encrypt(self, message: str) -> str:
+        return message
+
+    def decrypt(self, ciphertext: str) -> str:
+        return ciphertext
+
+    def encrypt_many(self, messages: Sequence[str]) -> List[str]:
+        return list(messages)
+
+    def decrypt_many(self, ciphertexts: Sequence[str]) -> List[str]:
+        return list(ciphertexts)
+
+
+@register
+class WeakXorCodec(Codec):
+    mode = Mode.WEAK_XOR
+
+    def __init__(self, key: bytes = WEAK_XOR_KEY):
+        self.key = key
+        self._stream = tile_key(key, NUMPY_MIN_BYTES)
+
+    def keystream(self, length: int) -> bytes:
+        stream = self._stream
+        if len(stream) >= length:
+            return stream[:length]
+        stream = tile_key(self.key, length)
+        if length <= KEYSTREAM_CACHE_BYTES:
+            self._stream = stream
+        return stream
+
+    def xor(self, data: bytes) -> bytes:
+        return xor_with_stream(data, self.keystream(len(data))) if data else b''
+
+    def xor_many(self, chunks: Sequence[bytes]) -> List[bytes]:
+        """XOR each chunk with the key restarted at offset 0, in one pass over the joined buffer."""
+        if not chunks:
+            return []
+        joined = b''.join(chunks)
+        mixed = xor_with_stream(joined, b''.join(self.keystream(len(chunk)) for chunk in chunks)) if joined else b''
+        results = []
+        offset = 0
+        for chunk in chunks:
+            results.append(mixed[offset:offset + len(chunk)])
+            offset += len(chunk)
+        return results
+
+    def encrypt(self, message: str) -> str:
+        return base64.b64encode(self.xor(message.encode('utf-8'))).decode('ascii')
+
+    def decrypt(self, ciphertext: str) -> str:
+        return self.xor(base64.b64decode(ciphertext.encode('ascii'))).decode('utf-8')
+
+    def encrypt_many(self, messages: Sequence[str]) -> List[str]:
+        xored = self.xor_many([message.encode('utf-8') for message in messages])
+        return [base64.b64encode(chunk).decode('ascii') for chunk in xored]
+
+    def decrypt_many(self, ciphertexts: Sequence[str]) -> List[str]:
+        plain = self.xor_many([base64.b64decode(ciphertext.encode('ascii')) for ciphertext in ciphertexts])
+        return [chunk.decode('utf-8') for chunk in plain]
+
+
+def _setting_key(name: str) -> bytes:
+    value = getattr(settings, name, '')
+    if not value:
+        raise ImproperlyConfigured(f'{name} must be set to use the END_TO_END modes.')
+    try:
+        key = base64.b64decode(value, validate=True)
+    except binascii.Error as exc:
+        raise ImproperlyConfigured(f'{name} is not valid base64.') from exc
+    if len(key) != 32:
+        raise ImproperlyConfigured(f'{name} must be 32 bytes, base64 encoded.')
+    return key
+
+
+@register
+class EndToEndCodec(Codec):
+    """X25519 key agreement with ChaCha20-Poly1305 authenticated encryption.
+
+    The shared secret of the local private key and the peer's public key goes
+    through HKDF-SHA256 once, when the codec is built. After that each message
+    only draws a random 96-bit nonce and seals with the reusable AEAD context.
+    Ciphertexts are base64 of ``version | nonce | ciphertext + tag``, and the
+    mode name is bound in as associated data. Both keys come from settings
+    unless passed in; there is no fallback key.
+    """
+
+    mode = Mode.END_TO_END
+    version = 1
+    nonce_size = 12
+    tag_size = 16
+    info = b'crypto-chat end-to-end v1'
+
+    def __init__(
+        self,
+        private_key: Optional[bytes] = None,
+        peer_public_key: Optional[bytes] = None,
+        associated_data: Optional[bytes] = None,
+    ):
+        if X25519PrivateKey is None:
+            raise ImproperlyConfigured('The END_TO_END modes need the cryptography package.')
+        local = X25519PrivateKey.from_private_bytes(private_key or _setting_key('ENCRYPTION_E2E_PRIVATE_KEY'))
+        peer = X25519PublicKey.from_public_bytes(peer_public_key or _setting_key('ENCRYPTION_E2E_PEER_PUBLIC_KEY'))
+        shared = local.exchange(peer)
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=self.info).derive(shared)
+        self._aead = ChaCha20Poly1305(key)
+        self._associated_data = associated_data or str(self.mode).encode('ascii')
+        self._header = bytes([self.version])
+
+    def seal(self, plaintext: bytes) -> bytes:
+        nonce = os.urandom(self.nonce_size)
+        return self._header + nonce + self._aead.encrypt(nonce, plaintext, self._associated_data)
+
+    def open(self, data: bytes) -> bytes:
+        if len(data) < 1 + self.nonce_size + self.tag_size or data[:1] != self._header:
+            raise CodecError('Unsupported END_TO_END ciphertext format.')
+        nonce = data[1:1 + self.nonce_size]
+        try:
+            return self._aead.decrypt(nonce, data[1 + self.nonce_size:], self._associated_data)
+        except InvalidTag as exc:
+            raise CodecError('END_TO_END ciphertext failed authentication.') from exc
+
+    def encrypt(self, message: str) -> str:
+        return base64.b64encode(self.seal(message.encode('utf-8'))).decode('ascii')
+
+    def decrypt(self, ciphertext: str) -> str:
+        return self.open(_strict_b64decode(ciphertext)).decode('utf-8')
+
+
+@register
+class EndToEndStegoCodec(Codec):
+    """END_TO_END ciphertext hidden in the low bits of a PNG cover image.
+
+    The cover is loaded once from ``ENCRYPTION_STEGO_COVER`` (deterministic
+    noise when unset). Each message uses the smallest band of cover rows that
+    holds it. Ciphertexts are the base64 PNG.
+    """
+
+    mode = Mode.END_TO_END_STEGO
+
+    def __init__(self):
+        if stego is None or stego.Image is None:
+            raise ImproperlyConfigured('END_TO_END_STEGO needs the numpy and Pillow packages.')
+        self._cipher = EndToEndCodec(associated_data=str(self.mode).encode('ascii'))
+        self._cover = stego.load_cover(getattr(settings, 'ENCRYPTION_STEGO_COVER', ''))
+        self.bits_per_sample = getattr(settings, 'ENCRYPTION_STEGO_BITS_PER_SAMPLE', 1)
+        if self.bits_per_sample not in stego.SUPPORTED_BITS:
+            raise ImproperlyConfigured(
+                f'ENCRYPTION_STEGO_BITS_PER_SAMPLE must be one of {stego.SUPPORTED_BITS}, '
+                f'not {self.bits_per_sample!r}.'
+            )
+
+    def encrypt(self, message: str) -> str:
+        sealed = self._cipher.seal(message.encode('utf-8'))
+        cover = stego.fit_cover(self._cover, len(sealed), self.bits_per_sample)
+        image = stego.embed(cover, sealed, self.bits_per_sample)
+        return base64.b64encode(stego.to_png(image)).decode('ascii')
+
+    def decrypt(self, ciphertext: str) -> str:
+        try:
+            image = stego.from_png(_strict_b64decode(ciphertext))
+            sealed = stego.extract(image, self.bits_per_sample)
+        except (OSError, stego.CapacityError) as exc:
+            raise CodecError('END_TO_END_STEGO ciphertext is not a valid stego image.') from exc
+        return self._cipher.open(sealed).decode('utf-8')
+
+
+def _strict_b64decode(ciphertext: str) -> bytes:
+    try:
+        return base64.b64decode(ciphertext.encode('ascii'), validate=True)
+    except (binascii.Error, UnicodeEncodeError) as exc:
+        raise CodecError('Ciphertext is not valid base64.') from exc
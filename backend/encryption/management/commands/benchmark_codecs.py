@@ -0,0 +1,120 @@
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from encryption import benchmarks
+from encryption.codecs import available_modes, get_codec, registered_modes
+
+
+def parse_size(value: str) -> int:
+    """Byte count with an optional K or M suffix, e.g. ``4K``."""
+    value = value.strip().upper()
+    multiplier = {'K': 1024, 'M': 1024 * 1024}.get(value[-1:], 1)
+    return int(value[:-1] if multiplier != 1 else value) * multiplier
+
+
+def parse_sizes(value: str):
+    return [parse_size(part) for part in value.split(',') if part.strip()]
+
+
+def format_size(size: int) -> str:
+    for unit, scale in (('M', 1024 * 1024), ('K', 1024)):
+        if size >= scale and size % scale == 0:
+            return f'{size // scale}{unit}'
+    return str(size)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every registered encryption codec across message and batch sizes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', help='Comma-separated modes. Default: every mode configured here.')
+        parser.add_argument('--sizes', default=','.join(format_size(size) for size in benchmarks.DEFAULT_SIZES))
+        parser.add_argument('--batch-sizes', default=','.join(str(batch) for batch in benchmarks.DEFAULT_BATCH_SIZES))
+        parser.add_argument(
+            '--max-batch-bytes',
+            type=parse_size,
+            default=benchmarks.DEFAULT_MAX_BATCH_BYTES,
+            help='Skip cases whose batch holds more plaintext than this.',
+        )
+        parser.add_argument('--min-runs', type=int, default=3)
+        parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds spent on each case.')
+        parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc peak memory pass.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Baseline JSON file from an earlier run.')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20.0,
+            help='Throughput drop, in percent, reported as a regression against --compare.',
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',')] if options['modes'] else available_modes()
+        unknown = sorted(set(modes) - set(registered_modes()))
+        if unknown:
+            raise CommandError(f'No codec is registered for: {", ".join(unknown)}.')
+        for mode in modes:
+            try:
+                get_codec(mode)
+            except ImproperlyConfigured as exc:
+                raise CommandError(f'{mode}: {exc}') from exc
+        try:
+            sizes = parse_sizes(options['sizes'])
+            batch_sizes = [int(batch) for batch in options['batch_sizes'].split(',') if batch.strip()]
+        except ValueError as exc:
+            raise CommandError(f'Invalid size list: {exc}') from exc
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as handle:
+                baseline = benchmarks.from_report(json.load(handle))
+
+        self.stdout.write(
+            f'{"mode":<18} {"size":>6} {"batch":>5} {"op":<7} {"MB/s":>10} '
+            f'{"p50 us":>11} {"p95 us":>11} {"p99 us":>11} {"peak KiB":>10}'
+        )
+        results = benchmarks.run_suite(
+            modes=modes,
+            sizes=sizes,
+            batch_sizes=batch_sizes,
+            max_batch_bytes=options['max_batch_bytes'],
+            progress=self.write_result,
+            min_runs=options['min_runs'],
+            min_time=options['min_time'],
+            measure_memory=not options['no_memory'],
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(benchmarks.to_report(results), handle, indent=2)
+            self.stdout.write(f'Wrote {len(results)} results to {options["output"]}.')
+
+        if baseline is not None:
+            self.report_comparison(benchmarks.compare(baseline, results), options)
+
+    def write_result(self, result: benchmarks.BenchmarkResult) -> None:
+        latency = result.latency_us
+        self.stdout.write(
+            f'{result.mode:<18} {format_size(result.size):>6} {result.batch:>5} {result.operation:<7} '
+            f'{result.mb_per_s:>10.1f} {latency["p50"]:>11.1f} {latency["p95"]:>11.1f} {latency["p99"]:>11.1f} '
+            f'{result.peak_bytes / 1024:>10.1f}'
+        )
+
+    def report_comparison(self, comparisons, options) -> None:
+        limit = -options['threshold'] / 100
+        regressions = [comparison for comparison in comparisons if comparison.change < limit]
+        self.stdout.write(f'Compared {len(comparisons)} cases against {options["compare"]}.')
+        for comparison in regressions:
+            mode, size, batch, operation = comparison.key
+            self.stdout.write(self.style.ERROR(
+                f'Regression: {mode} {format_size(size)} x{batch} {operation}: '
+                f'{comparison.baseline_mb_per_s:.1f} -> {comparison.current_mb_per_s:.1f} MB/s '
+                f'({comparison.change:+.0%})'
+            ))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f'No case is more than {options["threshold"]:g}% slower.'))
+        elif options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} cases regressed by more than {options["threshold"]:g}%.')
@@ -1,13 +1,11 @@
 from rest_framework import serializers
 
 from .models import EncryptionSetting
+from .services import CLIENT_MODES
 
 
 class EncryptionSettingSerializer(serializers.Serializer):
-    mode = serializers.ChoiceField(choices=[
-        EncryptionSetting.EncryptionMode.PLAINTEXT,
-        EncryptionSetting.EncryptionMode.WEAK_XOR,
-    ])
+    mode = serializers.ChoiceField(choices=list(CLIENT_MODES))
     updated_at = serializers.DateTimeField(read_only=True)
 
     def to_representation(self, instance: EncryptionSetting):
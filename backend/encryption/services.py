@@ -1,10 +1,26 @@
-import base64
-from dataclasses import dataclass
-from typing import Tuple
-
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from .codecs import WEAK_XOR_KEY, Codec, CodecError, get_codec  # noqa: F401 - re-exported
 from .models import EncryptionSetting
 
-WEAK_XOR_KEY = b"stego-key"
+MODE_VERSION_KEY = 'encryption:mode-version'
+DEFAULT_MODE_CACHE_TTL = 60
+DEFAULT_MODE_CACHE_RECHECK = 2
+# Modes the web client can decode (frontend/src/utils/encryption.ts). Messages
+# are returned as stored, so content in any other mode is unreadable to users.
+CLIENT_MODES = (
+    EncryptionSetting.EncryptionMode.PLAINTEXT,
+    EncryptionSetting.EncryptionMode.WEAK_XOR,
+)
 
 
 @dataclass(frozen=True)
@@ -13,11 +29,78 @@ class EncryptionResult:
     mode: str
 
 
+@dataclass(frozen=True)
+class _CachedSetting:
+    setting: EncryptionSetting
+    version: int
+    expires_at: float
+    checked_at: float
+
+
+_setting_cache: Optional[_CachedSetting] = None
+_setting_cache_lock = threading.Lock()
+
+
+def get_current_setting() -> EncryptionSetting:
+    """Return the active setting from a process-local cache.
+
+    The cached row is reused until the TTL elapses. The shared version stamp in
+    Django's cache is read at most every ``ENCRYPTION_MODE_CACHE_RECHECK``
+    seconds, so most requests touch neither the database nor the cache backend.
+    Callers must treat the row as read-only.
+    """
+    global _setting_cache
+    now = time.monotonic()
+    cached = _setting_cache
+    if cached is not None and cached.expires_at > now:
+        recheck = getattr(settings, 'ENCRYPTION_MODE_CACHE_RECHECK', DEFAULT_MODE_CACHE_RECHECK)
+        if now - cached.checked_at < recheck:
+            return cached.setting
+        version = cache.get(MODE_VERSION_KEY, 0)
+        if cached.version == version:
+            with _setting_cache_lock:
+                _setting_cache = replace(cached, checked_at=now)
+            return cached.setting
+    else:
+        version = cache.get(MODE_VERSION_KEY, 0)
+
+    setting = EncryptionSetting.get_solo()
+    ttl = getattr(settings, 'ENCRYPTION_MODE_CACHE_TTL', DEFAULT_MODE_CACHE_TTL)
+    with _setting_cache_lock:
+        _setting_cache = _CachedSetting(setting=setting, version=version, expires_at=now + ttl, checked_at=now)
+    return setting
+
+
+def invalidate_mode_cache() -> None:
+    global _setting_cache
+    if not cache.add(MODE_VERSION_KEY, 1, timeout=None):
+        try:
+            cache.incr(MODE_VERSION_KEY)
+        except ValueError:
+            cache.set(MODE_VERSION_KEY, 1, timeout=None)
+    with _setting_cache_lock:
+        _setting_cache = None
+
+
+def invalidate_on_setting_save(sender, instance, **kwargs):
+    # Covers saves outside set_current_mode too, such as Django admin or the shell.
+    transaction.on_commit(invalidate_mode_cache)
+
+
+def connect_signals():
+    post_save.connect(
+        invalidate_on_setting_save,
+        sender=EncryptionSetting,
+        dispatch_uid='encryption.invalidate_on_setting_save',
+    )
+
+
 def get_current_mode() -> str:
-    return EncryptionSetting.get_solo().current_mode
+    return get_current_setting().current_mode
 
 
 def set_current_mode(mode: str) -> Tuple[str, bool]:
+    codec_for(mode)  # Refuse a mode this deployment cannot serve before anyone uses it.
     setting = EncryptionSetting.get_solo()
     changed = setting.current_mode != mode
     if changed:
@@ -26,11 +109,6 @@ def set_current_mode(mode: str) -> Tuple[str, bool]:
     return setting.current_mode, changed
 
 
-def _xor_bytes(data: bytes, key: bytes) -> bytes:
-    key_length = len(key)
-    return bytes(b ^ key[i % key_length] for i, b in enumerate(data))
-
-
 def encrypt_plaintext(message: str) -> str:
     return message
 
@@ -40,26 +118,44 @@ def decrypt_plaintext(message: str) -> str:
 
 
 def encrypt_weak_xor(message: str) -> str:
-    raw = message.encode('utf-8')
-    xored = _xor_bytes(raw, WEAK_XOR_KEY)
-    return base64.b64encode(xored).decode('ascii')
+    return get_codec(EncryptionSetting.EncryptionMode.WEAK_XOR).encrypt(message)
 
 
 def decrypt_weak_xor(ciphertext: str) -> str:
-    data = base64.b64decode(ciphertext.encode('ascii'))
-    plain_bytes = _xor_bytes(data, WEAK_XOR_KEY)
-    return plain_bytes.decode('utf-8')
+    return get_codec(EncryptionSetting.EncryptionMode.WEAK_XOR).decrypt(ciphertext)
+
+
+def codec_for(mode: str) -> Codec:
+    """Codec for ``mode``; raises ImproperlyConfigured rather than falling back to a weaker one."""
+    codec = get_codec(mode)
+    if codec is None:
+        raise ImproperlyConfigured(f'No codec is registered for encryption mode {mode!r}.')
+    return codec
 
 
 def encrypt_message(message: str) -> EncryptionResult:
-    mode = get_current_mode()
-    if mode == EncryptionSetting.EncryptionMode.WEAK_XOR:
-        return EncryptionResult(ciphertext=encrypt_weak_xor(message), mode=mode)
-    # Future modes fall back to plaintext until implemented
-    return EncryptionResult(ciphertext=encrypt_plaintext(message), mode=EncryptionSetting.EncryptionMode.PLAINTEXT)
+    codec = codec_for(get_current_mode())
+    return EncryptionResult(ciphertext=codec.encrypt(message), mode=codec.mode)
 
 
 def decrypt_message(ciphertext: str, mode: str) -> str:
-    if mode == EncryptionSetting.EncryptionMode.WEAK_XOR:
-        return decrypt_weak_xor(ciphertext)
-    return decrypt_plaintext(ciphertext)
+    return codec_for(mode).decrypt(ciphertext)
+
+
+def encrypt_many(messages: Sequence[str], mode: Optional[str] = None) -> List[EncryptionResult]:
+    """Encrypt a batch under one mode, looked up once for the whole batch."""
+    codec = codec_for(mode or get_current_mode())
+    return [EncryptionResult(ciphertext=ciphertext, mode=codec.mode) for ciphertext in codec.encrypt_many(messages)]
+
+
+def decrypt_many(items: Sequence[Tuple[str, str]]) -> List[str]:
+    """Decrypt ``(ciphertext, mode)`` pairs, batching every mode into a single pass."""
+    results: List[Optional[str]] = [None] * len(items)
+    by_mode: Dict[str, List[int]] = {}
+    for index, (_, mode) in enumerate(items):
+        by_mode.setdefault(mode, []).append(index)
+    for mode, indexes in by_mode.items():
+        plain = codec_for(mode).decrypt_many([items[index][0] for index in indexes])
+        for index, text in zip(indexes, plain):
+            results[index] = text
+    return results
@@ -0,0 +1,153 @@
+"""LSB steganography on whole pixel arrays.
+
+A payload is stored as a 32-bit big-endian length header followed by its
+bytes. It is spread over the lowest ``bits_per_sample`` bits of consecutive
+samples of the flattened cover, so one byte occupies ``8 / bits_per_sample``
+samples. Embedding and extraction are NumPy shift and mask operations on
+contiguous slices, processed ``tile_bytes`` of payload at a time. This bounds
+temporary memory on large covers and never touches samples past the payload.
+
+Requires NumPy; PNG helpers additionally require Pillow.
+"""
+
+import io
+import math
+from typing import Optional
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:  # Only the PNG helpers need Pillow.
+    Image = None
+
+HEADER_BYTES = 4
+SUPPORTED_BITS = (1, 2, 4)
+DEFAULT_TILE_BYTES = 256 * 1024
+
+
+class CapacityError(ValueError):
+    """Raised when a payload does not fit in a cover, or a stego image holds no valid payload."""
+
+
+def _check_bits(bits_per_sample: int) -> None:
+    if bits_per_sample not in SUPPORTED_BITS:
+        raise ValueError(f'bits_per_sample must be one of {SUPPORTED_BITS}.')
+
+
+def _shifts(bits_per_sample: int) -> np.ndarray:
+    # Most significant group first, e.g. [6, 4, 2, 0] for two bits per sample.
+    return np.arange(8 - bits_per_sample, -1, -bits_per_sample, dtype=np.uint8)
+
+
+def capacity_bytes(shape, bits_per_sample: int = 1) -> int:
+    """Largest payload that fits in a cover of ``shape``."""
+    _check_bits(bits_per_sample)
+    samples = math.prod(shape)
+    return max(samples * bits_per_sample // 8 - HEADER_BYTES, 0)
+
+
+def samples_needed(payload_size: int, bits_per_sample: int = 1) -> int:
+    _check_bits(bits_per_sample)
+    return (HEADER_BYTES + payload_size) * 8 // bits_per_sample
+
+
+def _flat_view(image: np.ndarray) -> np.ndarray:
+    if image.dtype != np.uint8:
+        raise ValueError('Stego images must be uint8 arrays.')
+    return image.reshape(-1)
+
+
+def embed(
+    cover: np.ndarray,
+    payload: bytes,
+    bits_per_sample: int = 1,
+    tile_bytes: int = DEFAULT_TILE_BYTES,
+    copy: bool = True,
+) -> np.ndarray:
+    """Hide ``payload`` in ``cover``; returns the stego image (``cover`` itself when ``copy`` is False)."""
+    _check_bits(bits_per_sample)
+    if len(payload) > capacity_bytes(cover.shape, bits_per_sample):
+        raise CapacityError(
+            f'Payload of {len(payload)} bytes exceeds the cover capacity of '
+            f'{capacity_bytes(cover.shape, bits_per_sample)} bytes.'
+        )
+    image = np.array(cover, dtype=np.uint8, order='C', copy=True) if copy else np.ascontiguousarray(cover)
+    samples = _flat_view(image)
+    data = np.frombuffer(len(payload).to_bytes(HEADER_BYTES, 'big') + payload, dtype=np.uint8)
+    shifts = _shifts(bits_per_sample)
+    mask = np.uint8((1 << bits_per_sample) - 1)
+    keep = np.uint8(0xFF ^ int(mask))
+    per_byte = len(shifts)
+
+    for start in range(0, len(data), tile_bytes):
+        chunk = data[start:start + tile_bytes]
+        symbols = ((chunk[:, None] >> shifts) & mask).reshape(-1)
+        offset = start * per_byte
+        target = samples[offset:offset + len(symbols)]
+        np.bitwise_and(target, keep, out=target)
+        np.bitwise_or(target, symbols, out=target)
+    return image
+
+
+def _read_bytes(samples: np.ndarray, offset: int, count: int, bits_per_sample: int) -> np.ndarray:
+    shifts = _shifts(bits_per_sample)
+    mask = np.uint8((1 << bits_per_sample) - 1)
+    per_byte = len(shifts)
+    symbols = (samples[offset:offset + count * per_byte] & mask).reshape(-1, per_byte)
+    return np.bitwise_or.reduce(symbols << shifts, axis=1).astype(np.uint8)
+
+
+def extract(stego_image: np.ndarray, bits_per_sample: int = 1, tile_bytes: int = DEFAULT_TILE_BYTES) -> bytes:
+    """Recover the payload hidden by ``embed``."""
+    _check_bits(bits_per_sample)
+    samples = _flat_view(np.ascontiguousarray(stego_image))
+    per_byte = 8 // bits_per_sample
+    if samples.size < HEADER_BYTES * per_byte:
+        raise CapacityError('Image is too small to hold a payload.')
+    length = int.from_bytes(_read_bytes(samples, 0, HEADER_BYTES, bits_per_sample).tobytes(), 'big')
+    if length > capacity_bytes(stego_image.shape, bits_per_sample):
+        raise CapacityError('Image does not contain a valid payload.')
+
+    payload = bytearray()
+    offset = HEADER_BYTES * per_byte
+    for start in range(0, length, tile_bytes):
+        count = min(tile_bytes, length - start)
+        payload += _read_bytes(samples, offset + start * per_byte, count, bits_per_sample).tobytes()
+    return bytes(payload)
+
+
+def fit_cover(cover: np.ndarray, payload_size: int, bits_per_sample: int = 1, min_rows: int = 8) -> np.ndarray:
+    """Smallest band of whole rows of ``cover`` that can hold the payload.
+
+    Covers too short for the payload are repeated vertically.
+    """
+    row_samples = math.prod(cover.shape[1:])
+    rows = max(math.ceil(samples_needed(payload_size, bits_per_sample) / row_samples), min_rows)
+    if rows <= cover.shape[0]:
+        return cover[:rows]
+    repeats = math.ceil(rows / cover.shape[0])
+    return np.concatenate([cover] * repeats)[:rows]
+
+
+def noise_cover(height: int = 256, width: int = 256, seed: int = 0) -> np.ndarray:
+    """Deterministic RGB noise, used when no cover image is configured."""
+    return np.random.default_rng(seed).integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+
+def load_cover(path: Optional[str] = None) -> np.ndarray:
+    if not path:
+        return noise_cover()
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB'), dtype=np.uint8)
+
+
+def to_png(image: np.ndarray, compress_level: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format='PNG', compress_level=compress_level)
+    return buffer.getvalue()
+
+
+def from_png(data: bytes) -> np.ndarray:
+    with Image.open(io.BytesIO(data)) as image:
+        return np.asarray(image, dtype=np.uint8)
@@ -1,3 +1,179 @@
-from django.test import TestCase
+import base64
 
-# Create your tests here.
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, PublicFormat
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .codecs import (
+    NUMPY_MIN_BYTES,
+    CodecError,
+    EndToEndCodec,
+    WeakXorCodec,
+    available_modes,
+    get_codec,
+    reset_codecs,
+)
+from .models import EncryptionSetting
+from .services import MODE_VERSION_KEY, get_current_mode, invalidate_mode_cache, set_current_mode
+
+Mode = EncryptionSetting.EncryptionMode
+
+MESSAGES = ['', 'hello', 'zażółć gęślą jaźń ✓', 'x' * (NUMPY_MIN_BYTES + 3)]
+
+
+def key_pair():
+    private = X25519PrivateKey.generate()
+    private_bytes = private.private_bytes(Encoding.Raw, PrivateFormat.Raw, NoEncryption())
+    public_bytes = private.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    return private_bytes, public_bytes
+
+
+LOCAL_PRIVATE, LOCAL_PUBLIC = key_pair()
+PEER_PRIVATE, PEER_PUBLIC = key_pair()
+E2E_KEYS = {
+    'ENCRYPTION_E2E_PRIVATE_KEY': base64.b64encode(LOCAL_PRIVATE).decode('ascii'),
+    'ENCRYPTION_E2E_PEER_PUBLIC_KEY': base64.b64encode(PEER_PUBLIC).decode('ascii'),
+}
+
+
+class CodecTestCase(SimpleTestCase):
+    def setUp(self):
+        # Codecs are built once per process from the settings in effect.
+        reset_codecs()
+        self.addCleanup(reset_codecs)
+
+
+class RoundTripTests(CodecTestCase):
+    def assertRoundTrips(self, codec):
+        for message in MESSAGES:
+            self.assertEqual(codec.decrypt(codec.encrypt(message)), message)
+        ciphertexts = codec.encrypt_many(MESSAGES)
+        self.assertEqual(codec.decrypt_many(ciphertexts), MESSAGES)
+        return ciphertexts
+
+    def test_plaintext(self):
+        self.assertEqual(self.assertRoundTrips(get_codec(Mode.PLAINTEXT)), MESSAGES)
+
+    def test_weak_xor_bulk_matches_single(self):
+        codec = get_codec(Mode.WEAK_XOR)
+        ciphertexts = self.assertRoundTrips(codec)
+        self.assertEqual(ciphertexts, [codec.encrypt(message) for message in MESSAGES])
+        self.assertEqual(WeakXorCodec(b'other').decrypt(WeakXorCodec(b'other').encrypt('hi')), 'hi')
+
+    @override_settings(**E2E_KEYS)
+    def test_end_to_end(self):
+        codec = get_codec(Mode.END_TO_END)
+        self.assertRoundTrips(codec)
+        # Random nonces: the same message never encrypts the same way twice.
+        self.assertNotEqual(codec.encrypt('hello'), codec.encrypt('hello'))
+        peer = EndToEndCodec(private_key=PEER_PRIVATE, peer_public_key=LOCAL_PUBLIC)
+        self.assertEqual(peer.decrypt(codec.encrypt('hello')), 'hello')
+
+    @override_settings(**E2E_KEYS, ENCRYPTION_STEGO_BITS_PER_SAMPLE=2)
+    def test_end_to_end_stego(self):
+        self.assertRoundTrips(get_codec(Mode.END_TO_END_STEGO))
+
+
+@override_settings(**E2E_KEYS)
+class CodecErrorTests(CodecTestCase):
+    def test_malformed_base64(self):
+        for mode in (Mode.END_TO_END, Mode.END_TO_END_STEGO):
+            with self.assertRaises(CodecError):
+                get_codec(mode).decrypt('not base64!')
+
+    def test_tampered_ciphertext(self):
+        codec = get_codec(Mode.END_TO_END)
+        data = bytearray(base64.b64decode(codec.encrypt('hello')))
+        data[-1] ^= 1
+        with self.assertRaisesMessage(CodecError, 'failed authentication'):
+            codec.decrypt(base64.b64encode(bytes(data)).decode('ascii'))
+        with self.assertRaisesMessage(CodecError, 'Unsupported'):
+            codec.decrypt(base64.b64encode(b'\x02' + bytes(data[1:])).decode('ascii'))
+        with self.assertRaisesMessage(CodecError, 'Unsupported'):
+            codec.decrypt(base64.b64encode(b'\x01short').decode('ascii'))
+
+    def test_modes_do_not_open_each_other(self):
+        sealed = get_codec(Mode.END_TO_END).encrypt('hello')
+        wrong_peer = EndToEndCodec(private_key=PEER_PRIVATE, peer_public_key=PEER_PUBLIC)
+        with self.assertRaises(CodecError):
+            wrong_peer.decrypt(sealed)
+        # The mode name is authenticated, so an END_TO_END payload cannot be
+        # passed off as the stego mode's.
+        stego_cipher = EndToEndCodec(associated_data=str(Mode.END_TO_END_STEGO).encode('ascii'))
+        with self.assertRaises(CodecError):
+            stego_cipher.decrypt(sealed)
+
+    def test_invalid_stego_image(self):
+        with self.assertRaises(CodecError):
+            get_codec(Mode.END_TO_END_STEGO).decrypt(base64.b64encode(b'not a png').decode('ascii'))
+
+
+class ConfigurationTests(CodecTestCase):
+    @override_settings(ENCRYPTION_E2E_PRIVATE_KEY='', ENCRYPTION_E2E_PEER_PUBLIC_KEY='')
+    def test_missing_keys(self):
+        for mode in (Mode.END_TO_END, Mode.END_TO_END_STEGO):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'ENCRYPTION_E2E_PRIVATE_KEY must be set'):
+                get_codec(mode)
+        self.assertEqual(available_modes(), sorted([Mode.PLAINTEXT, Mode.WEAK_XOR]))
+
+    def test_invalid_keys(self):
+        for value, message in (('%%%', 'not valid base64'), (base64.b64encode(b'short').decode('ascii'), '32 bytes')):
+            with self.settings(**{**E2E_KEYS, 'ENCRYPTION_E2E_PRIVATE_KEY': value}):
+                reset_codecs()
+                with self.assertRaisesMessage(ImproperlyConfigured, message):
+                    get_codec(Mode.END_TO_END)
+
+    @override_settings(**E2E_KEYS, ENCRYPTION_STEGO_BITS_PER_SAMPLE=3)
+    def test_invalid_stego_bits(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'ENCRYPTION_STEGO_BITS_PER_SAMPLE must be one of'):
+            get_codec(Mode.END_TO_END_STEGO)
+
+    @override_settings(**E2E_KEYS)
+    def test_all_modes_available_with_keys(self):
+        self.assertEqual(available_modes(), sorted(Mode.values))
+
+
+class ModeCacheTests(TestCase):
+    def setUp(self):
+        invalidate_mode_cache()
+
+    def test_hits_skip_database_and_cache(self):
+        self.assertEqual(get_current_mode(), Mode.PLAINTEXT)
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                get_current_mode()
+
+    def test_change_is_seen_after_commit(self):
+        get_current_mode()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(set_current_mode(Mode.WEAK_XOR), (Mode.WEAK_XOR, True))
+        self.assertEqual(get_current_mode(), Mode.WEAK_XOR)
+
+    def test_other_workers_bumps_are_seen_on_recheck(self):
+        get_current_mode()
+        EncryptionSetting.objects.update(current_mode=Mode.WEAK_XOR)
+        # Another worker's invalidation only reaches this one through the shared stamp.
+        cache.incr(MODE_VERSION_KEY)
+        self.assertEqual(get_current_mode(), Mode.PLAINTEXT)
+        with self.settings(ENCRYPTION_MODE_CACHE_RECHECK=0):
+            self.assertEqual(get_current_mode(), Mode.WEAK_XOR)
+
+    def test_saves_outside_the_api_invalidate(self):
+        get_current_mode()
+        setting = EncryptionSetting.get_solo()
+        setting.current_mode = Mode.WEAK_XOR
+        with self.captureOnCommitCallbacks(execute=True):
+            setting.save()
+        self.assertEqual(get_current_mode(), Mode.WEAK_XOR)
+
+    @override_settings(**E2E_KEYS)
+    def test_api_only_offers_client_modes(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user('admin', is_staff=True))
+        response = client.post('/api/admin/encryption-mode/', {'mode': Mode.END_TO_END}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(get_current_mode(), Mode.PLAINTEXT)
@@ -4,7 +4,7 @@ from rest_framework.views import APIView
 
 from .models import EncryptionSetting
 from .serializers import EncryptionSettingSerializer
-from .services import set_current_mode
+from .services import get_current_setting, set_current_mode
 
 
 class EncryptionModeView(APIView):
@@ -33,6 +33,6 @@ class EncryptionModeStatusView(APIView):
 	permission_classes = [permissions.IsAuthenticated]
 
 	def get(self, request, *args, **kwargs):
-		setting = EncryptionSetting.get_solo()
+		setting = get_current_setting()
 		serializer = EncryptionSettingSerializer()
 		return Response(serializer.to_representation(setting))
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import FrozenSet, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_RECHECK_SECONDS = 2
+VERSION_KEY = 'friendships:friend-set-version:{user_id}'
+
+
+class FriendSetCache:
+	"""Per-process LRU of each user's friend ids, guarded by a shared version stamp.
+
+	Entries are tagged with the version found in Django's cache when they were
+	loaded. Invalidation bumps that version and drops the local entry. Hits are
+	served from memory; the stamp is read again only once an entry is
+	``recheck`` seconds old, so other workers see a change within that time.
+	The TTL bounds staleness if a bump is lost.
+	"""
+
+	def __init__(
+		self,
+		max_entries: int = DEFAULT_MAX_ENTRIES,
+		ttl: float = DEFAULT_TTL_SECONDS,
+		recheck: float = DEFAULT_RECHECK_SECONDS,
+	):
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.recheck = recheck
+		self._lock = threading.Lock()
+		# user id -> (version, expires_at, checked_at, friend ids)
+		self._entries: 'OrderedDict[int, Tuple[int, float, float, FrozenSet[int]]]' = OrderedDict()
+
+	@staticmethod
+	def _version(user_id: int) -> int:
+		return cache.get(VERSION_KEY.format(user_id=user_id), 0)
+
+	def _lookup(self, user_id: int, now: float) -> Tuple[Optional[FrozenSet[int]], Optional[int]]:
+		"""Friend ids from memory, or None and the current version when they must be loaded."""
+		with self._lock:
+			entry = self._entries.get(user_id)
+			if entry is not None and entry[1] > now:
+				self._entries.move_to_end(user_id)
+				if now - entry[2] < self.recheck:
+					return entry[3], None
+		version = self._version(user_id)
+		if entry is None or entry[1] <= now or entry[0] != version:
+			return None, version
+		with self._lock:
+			if self._entries.get(user_id) is entry:
+				self._entries[user_id] = (entry[0], entry[1], now, entry[3])
+		return entry[3], None
+
+	def _store(self, user_id: int, version: int, friend_ids: FrozenSet[int], now: float) -> None:
+		with self._lock:
+			self._entries[user_id] = (version, now + self.ttl, now, friend_ids)
+			self._entries.move_to_end(user_id)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def friend_ids(self, user_id: int) -> FrozenSet[int]:
+		from .models import Friendship
+
+		now = time.monotonic()
+		friend_ids, version = self._lookup(user_id, now)
+		if friend_ids is None:
+			friend_ids = frozenset(Friendship.objects.filter(user_id=user_id).values_list('friend_id', flat=True))
+			self._store(user_id, version, friend_ids, now)
+		return friend_ids
+
+	def invalidate(self, user_ids: Iterable[int]) -> None:
+		for user_id in user_ids:
+			key = VERSION_KEY.format(user_id=user_id)
+			if not cache.add(key, 1, timeout=None):
+				try:
+					cache.incr(key)
+				except ValueError:
+					cache.set(key, 1, timeout=None)
+			with self._lock:
+				self._entries.pop(user_id, None)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+
+
+friend_set_cache = FriendSetCache(
+	max_entries=getattr(settings, 'FRIENDSHIP_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+	ttl=getattr(settings, 'FRIENDSHIP_CACHE_TTL', DEFAULT_TTL_SECONDS),
+	recheck=getattr(settings, 'FRIENDSHIP_CACHE_RECHECK', DEFAULT_RECHECK_SECONDS),
+)
+
+
+def invalidate_friend_sets(*user_ids: int) -> None:
+	"""Drop cached friend sets once the surrounding transaction commits."""
+	transaction.on_commit(lambda: friend_set_cache.invalidate(user_ids))
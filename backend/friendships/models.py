@@ -2,6 +2,8 @@ from django.conf import settings
 from django.db import models, transaction
 from django.utils import timezone
 
+from .cache import friend_set_cache, invalidate_friend_sets
+
 User = settings.AUTH_USER_MODEL
 
 
@@ -15,7 +17,7 @@ class Friendship(models.Model):
 
 	@staticmethod
 	def are_friends(user, other_user) -> bool:
-		return Friendship.objects.filter(user=user, friend=other_user).exists()
+		return other_user.id in friend_set_cache.friend_ids(user.id)
 
 
 class FriendRequest(models.Model):
@@ -43,6 +45,7 @@ class FriendRequest(models.Model):
 			self.save(update_fields=['status', 'responded_at'])
 			Friendship.objects.get_or_create(user=self.from_user, friend=self.to_user)
 			Friendship.objects.get_or_create(user=self.to_user, friend=self.from_user)
+			invalidate_friend_sets(self.from_user_id, self.to_user_id)
 
 	def decline(self):
 		if self.status != self.Status.PENDING:
@@ -1,3 +1,64 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .cache import FriendSetCache, friend_set_cache
+from .models import Friendship, FriendRequest
+
+User = get_user_model()
+
+
+class FriendSetCacheTests(TestCase):
+	def setUp(self):
+		# Per-process caches outlive the rolled back test transactions.
+		friend_set_cache.clear()
+		self.alice = User.objects.create_user('alice')
+		self.bob = User.objects.create_user('bob')
+		self.alice_client = self.client_for(self.alice)
+		self.bob_client = self.client_for(self.bob)
+
+	@staticmethod
+	def client_for(user) -> APIClient:
+		client = APIClient()
+		client.force_authenticate(user)
+		return client
+
+	def send(self):
+		return self.alice_client.post('/api/messages/bob/', {'content': 'hi'}, format='json')
+
+	def befriend(self):
+		friend_request = FriendRequest.objects.create(from_user=self.alice, to_user=self.bob)
+		with self.captureOnCommitCallbacks(execute=True):
+			response = self.bob_client.post(
+				f'/api/friends/requests/{friend_request.id}/respond/', {'action': 'accept'}, format='json'
+			)
+		self.assertEqual(response.status_code, 200)
+
+	def test_hits_skip_the_database(self):
+		self.befriend()
+		self.assertEqual(friend_set_cache.friend_ids(self.alice.id), {self.bob.id})
+		with self.assertNumQueries(0):
+			for _ in range(10):
+				self.assertTrue(Friendship.are_friends(self.alice, self.bob))
+
+	def test_accept_allows_sending(self):
+		self.assertEqual(self.send().status_code, 403)
+		self.befriend()
+		self.assertEqual(self.send().status_code, 201)
+
+	def test_unfriend_rejects_sending(self):
+		self.befriend()
+		self.assertEqual(self.send().status_code, 201)
+		with self.captureOnCommitCallbacks(execute=True):
+			response = self.bob_client.delete('/api/friends/alice/remove/')
+		self.assertEqual(response.status_code, 204)
+		self.assertEqual(self.send().status_code, 403)
+
+	def test_other_workers_see_changes_on_recheck(self):
+		other_worker = FriendSetCache(recheck=60)
+		self.assertEqual(other_worker.friend_ids(self.alice.id), frozenset())
+		self.befriend()
+		# Only the shared stamp tells the other worker about the change.
+		self.assertEqual(other_worker.friend_ids(self.alice.id), frozenset())
+		other_worker.recheck = 0
+		self.assertEqual(other_worker.friend_ids(self.alice.id), {self.bob.id})
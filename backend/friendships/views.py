@@ -3,6 +3,7 @@ from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .cache import invalidate_friend_sets
 from .models import FriendRequest, Friendship
 from .serializers import (
 	FriendRequestCreateSerializer,
@@ -80,4 +81,5 @@ class FriendRemoveView(AuthenticatedAPIView):
 		Friendship.objects.filter(user=friend, friend=request.user).delete()
 		FriendRequest.objects.filter(from_user=request.user, to_user=friend).delete()
 		FriendRequest.objects.filter(from_user=friend, to_user=request.user).delete()
+		invalidate_friend_sets(request.user.id, friend.id)
 		return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+
+from friendships.models import Friendship
+from .models import Conversation
+from .realtime import CONVERSATION_CLOSED_EVENT, conversation_channel, get_broker
+
+User = get_user_model()
+
+THREAD_SOCKET_PATH = re.compile(r'^/ws/messages/(?P<username>[^/]+)/?$')
+# Seconds a client has to send its auth message after the socket opens.
+AUTH_TIMEOUT = 10
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+
+@sync_to_async
+def resolve_conversation(token_key: str, username: str):
+	"""Return ``(conversation, close_code)`` for a socket opened on a thread."""
+	try:
+		token = Token.objects.select_related('user').get(key=token_key)
+	except Token.DoesNotExist:
+		return None, CLOSE_UNAUTHORIZED
+	user = token.user
+	if not user.is_active:
+		return None, CLOSE_UNAUTHORIZED
+
+	try:
+		target = User.objects.get(username=username)
+	except User.DoesNotExist:
+		return None, CLOSE_NOT_FOUND
+	if target == user or not Friendship.are_friends(user, target):
+		return None, CLOSE_FORBIDDEN
+
+	conversation, _ = Conversation.get_or_create_between(user, target)
+	return conversation, None
+
+
+async def receive_token(receive) -> str:
+	"""Read the ``{"type": "auth", "token": "<key>"}`` message every socket must send first.
+
+	The token travels in a frame rather than the URL, so it stays out of proxy
+	and access logs. Returns '' for anything else, including a timeout.
+	"""
+	try:
+		event = await asyncio.wait_for(receive(), AUTH_TIMEOUT)
+	except asyncio.TimeoutError:
+		return ''
+	if event['type'] != 'websocket.receive':
+		return ''
+	try:
+		message = json.loads(event.get('text') or '')
+	except ValueError:
+		return ''
+	if not isinstance(message, dict) or message.get('type') != 'auth' or not isinstance(message.get('token'), str):
+		return ''
+	return message['token']
+
+
+async def thread_socket(scope, receive, send):
+	"""Push new messages of one conversation to ``/ws/messages/<username>/``.
+
+	The socket is closed with ``CLOSE_FORBIDDEN`` once the two users stop being
+	friends. With the default ``InProcessBroker`` events only reach sockets held
+	by the process that published them, so a send or unfriend handled by another
+	worker is not pushed here.
+	"""
+	match = THREAD_SOCKET_PATH.match(scope['path'])
+	event = await receive()
+	if event['type'] != 'websocket.connect':
+		return
+	if match is None:
+		await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+		return
+
+	await send({'type': 'websocket.accept'})
+	token_key = await receive_token(receive)
+	if not token_key:
+		await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+		return
+	conversation, close_code = await resolve_conversation(token_key, match.group('username'))
+	if conversation is None:
+		await send({'type': 'websocket.close', 'code': close_code})
+		return
+
+	broker = get_broker()
+	subscription = broker.subscribe(conversation_channel(conversation.id))
+	# Clients catch up over REST after this, so nothing published meanwhile is lost.
+	await send({'type': 'websocket.send', 'text': json.dumps({'event': 'subscribed'})})
+
+	receive_task = asyncio.ensure_future(receive())
+	publish_task = asyncio.ensure_future(subscription.get())
+	try:
+		while True:
+			done, _ = await asyncio.wait({receive_task, publish_task}, return_when=asyncio.FIRST_COMPLETED)
+			if receive_task in done:
+				if receive_task.result()['type'] == 'websocket.disconnect':
+					break
+				receive_task = asyncio.ensure_future(receive())
+			if publish_task in done:
+				payload = publish_task.result()
+				if json.loads(payload).get('event') == CONVERSATION_CLOSED_EVENT:
+					await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+					break
+				await send({'type': 'websocket.send', 'text': payload})
+				publish_task = asyncio.ensure_future(subscription.get())
+	finally:
+		broker.unsubscribe(subscription)
+		receive_task.cancel()
+		publish_task.cancel()
@@ -0,0 +1,251 @@
+"""Streaming export and batched import of whole conversations.
+
+Exports read the thread with ``values_list(...).iterator(chunk_size=...)``,
+which uses a server-side cursor on PostgreSQL. Each row is encoded as one
+NDJSON line or CSV record as it is read, so memory stays flat however long
+the thread is. Under ASGI the same iterator is stepped through
+``sync_to_async`` (``aiter_chunks``), because Django reads synchronous
+streaming content to the end before sending any of it there. Imports parse
+the same formats line by line and insert with ``bulk_create`` in batches.
+
+Imports only go into empty conversations, with records in chronological
+order and no timestamps in the future. Sync (``since_id``) and read tracking
+compare message ids, so this keeps id order the same as ``(created_at, id)``
+order for imported threads too.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timezone as dt_timezone
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from encryption.models import EncryptionSetting
+from .models import Conversation, Message
+
+EXPORT_FIELDS = ['id', 'sender', 'content', 'encryption_type', 'created_at']
+EXPORT_COLUMNS = ('id', 'sender__username', 'content', 'encryption_type', 'created_at')
+EXPORT_FORMATS = {
+	'ndjson': 'application/x-ndjson',
+	'csv': 'text/csv',
+}
+DEFAULT_CHUNK_SIZE = 2000
+# Characters gathered before a chunk is handed to the response.
+STREAM_CHUNK_CHARS = 64 * 1024
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+DEFAULT_IMPORT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_IMPORT_MAX_RECORDS = 100_000
+
+
+class InvalidImport(ValueError):
+	pass
+
+
+class ImportTooLarge(InvalidImport):
+	pass
+
+
+def export_rows(conversation: Conversation, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple]:
+	return (
+		conversation.messages.order_by('created_at', 'id')
+		.values_list(*EXPORT_COLUMNS)
+		.iterator(chunk_size=chunk_size)
+	)
+
+
+def format_timestamp(value: datetime) -> str:
+	if timezone.is_aware(value):
+		value = value.astimezone(dt_timezone.utc)
+	text = value.isoformat()
+	return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+
+def ndjson_lines(rows: Iterable[Tuple]) -> Iterator[str]:
+	for message_id, sender, content, encryption_type, created_at in rows:
+		values = (message_id, sender, content, encryption_type, format_timestamp(created_at))
+		yield json.dumps(dict(zip(EXPORT_FIELDS, values)), ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows: Iterable[Tuple]) -> Iterator[str]:
+	buffer = io.StringIO()
+	writer = csv.writer(buffer)
+
+	def take() -> str:
+		text = buffer.getvalue()
+		buffer.seek(0)
+		buffer.truncate()
+		return text
+
+	writer.writerow(EXPORT_FIELDS)
+	yield take()
+	for message_id, sender, content, encryption_type, created_at in rows:
+		writer.writerow((message_id, sender, content, encryption_type, format_timestamp(created_at)))
+		yield take()
+
+
+def buffered(lines: Iterable[str], min_chars: int = STREAM_CHUNK_CHARS) -> Iterator[str]:
+	"""Group small lines into larger chunks, so each write and compression flush covers many rows."""
+	pending: List[str] = []
+	size = 0
+	for line in lines:
+		pending.append(line)
+		size += len(line)
+		if size >= min_chars:
+			yield ''.join(pending)
+			pending, size = [], 0
+	if pending:
+		yield ''.join(pending)
+
+
+def export_lines(conversation: Conversation, export_format: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+	rows = export_rows(conversation, chunk_size)
+	return buffered(csv_lines(rows) if export_format == 'csv' else ndjson_lines(rows))
+
+
+async def aiter_chunks(chunks: Iterator[str]) -> AsyncIterator[str]:
+	"""Serve a blocking chunk iterator to an async response one chunk at a time.
+
+	Every step runs on the same worker thread (``thread_sensitive``), which is
+	the thread that owns the database cursor.
+	"""
+	step = sync_to_async(next, thread_sensitive=True)
+	try:
+		while True:
+			chunk = await step(chunks, None)
+			if chunk is None:
+				return
+			yield chunk
+	finally:
+		close = getattr(chunks, 'close', None)
+		if close is not None:
+			await sync_to_async(close, thread_sensitive=True)()
+
+
+def limit_bytes(lines: Iterable[bytes], max_bytes: int) -> Iterator[bytes]:
+	total = 0
+	for line in lines:
+		total += len(line)
+		if total > max_bytes:
+			raise ImportTooLarge(f'Import bodies are limited to {max_bytes} bytes.')
+		yield line
+
+
+def parse_ndjson(lines: Iterable[str]) -> Iterator[Dict]:
+	for number, line in enumerate(lines, start=1):
+		if not line.strip():
+			continue
+		try:
+			record = json.loads(line)
+		except ValueError as exc:
+			raise InvalidImport(f'Line {number} is not valid JSON.') from exc
+		if not isinstance(record, dict):
+			raise InvalidImport(f'Line {number} is not a JSON object.')
+		yield record
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[Dict]:
+	reader = csv.DictReader(lines)
+	missing = {'sender', 'content'} - set(reader.fieldnames or ())
+	if missing:
+		raise InvalidImport(f'CSV header is missing: {", ".join(sorted(missing))}.')
+	yield from reader
+
+
+def parse_records(lines: Iterable[str], import_format: str) -> Iterator[Dict]:
+	return parse_csv(lines) if import_format == 'csv' else parse_ndjson(lines)
+
+
+def _build_message(conversation: Conversation, senders: Dict[str, int], record: Dict, number: int, started: datetime):
+	sender = record.get('sender')
+	sender_id = senders.get(sender) if isinstance(sender, str) else None
+	if sender_id is None:
+		raise InvalidImport(f'Record {number}: sender must be {" or ".join(sorted(senders))}.')
+	content = record.get('content')
+	if not isinstance(content, str):
+		raise InvalidImport(f'Record {number}: content must be a string.')
+	encryption_type = record.get('encryption_type') or EncryptionSetting.EncryptionMode.PLAINTEXT
+	if encryption_type not in EncryptionSetting.EncryptionMode.values:
+		raise InvalidImport(f'Record {number}: unknown encryption_type {encryption_type!r}.')
+	created_at = started
+	if record.get('created_at'):
+		created_at = parse_datetime(str(record['created_at']))
+		if created_at is None:
+			raise InvalidImport(f'Record {number}: created_at must be an ISO 8601 timestamp.')
+		if timezone.is_naive(created_at):
+			created_at = timezone.make_aware(created_at, dt_timezone.utc)
+		if created_at > started:
+			raise InvalidImport(f'Record {number}: created_at is in the future.')
+	message = Message(
+		conversation=conversation,
+		sender_id=sender_id,
+		content=content,
+		encryption_type=encryption_type,
+	)
+	return message, created_at
+
+
+def _insert_batch(conversation: Conversation, batch: List[Message], timestamps: List[datetime]) -> None:
+	created = Message.objects.bulk_create(batch)
+	# auto_now_add stamps every row with the import time; restore the exported timestamps.
+	for message, created_at in zip(created, timestamps):
+		message.created_at = created_at
+	Message.objects.bulk_update(created, ['created_at'])
+	conversation.record_messages(created)
+
+
+def import_messages(
+	conversation: Conversation,
+	records: Iterable[Dict],
+	batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+	senders: Optional[Dict[str, int]] = None,
+	max_records: Optional[int] = None,
+) -> int:
+	"""Insert exported records into ``conversation``; all or nothing.
+
+	Each record's sender must be a username in ``senders`` (username -> user
+	id). It defaults to both participants, which only trusted callers such as
+	the management command may use. Exported ids are ignored; the target
+	conversation must be empty, so a file cannot be imported twice. Past
+	``max_records`` records the import fails with ``ImportTooLarge``.
+	"""
+	if senders is None:
+		senders = {
+			conversation.user_a.username: conversation.user_a_id,
+			conversation.user_b.username: conversation.user_b_id,
+		}
+	imported = 0
+	batch: List[Message] = []
+	timestamps: List[datetime] = []
+	started = timezone.now()
+	previous = None
+	with transaction.atomic():
+		# The row lock also holds back concurrent sends, whose message inserts
+		# reference this row, until the import commits.
+		Conversation.objects.select_for_update().filter(pk=conversation.pk).first()
+		if conversation.messages.exists():
+			raise InvalidImport('Messages can only be imported into an empty conversation.')
+		for number, record in enumerate(records, start=1):
+			if max_records is not None and number > max_records:
+				raise ImportTooLarge(f'Imports are limited to {max_records} records.')
+			message, created_at = _build_message(conversation, senders, record, number, started)
+			if previous is not None and created_at < previous:
+				raise InvalidImport(f'Record {number}: records must be in chronological order.')
+			previous = created_at
+			batch.append(message)
+			timestamps.append(created_at)
+			if len(batch) >= batch_size:
+				_insert_batch(conversation, batch, timestamps)
+				imported += len(batch)
+				batch, timestamps = [], []
+		if batch:
+			_insert_batch(conversation, batch, timestamps)
+			imported += len(batch)
+		if imported:
+			# New validators for clients that cached the thread, e.g. its empty first page.
+			Conversation.objects.filter(pk=conversation.pk).update(content_updated_at=timezone.now())
+	return imported
@@ -0,0 +1,42 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_lines
+from messaging.models import Conversation
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+	help = 'Stream the conversation between two users as NDJSON or CSV.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('user')
+		parser.add_argument('other_user')
+		parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+		parser.add_argument('--output', help='File to write. Defaults to standard output.')
+		parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows fetched per round trip.')
+
+	def handle(self, *args, **options):
+		conversation = find_conversation(options['user'], options['other_user'])
+		lines = export_lines(conversation, options['format'], options['chunk_size'])
+		if not options['output']:
+			sys.stdout.writelines(lines)
+			return
+		with open(options['output'], 'w', encoding='utf-8', newline='') as handle:
+			handle.writelines(lines)
+		self.stderr.write(f'Exported conversation {conversation.id} to {options["output"]}.')
+
+
+def find_conversation(username: str, other_username: str) -> Conversation:
+	users = {user.username: user for user in User.objects.filter(username__in=[username, other_username])}
+	missing = [name for name in (username, other_username) if name not in users]
+	if missing:
+		raise CommandError(f'Unknown user: {", ".join(missing)}.')
+	first_id, second_id = Conversation.participants_key(users[username].id, users[other_username].id)
+	try:
+		return Conversation.objects.select_related('user_a', 'user_b').get(user_a_id=first_id, user_b_id=second_id)
+	except Conversation.DoesNotExist as exc:
+		raise CommandError(f'{username} and {other_username} have no conversation.') from exc
@@ -0,0 +1,40 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.export import DEFAULT_IMPORT_BATCH_SIZE, EXPORT_FORMATS, InvalidImport, import_messages, parse_records
+from messaging.models import Conversation
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+	help = 'Import an NDJSON or CSV conversation export between two users.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('user')
+		parser.add_argument('other_user')
+		parser.add_argument('path')
+		parser.add_argument(
+			'--format',
+			choices=sorted(EXPORT_FORMATS),
+			help='Defaults to the file extension (.csv or .ndjson).',
+		)
+		parser.add_argument('--batch-size', type=int, default=DEFAULT_IMPORT_BATCH_SIZE)
+
+	def handle(self, *args, **options):
+		users = User.objects.filter(username__in=[options['user'], options['other_user']])
+		if users.count() != len({options['user'], options['other_user']}) or options['user'] == options['other_user']:
+			raise CommandError('Both users must exist and differ.')
+		by_name = {user.username: user for user in users}
+		conversation, _ = Conversation.get_or_create_between(by_name[options['user']], by_name[options['other_user']])
+
+		path = Path(options['path'])
+		import_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'ndjson')
+		with open(path, encoding='utf-8', newline='') as handle:
+			try:
+				imported = import_messages(conversation, parse_records(handle, import_format), options['batch_size'])
+			except InvalidImport as exc:
+				raise CommandError(str(exc)) from exc
+		self.stdout.write(self.style.SUCCESS(f'Imported {imported} messages into conversation {conversation.id}.'))
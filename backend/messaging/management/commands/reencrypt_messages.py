@@ -0,0 +1,168 @@
+"""Re-encode stored messages into the current encryption mode.
+
+Rows are read in primary-key order with keyset batches, decrypted and
+re-encrypted by a process pool, and written back with ``bulk_update``. The id
+of the last finished batch goes to a JSON checkpoint, so an interrupted run
+resumes where it stopped. ``--throttle`` sleeps between batches to limit load
+on a live database.
+"""
+
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from encryption.services import CLIENT_MODES, CodecError, codec_for, decrypt_many, get_current_mode
+from messaging.models import Conversation, Message
+
+DEFAULT_BATCH_SIZE = 500
+CHECKPOINT_NAME = '.reencrypt-checkpoint.json'
+
+
+def reencode(items: Sequence[Tuple[str, str]], target_mode: str) -> List[Optional[str]]:
+	"""Re-encrypt ``(ciphertext, mode)`` pairs under ``target_mode``.
+
+	Runs in pool workers. Rows that cannot be decrypted, including rows in a
+	mode whose keys are not configured here, come back as None and are left
+	untouched.
+	"""
+	try:
+		plain: List[Optional[str]] = decrypt_many(items)
+	except (CodecError, ValueError, ImproperlyConfigured):
+		plain = []
+		for item in items:
+			try:
+				plain.append(decrypt_many([item])[0])
+			except (CodecError, ValueError, ImproperlyConfigured):
+				plain.append(None)
+	codec = codec_for(target_mode)
+	encoded = iter(codec.encrypt_many([text for text in plain if text is not None]))
+	return [next(encoded) if text is not None else None for text in plain]
+
+
+def load_checkpoint(path: Path) -> dict:
+	try:
+		with open(path, encoding='utf-8') as handle:
+			return json.load(handle)
+	except FileNotFoundError:
+		return {}
+
+
+def save_checkpoint(path: Path, state: dict) -> None:
+	temporary = path.with_name(path.name + '.tmp')
+	with open(temporary, 'w', encoding='utf-8') as handle:
+		json.dump(state, handle)
+	os.replace(temporary, path)
+
+
+class Command(BaseCommand):
+	help = 'Re-encode existing messages into the current (or given) encryption mode.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--mode', help='Target mode, PLAINTEXT or WEAK_XOR. Defaults to the current encryption mode.')
+		parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+		parser.add_argument(
+			'--workers',
+			type=int,
+			default=os.cpu_count() or 1,
+			help='Encoding processes; 0 or 1 encodes in this process.',
+		)
+		parser.add_argument('--throttle', type=float, default=0.0, help='Seconds to sleep after each batch.')
+		parser.add_argument('--checkpoint', help=f'Checkpoint file. Defaults to BASE_DIR/{CHECKPOINT_NAME}.')
+		parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint.')
+		parser.add_argument('--max-batches', type=int, default=0, help='Stop after this many batches (0 = all).')
+
+	def handle(self, *args, **options):
+		target = options['mode'] or get_current_mode()
+		if target not in CLIENT_MODES:
+			# Nothing decrypts on read, so this would leave every message unreadable.
+			raise CommandError(
+				f'Clients cannot decode {target}; choose one of {", ".join(CLIENT_MODES)}.'
+			)
+		try:
+			codec_for(target)
+		except ImproperlyConfigured as exc:
+			raise CommandError(str(exc)) from exc
+		batch_size = options['batch_size']
+		if batch_size < 1:
+			raise CommandError('--batch-size must be at least 1.')
+
+		checkpoint = Path(options['checkpoint'] or Path(settings.BASE_DIR) / CHECKPOINT_NAME)
+		state = {} if options['restart'] else load_checkpoint(checkpoint)
+		if state.get('target_mode') != target:
+			if state:
+				self.stdout.write(f'Checkpoint targets {state.get("target_mode")}; starting over for {target}.')
+			state = {'target_mode': target, 'last_id': 0, 'scanned': 0, 'updated': 0, 'failed': 0}
+		elif state['last_id']:
+			self.stdout.write(f'Resuming after message {state["last_id"]}.')
+
+		workers = options['workers']
+		executor = None
+		if workers > 1:
+			# Workers only encode; they must not share this process's connections.
+			connections.close_all()
+			executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+		try:
+			self.run(target, batch_size, executor, workers, options, checkpoint, state)
+		finally:
+			if executor is not None:
+				executor.shutdown()
+
+	def run(self, target, batch_size, executor, workers, options, checkpoint, state):
+		batches = 0
+		while not options['max_batches'] or batches < options['max_batches']:
+			rows = list(
+				Message.objects.filter(id__gt=state['last_id'])
+				.order_by('id')
+				.values_list('id', 'content', 'encryption_type', 'conversation_id')[:batch_size]
+			)
+			if not rows:
+				break
+			stale = [row for row in rows if row[2] != target]
+			items = [(content, mode) for _, content, mode, _ in stale]
+			if executor is not None and len(items) > 1:
+				chunk = math.ceil(len(items) / workers)
+				chunks = [items[start:start + chunk] for start in range(0, len(items), chunk)]
+				encoded = [text for part in executor.map(reencode, chunks, repeat(target)) for text in part]
+			else:
+				encoded = reencode(items, target)
+
+			updates = [
+				Message(id=message_id, content=text, encryption_type=target)
+				for (message_id, _, _, _), text in zip(stale, encoded)
+				if text is not None
+			]
+			conversation_ids = {row[3] for row, text in zip(stale, encoded) if text is not None}
+			with transaction.atomic():
+				if updates:
+					Message.objects.bulk_update(updates, ['content', 'encryption_type'])
+					# Rewritten threads need new ETag/Last-Modified validators.
+					Conversation.objects.filter(id__in=conversation_ids).update(content_updated_at=timezone.now())
+
+			state['last_id'] = rows[-1][0]
+			state['scanned'] += len(rows)
+			state['updated'] += len(updates)
+			state['failed'] += len(stale) - len(updates)
+			save_checkpoint(checkpoint, state)
+			batches += 1
+			self.stdout.write(
+				f'Up to message {state["last_id"]}: scanned {state["scanned"]}, '
+				f'updated {state["updated"]}, failed {state["failed"]}.'
+			)
+			if options['throttle'] > 0:
+				time.sleep(options['throttle'])
+
+		self.stdout.write(self.style.SUCCESS(
+			f'Re-encoded {state["updated"]} messages to {target} ({state["failed"]} could not be decrypted).'
+		))
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_inbox_columns(apps, schema_editor):
+    Conversation = apps.get_model('messaging', 'Conversation')
+    Message = apps.get_model('messaging', 'Message')
+    for conversation in Conversation.objects.all().iterator():
+        latest = (
+            Message.objects.filter(conversation_id=conversation.id)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'created_at')
+            .first()
+        )
+        if latest is None:
+            continue
+        Conversation.objects.filter(pk=conversation.pk).update(
+            last_message_id=latest[0],
+            last_activity_at=latest[1],
+            user_a_last_read_id=latest[0],
+            user_b_last_read_id=latest[0],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_message_thread_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user_a_last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user_a_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user_b_last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user_b_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_inbox_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_conversation_inbox_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='content_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
 
 from encryption.models import EncryptionSetting
 
@@ -10,6 +11,15 @@ class Conversation(models.Model):
 	user_a = models.ForeignKey(User, related_name='conversations_as_primary', on_delete=models.CASCADE)
 	user_b = models.ForeignKey(User, related_name='conversations_as_secondary', on_delete=models.CASCADE)
 	created_at = models.DateTimeField(auto_now_add=True)
+	last_message = models.ForeignKey('Message', related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+	last_activity_at = models.DateTimeField(null=True, blank=True)
+	user_a_last_read_id = models.BigIntegerField(default=0)
+	user_b_last_read_id = models.BigIntegerField(default=0)
+	user_a_unread_count = models.PositiveIntegerField(default=0)
+	user_b_unread_count = models.PositiveIntegerField(default=0)
+	# Bumped when existing messages are rewritten in place (e.g. re-encryption), so
+	# thread validators change even though no message was added.
+	content_updated_at = models.DateTimeField(null=True, blank=True)
 
 	class Meta:
 		unique_together = ('user_a', 'user_b')
@@ -23,6 +33,94 @@ class Conversation(models.Model):
 		first_id, second_id = cls.participants_key(user.id, other_user.id)
 		return cls.objects.get_or_create(user_a_id=first_id, user_b_id=second_id)
 
+	@classmethod
+	def get_or_create_many(cls, user, other_user_ids) -> dict:
+		"""Conversations between ``user`` and each of ``other_user_ids``, keyed by the other user's id.
+
+		Existing rows are read with one query; missing ones are inserted with one
+		``bulk_create`` and read back, which also picks up rows a concurrent
+		request created first.
+		"""
+		other_user_ids = set(other_user_ids)
+		lower = [other_id for other_id in other_user_ids if other_id < user.id]
+		higher = [other_id for other_id in other_user_ids if other_id > user.id]
+
+		def fetch():
+			rows = cls.objects.filter(
+				Q(user_a_id=user.id, user_b_id__in=higher) | Q(user_b_id=user.id, user_a_id__in=lower)
+			)
+			return {(row.user_b_id if row.user_a_id == user.id else row.user_a_id): row for row in rows}
+
+		conversations = fetch()
+		missing = other_user_ids - conversations.keys()
+		if missing:
+			new_rows = []
+			for other_id in missing:
+				first_id, second_id = cls.participants_key(user.id, other_id)
+				new_rows.append(cls(user_a_id=first_id, user_b_id=second_id))
+			cls.objects.bulk_create(new_rows, ignore_conflicts=True)
+			conversations = fetch()
+		return conversations
+
+	@classmethod
+	def inbox_for(cls, user):
+		return (
+			cls.objects.filter(Q(user_a=user) | Q(user_b=user))
+			.select_related('user_a', 'user_b', 'last_message__sender')
+			.order_by(F('last_activity_at').desc(nulls_last=True), '-created_at')
+		)
+
+	def participant_field(self, user) -> str:
+		if user.id == self.user_a_id:
+			return 'user_a'
+		if user.id == self.user_b_id:
+			return 'user_b'
+		raise ValueError('User not part of this conversation')
+
+	def last_read_id_for(self, user) -> int:
+		return getattr(self, f'{self.participant_field(user)}_last_read_id')
+
+	def unread_count_for(self, user) -> int:
+		return getattr(self, f'{self.participant_field(user)}_unread_count')
+
+	def record_messages(self, messages) -> None:
+		"""Fold newly created messages into the denormalized inbox columns with one UPDATE."""
+		if not messages:
+			return
+		latest = max(messages, key=lambda message: (message.created_at, message.id))
+		unread_for_a = sum(1 for message in messages if message.sender_id == self.user_b_id)
+		unread_for_b = sum(1 for message in messages if message.sender_id == self.user_a_id)
+		is_newer = (
+			Q(last_activity_at__isnull=True)
+			| Q(last_activity_at__lt=latest.created_at)
+			| Q(last_activity_at=latest.created_at, last_message_id__lt=latest.id)
+		)
+		Conversation.objects.filter(pk=self.pk).update(
+			last_message_id=Case(
+				When(is_newer, then=Value(latest.id)),
+				default=F('last_message_id'),
+				output_field=models.BigIntegerField(),
+			),
+			last_activity_at=Case(
+				When(is_newer, then=Value(latest.created_at)),
+				default=F('last_activity_at'),
+				output_field=models.DateTimeField(),
+			),
+			user_a_unread_count=F('user_a_unread_count') + unread_for_a,
+			user_b_unread_count=F('user_b_unread_count') + unread_for_b,
+		)
+
+	def mark_read(self, user, up_to_id=None) -> None:
+		prefix = self.participant_field(user)
+		if up_to_id is None or up_to_id >= (self.last_message_id or 0):
+			up_to_id = self.last_message_id or 0
+			unread = 0
+		else:
+			unread = self.messages.filter(id__gt=up_to_id).exclude(sender_id=user.id).count()
+		Conversation.objects.filter(pk=self.pk, **{f'{prefix}_last_read_id__lte': up_to_id}).update(
+			**{f'{prefix}_last_read_id': up_to_id, f'{prefix}_unread_count': unread}
+		)
+
 	def includes(self, user) -> bool:
 		return user.id in {self.user_a_id, self.user_b_id}
 
@@ -46,4 +144,7 @@ class Message(models.Model):
 	created_at = models.DateTimeField(auto_now_add=True)
 
 	class Meta:
-		ordering = ['created_at']
+		ordering = ['created_at', 'id']
+		indexes = [
+			models.Index(fields=['conversation', 'created_at', 'id'], name='message_thread_keyset_idx'),
+		]
@@ -0,0 +1,125 @@
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+	pass
+
+
+@dataclass(frozen=True)
+class ThreadPage:
+	messages: List
+	next_cursor: Optional[str]
+	previous_cursor: Optional[str]
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+	raw = f'{created_at.isoformat()}|{message_id}'.encode('utf-8')
+	return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+	try:
+		padded = cursor + '=' * (-len(cursor) % 4)
+		raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+		timestamp, message_id = raw.rsplit('|', 1)
+		created_at = parse_datetime(timestamp)
+		if created_at is None:
+			raise ValueError(timestamp)
+		return created_at, int(message_id)
+	except (binascii.Error, UnicodeError, ValueError) as exc:
+		raise InvalidCursor('Invalid cursor.') from exc
+
+
+def parse_page_size(raw: Optional[str]) -> int:
+	if raw in (None, ''):
+		return DEFAULT_PAGE_SIZE
+	try:
+		limit = int(raw)
+	except ValueError as exc:
+		raise ValueError('limit must be an integer.') from exc
+	if limit < 1:
+		raise ValueError('limit must be positive.')
+	return min(limit, MAX_PAGE_SIZE)
+
+
+def _cursor_for(message) -> str:
+	return encode_cursor(message.created_at, message.id)
+
+
+def paginate_thread(
+	queryset: QuerySet,
+	limit: int,
+	before: Optional[str] = None,
+	after: Optional[str] = None,
+) -> ThreadPage:
+	"""Return one page of a thread, oldest first, seeking on (created_at, id).
+
+	Without a cursor the newest page is returned. ``before`` walks towards older
+	messages and ``after`` towards newer ones; both only touch ``limit + 1`` rows
+	of the (conversation, created_at, id) index.
+	"""
+	if before and after:
+		raise InvalidCursor('Use either before or after, not both.')
+
+	if after:
+		created_at, message_id = decode_cursor(after)
+		rows = list(
+			queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id))
+			.order_by('created_at', 'id')[:limit + 1]
+		)
+		has_more = len(rows) > limit
+		rows = rows[:limit]
+		return ThreadPage(
+			messages=rows,
+			next_cursor=_cursor_for(rows[-1]) if has_more else None,
+			previous_cursor=_cursor_for(rows[0]) if rows else after,
+		)
+
+	if before:
+		created_at, message_id = decode_cursor(before)
+		queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id))
+
+	rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+	has_more = len(rows) > limit
+	rows = rows[:limit]
+	rows.reverse()
+	next_cursor = None
+	if before:
+		next_cursor = _cursor_for(rows[-1]) if rows else before
+	return ThreadPage(
+		messages=rows,
+		next_cursor=next_cursor,
+		previous_cursor=_cursor_for(rows[0]) if has_more else None,
+	)
+
+
+def sync_thread(
+	queryset: QuerySet,
+	limit: int,
+	since_id: Optional[int] = None,
+	since: Optional[datetime] = None,
+) -> ThreadPage:
+	"""Return messages newer than the client's last-seen id or timestamp, oldest first."""
+	if since_id is not None:
+		queryset = queryset.filter(id__gt=since_id)
+	if since is not None:
+		queryset = queryset.filter(created_at__gt=since)
+
+	rows = list(queryset.order_by('created_at', 'id')[:limit + 1])
+	has_more = len(rows) > limit
+	rows = rows[:limit]
+	return ThreadPage(
+		messages=rows,
+		next_cursor=_cursor_for(rows[-1]) if has_more else None,
+		previous_cursor=None,
+	)
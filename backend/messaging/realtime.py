@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, Set
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'messaging.realtime.InProcessBroker'
+SUBSCRIPTION_QUEUE_SIZE = 256
+# Published when a conversation's participants stop being friends; sockets close on it.
+CONVERSATION_CLOSED_EVENT = 'conversation.closed'
+
+
+def conversation_channel(conversation_id: int) -> str:
+	return f'conversation.{conversation_id}'
+
+
+class Subscription:
+	"""A bounded per-socket queue fed by the broker from any thread."""
+
+	def __init__(self, channel: str, maxsize: int = SUBSCRIPTION_QUEUE_SIZE):
+		self.channel = channel
+		self.loop = asyncio.get_running_loop()
+		self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+		self.dropped = 0
+
+	def deliver(self, payload: str) -> None:
+		try:
+			self.loop.call_soon_threadsafe(self._put, payload)
+		except RuntimeError:
+			# The socket's event loop is already closed.
+			self.dropped += 1
+
+	def _put(self, payload: str) -> None:
+		try:
+			self.queue.put_nowait(payload)
+		except asyncio.QueueFull:
+			self.dropped += 1
+
+	async def get(self) -> str:
+		return await self.queue.get()
+
+
+class InProcessBroker:
+	"""Fan-out pub/sub for subscribers living in this process.
+
+	Replace it through ``MESSAGING_REALTIME_BROKER`` with a class exposing the same
+	``subscribe``/``unsubscribe``/``publish`` methods to fan out across workers.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+
+	def subscribe(self, channel: str) -> Subscription:
+		subscription = Subscription(channel)
+		with self._lock:
+			self._subscriptions[channel].add(subscription)
+		return subscription
+
+	def unsubscribe(self, subscription: Subscription) -> None:
+		with self._lock:
+			subscribers = self._subscriptions.get(subscription.channel)
+			if subscribers is None:
+				return
+			subscribers.discard(subscription)
+			if not subscribers:
+				del self._subscriptions[subscription.channel]
+
+	def publish(self, channel: str, payload: str) -> int:
+		with self._lock:
+			subscribers = list(self._subscriptions.get(channel, ()))
+		for subscription in subscribers:
+			subscription.deliver(payload)
+		return len(subscribers)
+
+
+@lru_cache(maxsize=1)
+def get_broker():
+	broker_path = getattr(settings, 'MESSAGING_REALTIME_BROKER', DEFAULT_BROKER)
+	return import_string(broker_path)()
+
+
+def publish_event(conversation_id: int, event: str, data: Any) -> int:
+	payload = json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+	return get_broker().publish(conversation_channel(conversation_id), payload)
+
+
+def close_conversation_on_unfriend(sender, instance, **kwargs):
+	from .models import Conversation
+
+	first_id, second_id = Conversation.participants_key(instance.user_id, instance.friend_id)
+	conversation_id = (
+		Conversation.objects.filter(user_a_id=first_id, user_b_id=second_id).values_list('id', flat=True).first()
+	)
+	if conversation_id is not None:
+		transaction.on_commit(lambda: publish_event(conversation_id, CONVERSATION_CLOSED_EVENT, None))
+
+
+def connect_signals():
+	from friendships.models import Friendship
+
+	post_delete.connect(
+		close_conversation_on_unfriend,
+		sender=Friendship,
+		dispatch_uid='messaging.close_conversation_on_unfriend',
+	)
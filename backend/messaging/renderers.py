@@ -0,0 +1,22 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class CompactThreadRenderer(JSONRenderer):
+    """Selects the compact thread payload, via ``Accept`` or ``?format=compact``."""
+
+    media_type = 'application/vnd.crypto-chat.compact+json'
+    format = 'compact'
+
+
+class NDJSONRenderer(JSONRenderer):
+    """Negotiates conversation exports as NDJSON; error bodies are plain JSON."""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(JSONRenderer):
+    """Negotiates conversation exports as CSV; error bodies are plain JSON."""
+
+    media_type = 'text/csv'
+    format = 'csv'
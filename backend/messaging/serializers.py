@@ -1,7 +1,7 @@
 from rest_framework import serializers
 
 from accounts.serializers import UserSerializer
-from .models import Message
+from .models import Conversation, Message
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -13,5 +13,64 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['content']
 
 
+# Column order of the rows in a compact thread payload.
+COMPACT_MESSAGE_FIELDS = ['id', 'sender', 'content', 'encryption_type', 'created_at']
+COMPACT_MESSAGE_COLUMNS = ('id', 'sender_id', 'content', 'encryption_type', 'created_at')
+
+
+def compact_messages(rows, participants):
+    """Thread rows as positional arrays whose sender is a user id.
+
+    ``rows`` come from ``values_list(*COMPACT_MESSAGE_COLUMNS)``. Senders are
+    serialized once, in the ``participants`` side table, instead of per message.
+    """
+    created_at = serializers.DateTimeField()
+    return {
+        'participants': UserSerializer(participants, many=True).data,
+        'fields': COMPACT_MESSAGE_FIELDS,
+        'results': [
+            [message_id, sender_id, content, encryption_type, created_at.to_representation(timestamp)]
+            for message_id, sender_id, content, encryption_type, timestamp in rows
+        ],
+    }
+
+
 class MessageCreateSerializer(serializers.Serializer):
     content = serializers.CharField()
+
+
+# Upper bound on messages accepted by one batch send request.
+MAX_BATCH_MESSAGES = 500
+
+
+class MessageBatchItemSerializer(serializers.Serializer):
+    to = serializers.CharField(required=False)
+    content = serializers.CharField()
+
+
+class MessageBatchSerializer(serializers.Serializer):
+    messages = serializers.ListField(
+        child=MessageBatchItemSerializer(),
+        allow_empty=False,
+        max_length=MAX_BATCH_MESSAGES,
+    )
+
+
+class MessageReadSerializer(serializers.Serializer):
+    message_id = serializers.IntegerField(required=False, min_value=0)
+
+
+class ConversationSummarySerializer(serializers.ModelSerializer):
+    participant = serializers.SerializerMethodField()
+    last_message = MessageSerializer(read_only=True)
+    unread_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'participant', 'last_message', 'last_activity_at', 'unread_count']
+
+    def get_participant(self, conversation: Conversation):
+        return UserSerializer(conversation.other_participant(self.context['request'].user)).data
+
+    def get_unread_count(self, conversation: Conversation) -> int:
+        return conversation.unread_count_for(self.context['request'].user)
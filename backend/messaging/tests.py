@@ -1,3 +1,483 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import skipIf
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.formats import msgpack
+from core.middleware import brotli
+from encryption.models import EncryptionSetting
+from encryption.services import decrypt_message
+from friendships.cache import friend_set_cache
+from friendships.models import FriendRequest
+from .consumers import CLOSE_FORBIDDEN, thread_socket
+from .export import ImportTooLarge, InvalidImport, import_messages, parse_records
+from .models import Conversation, Message
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, paginate_thread, sync_thread
+
+User = get_user_model()
+
+
+def make_friends(user, other_user):
+	FriendRequest.objects.create(from_user=user, to_user=other_user).accept()
+
+
+class MessagingTestCase(TestCase):
+	def setUp(self):
+		# Per-process caches outlive the rolled back test transactions.
+		friend_set_cache.clear()
+		self.alice = User.objects.create_user('alice')
+		self.bob = User.objects.create_user('bob')
+		self.carol = User.objects.create_user('carol')
+		make_friends(self.alice, self.bob)
+		self.conversation, _ = Conversation.get_or_create_between(self.alice, self.bob)
+		self.client = self.client_for(self.alice)
+
+	@staticmethod
+	def client_for(user) -> APIClient:
+		client = APIClient()
+		client.force_authenticate(user)
+		return client
+
+	def send(self, sender, count: int, created_at=None):
+		"""Insert ``count`` messages the way the send views do, with one timestamp if given."""
+		messages = Message.objects.bulk_create(
+			Message(conversation=self.conversation, sender=sender, content=f'message {number}')
+			for number in range(count)
+		)
+		if created_at is not None:
+			for message in messages:
+				message.created_at = created_at
+			Message.objects.bulk_update(messages, ['created_at'])
+		self.conversation.record_messages(messages)
+		self.conversation.refresh_from_db()
+		return messages
+
+
+class ThreadPaginationTests(MessagingTestCase):
+	def test_cursor_round_trip(self):
+		created_at = timezone.now()
+		self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+
+	def test_invalid_cursor(self):
+		for cursor in ('', 'not base64!', encode_cursor(timezone.now(), 1)[:-4]):
+			with self.assertRaises(InvalidCursor):
+				decode_cursor(cursor)
+		response = self.client.get('/api/messages/bob/', {'before': 'garbage'})
+		self.assertEqual(response.status_code, 400)
+
+	def test_keyset_pages_cover_thread_once(self):
+		# Equal timestamps make the id the only tie breaker.
+		messages = self.send(self.alice, 7, created_at=timezone.now())
+		queryset = self.conversation.messages.all()
+
+		page = paginate_thread(queryset, 3)
+		self.assertEqual([m.id for m in page.messages], [m.id for m in messages[4:]])
+		self.assertIsNone(page.next_cursor)
+		seen = [m.id for m in page.messages]
+		while page.previous_cursor:
+			page = paginate_thread(queryset, 3, before=page.previous_cursor)
+			seen = [m.id for m in page.messages] + seen
+		self.assertEqual(seen, [m.id for m in messages])
+
+		page = paginate_thread(queryset, 3, after=encode_cursor(messages[1].created_at, messages[1].id))
+		self.assertEqual([m.id for m in page.messages], [m.id for m in messages[2:5]])
+		page = paginate_thread(queryset, 3, after=page.next_cursor)
+		self.assertEqual([m.id for m in page.messages], [m.id for m in messages[5:]])
+		self.assertIsNone(page.next_cursor)
+
+	def test_before_and_after_are_exclusive(self):
+		cursor = encode_cursor(timezone.now(), 1)
+		with self.assertRaises(InvalidCursor):
+			paginate_thread(self.conversation.messages.all(), 10, before=cursor, after=cursor)
+
+	def test_sync_since_id(self):
+		messages = self.send(self.bob, 5)
+		page = sync_thread(self.conversation.messages.all(), 2, since_id=messages[1].id)
+		self.assertEqual([m.id for m in page.messages], [m.id for m in messages[2:4]])
+		self.assertIsNotNone(page.next_cursor)
+
+		response = self.client.get('/api/messages/bob/', {'since_id': messages[-1].id})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()['results'], [])
+		response = self.client.get('/api/messages/bob/', {'since_id': 'x'})
+		self.assertEqual(response.status_code, 400)
+
+	def test_not_modified_until_thread_changes(self):
+		self.send(self.bob, 2)
+		response = self.client.get('/api/messages/bob/')
+		etag = response['ETag']
+		self.assertIn('Accept', response['Vary'])
+
+		response = self.client.get('/api/messages/bob/', HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+
+		self.client_for(self.bob).post('/api/messages/alice/', {'content': 'new'}, format='json')
+		response = self.client.get('/api/messages/bob/', HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], etag)
+
+	def test_etag_depends_on_query(self):
+		self.send(self.bob, 1)
+		first = self.client.get('/api/messages/bob/')['ETag']
+		second = self.client.get('/api/messages/bob/', {'limit': 1})['ETag']
+		self.assertNotEqual(first, second)
+
+
+class UnreadCounterTests(MessagingTestCase):
+	def test_counters_follow_sends_and_reads(self):
+		self.send(self.bob, 3)
+		self.send(self.alice, 2)
+		self.assertEqual(self.conversation.unread_count_for(self.alice), 3)
+		self.assertEqual(self.conversation.unread_count_for(self.bob), 2)
+
+		response = self.client.get('/api/messages/')
+		self.assertEqual(response.json()[0]['unread_count'], 3)
+
+		response = self.client.post('/api/messages/bob/read/', {}, format='json')
+		self.assertEqual(response.json(), {'last_read_id': self.conversation.last_message_id, 'unread_count': 0})
+		self.conversation.refresh_from_db()
+		self.assertEqual(self.conversation.unread_count_for(self.bob), 2)
+
+	def test_partial_read(self):
+		messages = self.send(self.bob, 4)
+		response = self.client.post('/api/messages/bob/read/', {'message_id': messages[1].id}, format='json')
+		self.assertEqual(response.json(), {'last_read_id': messages[1].id, 'unread_count': 2})
+
+		# Reading up to an older message never moves the marker back.
+		self.client.post('/api/messages/bob/read/', {'message_id': messages[0].id}, format='json')
+		self.conversation.refresh_from_db()
+		self.assertEqual(self.conversation.last_read_id_for(self.alice), messages[1].id)
+
+	def test_latest_message_tracks_created_at(self):
+		later = timezone.now()
+		newest = self.send(self.bob, 1, created_at=later)[0]
+		self.send(self.alice, 1, created_at=later - timedelta(minutes=1))
+		self.assertEqual(self.conversation.last_message_id, newest.id)
+		self.assertEqual(self.conversation.last_activity_at, later)
+
+
+class MessageBatchTests(MessagingTestCase):
+	def test_batch_to_several_friends(self):
+		make_friends(self.carol, self.alice)
+		response = self.client.post(
+			'/api/messages/bob/batch/',
+			{'messages': [{'content': 'one'}, {'to': 'carol', 'content': 'two'}, {'content': 'three'}]},
+			format='json',
+		)
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual([item['content'] for item in response.json()['results']], ['one', 'two', 'three'])
+		self.conversation.refresh_from_db()
+		self.assertEqual(self.conversation.messages.count(), 2)
+		self.assertEqual(self.conversation.unread_count_for(self.bob), 2)
+		other, _ = Conversation.get_or_create_between(self.alice, self.carol)
+		self.assertEqual(other.unread_count_for(self.carol), 1)
+
+	def test_errors_are_reported_per_index_and_nothing_is_sent(self):
+		response = self.client.post(
+			'/api/messages/bob/batch/',
+			{'messages': [
+				{'content': 'fine'},
+				{'to': 'nobody', 'content': 'x'},
+				{'to': 'alice', 'content': 'x'},
+				{'to': 'carol', 'content': 'x'},
+			]},
+			format='json',
+		)
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(response.json()['errors'], [
+			{'index': 1, 'detail': 'User not found.'},
+			{'index': 2, 'detail': 'Cannot exchange messages with yourself.'},
+			{'index': 3, 'detail': 'You are not friends yet.'},
+		])
+		self.assertFalse(Message.objects.exists())
+
+	def test_batch_size_is_bounded(self):
+		response = self.client.post('/api/messages/bob/batch/', {'messages': []}, format='json')
+		self.assertEqual(response.status_code, 400)
+		response = self.client.post('/api/messages/bob/batch/', {'messages': [{'content': 'x'}] * 501}, format='json')
+		self.assertEqual(response.status_code, 400)
+		self.assertFalse(Message.objects.exists())
+
+
+class ConversationImportTests(MessagingTestCase):
+	def post_import(self, body: bytes, client=None):
+		return (client or self.client).post('/api/messages/bob/import/', data=body, content_type='application/x-ndjson')
+
+	def test_http_import_only_accepts_the_requester(self):
+		response = self.post_import(b'{"sender": "alice", "content": "mine"}\n{"sender": "bob", "content": "forged"}\n')
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(response.json()['detail'], 'Record 2: sender must be alice.')
+		self.assertFalse(Message.objects.exists())
+
+		response = self.post_import(b'{"sender": "alice", "content": "mine"}\n')
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.json(), {'imported': 1})
+
+	def test_trusted_import_accepts_both_participants(self):
+		records = [
+			{'sender': 'bob', 'content': 'hi', 'created_at': '2024-01-01T10:00:00Z'},
+			{'sender': 'alice', 'content': 'hello', 'created_at': '2024-01-01T10:01:00Z'},
+		]
+		with self.assertRaisesMessage(InvalidImport, 'sender must be alice or bob'):
+			import_messages(self.conversation, [{'sender': 'carol', 'content': 'x'}])
+
+		self.assertEqual(import_messages(self.conversation, records, batch_size=1), 2)
+		self.conversation.refresh_from_db()
+		self.assertEqual(self.conversation.unread_count_for(self.alice), 1)
+		self.assertEqual(self.conversation.last_message.content, 'hello')
+		self.assertIsNotNone(self.conversation.content_updated_at)
+
+	def test_import_requires_an_empty_thread_in_order(self):
+		with self.assertRaisesMessage(InvalidImport, 'chronological order'):
+			import_messages(self.conversation, [
+				{'sender': 'bob', 'content': 'b', 'created_at': '2024-01-02T00:00:00Z'},
+				{'sender': 'bob', 'content': 'a', 'created_at': '2024-01-01T00:00:00Z'},
+			])
+		with self.assertRaisesMessage(InvalidImport, 'in the future'):
+			import_messages(self.conversation, [{'sender': 'bob', 'content': 'x', 'created_at': '2999-01-01T00:00:00Z'}])
+		self.send(self.bob, 1)
+		with self.assertRaisesMessage(InvalidImport, 'empty conversation'):
+			import_messages(self.conversation, [{'sender': 'bob', 'content': 'x'}])
+
+	def test_record_limit(self):
+		with self.assertRaises(ImportTooLarge):
+			import_messages(self.conversation, [{'sender': 'bob', 'content': 'x'}] * 3, max_records=2)
+		self.assertFalse(Message.objects.exists())
+		with self.settings(MESSAGE_IMPORT_MAX_BYTES=10):
+			response = self.post_import(b'{"sender": "alice", "content": "too long"}\n')
+		self.assertEqual(response.status_code, 413)
+
+	def test_body_length_is_required(self):
+		for content_length, status_code in (('', 411), ('0', 400)):
+			response = self.client.post(
+				'/api/messages/bob/import/',
+				data=b'',
+				content_type='application/x-ndjson',
+				CONTENT_LENGTH=content_length,
+			)
+			self.assertEqual(response.status_code, status_code)
+
+	def export(self, export_format: str) -> str:
+		response = self.client.get('/api/messages/bob/export/', {'format': export_format})
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.streaming)
+		return b''.join(response.streaming_content).decode('utf-8')
+
+	def thread_rows(self):
+		return list(self.conversation.messages.order_by('created_at', 'id').values_list(
+			'sender__username', 'content', 'created_at'
+		))
+
+	def test_exports_round_trip_through_import(self):
+		start = timezone.now() - timedelta(hours=1)
+		records = [(self.bob, 'hi'), (self.alice, 'line one\nline "two", with a comma'), (self.bob, 'zażółć ✓')]
+		for minute, (sender, content) in enumerate(records):
+			message = Message.objects.create(conversation=self.conversation, sender=sender, content=content)
+			Message.objects.filter(pk=message.pk).update(created_at=start + timedelta(minutes=minute))
+		expected = self.thread_rows()
+
+		for export_format in ('ndjson', 'csv'):
+			exported = self.export(export_format)
+			self.conversation.messages.all().delete()
+			lines = io.StringIO(exported, newline='')
+			self.assertEqual(import_messages(self.conversation, parse_records(lines, export_format)), 3)
+			self.assertEqual(self.thread_rows(), expected, export_format)
+
+	def test_own_messages_round_trip_over_http(self):
+		self.send(self.alice, 2, created_at=timezone.now() - timedelta(minutes=5))
+		expected = [row[:2] for row in self.thread_rows()]
+		exported = self.export('ndjson').encode('utf-8')
+		self.conversation.messages.all().delete()
+		response = self.post_import(exported)
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.json(), {'imported': 2})
+		self.assertEqual([row[:2] for row in self.thread_rows()], expected)
+
+
+class ThreadSocketTests(MessagingTestCase):
+	def setUp(self):
+		super().setUp()
+		self.token = Token.objects.create(user=self.alice)
+
+	async def open_socket(self):
+		"""Start ``thread_socket`` on Bob's thread and return ``(task, inbox, outbox)`` once subscribed."""
+		inbox, outbox = asyncio.Queue(), asyncio.Queue()
+		task = asyncio.ensure_future(thread_socket({'type': 'websocket', 'path': '/ws/messages/bob/'}, inbox.get, outbox.put))
+		await inbox.put({'type': 'websocket.connect'})
+		await inbox.put({'type': 'websocket.receive', 'text': json.dumps({'type': 'auth', 'token': self.token.key})})
+		self.assertEqual(await self.next_event(outbox), {'type': 'websocket.accept'})
+		self.assertEqual(json.loads((await self.next_event(outbox))['text']), {'event': 'subscribed'})
+		return task, inbox, outbox
+
+	@staticmethod
+	async def next_event(outbox):
+		return await asyncio.wait_for(outbox.get(), 5)
+
+	def run_on_commit(self, function):
+		with self.captureOnCommitCallbacks(execute=True):
+			return function()
+
+	def test_new_messages_are_pushed(self):
+		async def scenario():
+			task, inbox, outbox = await self.open_socket()
+			bob_client = self.client_for(self.bob)
+			response = await sync_to_async(self.run_on_commit)(
+				lambda: bob_client.post('/api/messages/alice/', {'content': 'pushed'}, format='json')
+			)
+			self.assertEqual(response.status_code, 201)
+			event = json.loads((await self.next_event(outbox))['text'])
+			self.assertEqual((event['event'], event['data']['content']), ('message.created', 'pushed'))
+			await inbox.put({'type': 'websocket.disconnect'})
+			await asyncio.wait_for(task, 5)
+
+		async_to_sync(scenario)()
+
+	def test_unfriend_closes_the_socket(self):
+		async def scenario():
+			task, _, outbox = await self.open_socket()
+			response = await sync_to_async(self.run_on_commit)(
+				lambda: self.client_for(self.bob).delete('/api/friends/alice/remove/')
+			)
+			self.assertEqual(response.status_code, 204)
+			self.assertEqual(await self.next_event(outbox), {'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+			await asyncio.wait_for(task, 5)
+
+		async_to_sync(scenario)()
+
+	def test_strangers_are_refused(self):
+		async def scenario():
+			self.token = await sync_to_async(Token.objects.create)(user=self.carol)
+			inbox, outbox = asyncio.Queue(), asyncio.Queue()
+			await inbox.put({'type': 'websocket.connect'})
+			await inbox.put({'type': 'websocket.receive', 'text': json.dumps({'type': 'auth', 'token': self.token.key})})
+			await thread_socket({'type': 'websocket', 'path': '/ws/messages/bob/'}, inbox.get, outbox.put)
+			self.assertEqual(await self.next_event(outbox), {'type': 'websocket.accept'})
+			self.assertEqual(await self.next_event(outbox), {'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+
+		async_to_sync(scenario)()
+
+
+class ReencryptMessagesTests(MessagingTestCase):
+	def setUp(self):
+		super().setUp()
+		directory = tempfile.TemporaryDirectory()
+		self.addCleanup(directory.cleanup)
+		self.checkpoint = os.path.join(directory.name, 'checkpoint.json')
+
+	def reencrypt(self, mode: str, **options):
+		options = {'workers': 1, 'batch_size': 2, 'checkpoint': self.checkpoint, 'restart': True, **options}
+		call_command('reencrypt_messages', mode=mode, stdout=io.StringIO(), **options)
+		return self.rows()
+
+	def rows(self):
+		return list(self.conversation.messages.order_by('id').values_list('content', 'encryption_type'))
+
+	def test_round_trip_restores_every_body(self):
+		Mode = EncryptionSetting.EncryptionMode
+		self.send(self.alice, 3)
+		self.send(self.bob, 2)
+		original = self.rows()
+		self.assertEqual({mode for _, mode in original}, {Mode.PLAINTEXT})
+
+		encrypted = self.reencrypt(Mode.WEAK_XOR)
+		self.assertEqual({mode for _, mode in encrypted}, {Mode.WEAK_XOR})
+		self.assertNotEqual(encrypted, original)
+		self.assertEqual([decrypt_message(content, mode) for content, mode in encrypted], [c for c, _ in original])
+
+		self.assertEqual(self.reencrypt(Mode.PLAINTEXT), original)
+
+	def test_resumes_from_the_checkpoint(self):
+		Mode = EncryptionSetting.EncryptionMode
+		self.send(self.alice, 5)
+		modes = [mode for _, mode in self.reencrypt(Mode.WEAK_XOR, max_batches=1)]
+		self.assertEqual(modes, [Mode.WEAK_XOR] * 2 + [Mode.PLAINTEXT] * 3)
+		modes = [mode for _, mode in self.reencrypt(Mode.WEAK_XOR, restart=False)]
+		self.assertEqual(modes, [Mode.WEAK_XOR] * 5)
+
+	def test_rejects_unsupported_targets(self):
+		self.send(self.alice, 1)
+		for mode in ('END_TO_END', 'END_TO_END_STEGO', 'ROT13'):
+			with self.assertRaisesMessage(CommandError, f'Clients cannot decode {mode}'):
+				self.reencrypt(mode)
+		with self.assertRaisesMessage(CommandError, '--batch-size'):
+			self.reencrypt('WEAK_XOR', batch_size=0)
+		self.assertEqual(self.conversation.messages.get().encryption_type, EncryptionSetting.EncryptionMode.PLAINTEXT)
+
+
+class ThreadFormatTests(MessagingTestCase):
+	def setUp(self):
+		super().setUp()
+		# Enough messages for the body to pass RESPONSE_COMPRESSION_MIN_BYTES.
+		self.send(self.bob, 10)
+		self.send(self.alice, 10)
+
+	def get_thread(self, **extra):
+		return self.client.get('/api/messages/bob/', **extra)
+
+	def test_compact_payload_matches_json(self):
+		full = self.get_thread().json()
+		response = self.get_thread(HTTP_ACCEPT='application/vnd.crypto-chat.compact+json')
+		self.assertEqual(response['Content-Type'], 'application/vnd.crypto-chat.compact+json')
+		compact = response.json()
+		self.assertEqual(self.client.get('/api/messages/bob/', {'format': 'compact'}).json(), compact)
+
+		participants = {user['id']: user for user in compact['participants']}
+		rebuilt = [dict(zip(compact['fields'], row)) for row in compact['results']]
+		for message in rebuilt:
+			message['sender'] = participants[message['sender']]
+		self.assertEqual(rebuilt, full['results'])
+		self.assertEqual((compact['next'], compact['previous']), (full['next'], full['previous']))
+
+	@skipIf(msgpack is None, 'msgpack is not installed')
+	def test_msgpack_is_negotiated_from_accept(self):
+		as_json = self.get_thread()
+		response = self.get_thread(HTTP_ACCEPT='application/msgpack')
+		self.assertEqual(response['Content-Type'], 'application/msgpack')
+		self.assertEqual(msgpack.unpackb(response.content), as_json.json())
+		self.assertNotEqual(response['ETag'], as_json['ETag'])
+
+		response = self.client.post(
+			'/api/messages/bob/', msgpack.packb({'content': 'packed'}), content_type='application/msgpack'
+		)
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.json()['content'], 'packed')
+
+	def test_encoding_follows_accept_encoding(self):
+		identity = self.get_thread()
+		self.assertNotIn('Content-Encoding', identity)
+		self.assertIn('Accept-Encoding', identity['Vary'])
+
+		response = self.get_thread(HTTP_ACCEPT_ENCODING='gzip')
+		self.assertEqual(response['Content-Encoding'], 'gzip')
+		self.assertEqual(gzip.decompress(response.content), identity.content)
+		self.assertEqual(response['ETag'], f'W/{identity["ETag"]}')
+
+		response = self.get_thread(HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0.5')
+		self.assertEqual(response['Content-Encoding'], 'gzip')
+		self.assertNotIn('Content-Encoding', self.get_thread(HTTP_ACCEPT_ENCODING='identity'))
+
+	@skipIf(brotli is None, 'brotli is not installed')
+	def test_brotli_is_preferred(self):
+		identity = self.get_thread()
+		response = self.get_thread(HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+		self.assertEqual(response['Content-Encoding'], 'br')
+		self.assertEqual(brotli.decompress(response.content), identity.content)
 
-# Create your tests here.
+	def test_weak_etag_of_a_compressed_body_revalidates(self):
+		etag = self.get_thread(HTTP_ACCEPT_ENCODING='gzip')['ETag']
+		self.assertTrue(etag.startswith('W/'))
+		response = self.get_thread(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response['ETag'], etag)
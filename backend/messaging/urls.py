@@ -1,7 +1,19 @@
 from django.urls import path
 
-from .views import MessageThreadView
+from .views import (
+    ConversationExportView,
+    ConversationImportView,
+    InboxView,
+    MessageBatchView,
+    MessageReadView,
+    MessageThreadView,
+)
 
 urlpatterns = [
+    path('', InboxView.as_view(), name='message-inbox'),
     path('<str:username>/', MessageThreadView.as_view(), name='message-thread'),
+    path('<str:username>/batch/', MessageBatchView.as_view(), name='message-thread-batch'),
+    path('<str:username>/read/', MessageReadView.as_view(), name='message-thread-read'),
+    path('<str:username>/export/', ConversationExportView.as_view(), name='message-thread-export'),
+    path('<str:username>/import/', ConversationImportView.as_view(), name='message-thread-import'),
 ]
@@ -1,12 +1,47 @@
+import codecs
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
 from rest_framework import permissions, status
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
+from friendships.cache import friend_set_cache
 from friendships.models import Friendship
 from encryption.services import get_current_mode
+from .export import (
+	DEFAULT_IMPORT_MAX_BYTES,
+	DEFAULT_IMPORT_MAX_RECORDS,
+	EXPORT_FORMATS,
+	ImportTooLarge,
+	InvalidImport,
+	aiter_chunks,
+	export_lines,
+	import_messages,
+	limit_bytes,
+	parse_records,
+)
 from .models import Conversation, Message
-from .serializers import MessageCreateSerializer, MessageSerializer
+from .pagination import InvalidCursor, paginate_thread, parse_page_size, sync_thread
+from .realtime import publish_event
+from .renderers import CSVRenderer, CompactThreadRenderer, NDJSONRenderer
+from .serializers import (
+	COMPACT_MESSAGE_COLUMNS,
+	ConversationSummarySerializer,
+	MessageBatchSerializer,
+	MessageCreateSerializer,
+	MessageReadSerializer,
+	MessageSerializer,
+	compact_messages,
+)
 
 User = get_user_model()
 
@@ -15,7 +50,13 @@ class AuthenticatedAPIView(APIView):
 	permission_classes = [permissions.IsAuthenticated]
 
 
-class MessageThreadView(AuthenticatedAPIView):
+class InboxView(AuthenticatedAPIView):
+	def get(self, request, *args, **kwargs):
+		conversations = Conversation.inbox_for(request.user)
+		return Response(ConversationSummarySerializer(conversations, many=True, context={'request': request}).data)
+
+
+class ThreadAPIView(AuthenticatedAPIView):
 	def get_target_user(self, username: str):
 		try:
 			return User.objects.get(username=username)
@@ -29,6 +70,112 @@ class MessageThreadView(AuthenticatedAPIView):
 			return Response({'detail': 'You are not friends yet.'}, status=status.HTTP_403_FORBIDDEN)
 		return None
 
+
+class MessageBatchView(AuthenticatedAPIView):
+	def post(self, request, username, *args, **kwargs):
+		serializer = MessageBatchSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		items = serializer.validated_data['messages']
+		for item in items:
+			# Items go to ``username`` unless they name another friend.
+			item.setdefault('to', username)
+
+		usernames = {item['to'] for item in items}
+		recipients = {user.username: user for user in User.objects.filter(username__in=usernames)}
+		friend_ids = friend_set_cache.friend_ids(request.user.id)
+		errors = []
+		for index, item in enumerate(items):
+			recipient = recipients.get(item['to'])
+			if recipient is None:
+				errors.append({'index': index, 'detail': 'User not found.'})
+			elif recipient.id == request.user.id:
+				errors.append({'index': index, 'detail': 'Cannot exchange messages with yourself.'})
+			elif recipient.id not in friend_ids:
+				errors.append({'index': index, 'detail': 'You are not friends yet.'})
+		if errors:
+			return Response(
+				{'detail': 'No messages were sent.', 'errors': errors},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+
+		mode = get_current_mode()
+		with transaction.atomic():
+			conversations = Conversation.get_or_create_many(request.user, {user.id for user in recipients.values()})
+			messages = [
+				Message(
+					conversation=conversations[recipients[item['to']].id],
+					sender=request.user,
+					content=item['content'],
+					encryption_type=mode,
+				)
+				for item in items
+			]
+			Message.objects.bulk_create(messages)
+			by_conversation = {}
+			for message in messages:
+				by_conversation.setdefault(message.conversation, []).append(message)
+			for conversation, conversation_messages in by_conversation.items():
+				conversation.record_messages(conversation_messages)
+
+		data = MessageSerializer(messages, many=True).data
+
+		def publish():
+			for message, message_data in zip(messages, data):
+				publish_event(message.conversation_id, 'message.created', message_data)
+
+		transaction.on_commit(publish)
+		return Response({'results': data}, status=status.HTTP_201_CREATED)
+
+
+class MessageThreadView(ThreadAPIView):
+	renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CompactThreadRenderer]
+
+	def is_compact(self, request) -> bool:
+		return isinstance(request.accepted_renderer, CompactThreadRenderer)
+
+	def get_sync_params(self, request):
+		since_id = request.query_params.get('since_id')
+		since = request.query_params.get('since')
+		if since_id not in (None, ''):
+			try:
+				since_id = int(since_id)
+			except ValueError as exc:
+				raise ValueError('since_id must be an integer.') from exc
+		else:
+			since_id = None
+		if since not in (None, ''):
+			since = parse_datetime(since)
+			if since is None:
+				raise ValueError('since must be an ISO 8601 timestamp.')
+		else:
+			since = None
+		return since_id, since
+
+	def get_validators(self, request, conversation):
+		latest_id = conversation.last_message_id or 0
+		last_modified = max(
+			filter(None, (conversation.last_activity_at, conversation.content_updated_at)),
+			default=conversation.created_at,
+		)
+		rewritten = conversation.content_updated_at.timestamp() if conversation.content_updated_at else 0
+		representation = 'compact' if self.is_compact(request) else 'full'
+		# JSON and MessagePack bodies of the same page must not share a validator.
+		media_type = request.accepted_media_type
+		query = request.META.get('QUERY_STRING', '')
+		digest = hashlib.md5(
+			f'{conversation.id}:{latest_id}:{rewritten}:{representation}:{media_type}:{query}'.encode('utf-8'),
+			usedforsecurity=False,
+		).hexdigest()
+		return f'"{digest}"', last_modified.timestamp()
+
+	@staticmethod
+	def with_validators(response, etag: str, last_modified: float):
+		response['ETag'] = etag
+		response['Last-Modified'] = http_date(last_modified)
+		patch_cache_control(response, private=True, no_cache=True)
+		patch_vary_headers(response, ['Accept'])
+		return response
+
 	def get(self, request, username, *args, **kwargs):
 		target = self.get_target_user(username)
 		if target is None:
@@ -38,9 +185,43 @@ class MessageThreadView(AuthenticatedAPIView):
 		if error_response:
 			return error_response
 
+		try:
+			limit = parse_page_size(request.query_params.get('limit'))
+			since_id, since = self.get_sync_params(request)
+		except ValueError as exc:
+			return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
 		conversation, _ = Conversation.get_or_create_between(request.user, target)
-		messages = conversation.messages.select_related('sender').all()
-		return Response(MessageSerializer(messages, many=True).data)
+		etag, last_modified = self.get_validators(request, conversation)
+		not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+		if not_modified is not None:
+			return self.with_validators(not_modified, etag, last_modified)
+
+		compact = self.is_compact(request)
+		if compact:
+			# Rows only; senders go out once in the participants table.
+			messages = conversation.messages.values_list(*COMPACT_MESSAGE_COLUMNS, named=True)
+		else:
+			messages = conversation.messages.select_related('sender')
+		try:
+			if since_id is not None or since is not None:
+				page = sync_thread(messages, limit, since_id=since_id, since=since)
+			else:
+				page = paginate_thread(
+					messages,
+					limit,
+					before=request.query_params.get('before'),
+					after=request.query_params.get('after'),
+				)
+		except InvalidCursor as exc:
+			return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+		if compact:
+			data = compact_messages(page.messages, [request.user, target])
+		else:
+			data = {'results': MessageSerializer(page.messages, many=True).data}
+		response = Response({**data, 'next': page.next_cursor, 'previous': page.previous_cursor})
+		return self.with_validators(response, etag, last_modified)
 
 	def post(self, request, username, *args, **kwargs):
 		target = self.get_target_user(username)
@@ -55,10 +236,120 @@ class MessageThreadView(AuthenticatedAPIView):
 		serializer.is_valid(raise_exception=True)
 
 		conversation, _ = Conversation.get_or_create_between(request.user, target)
-		message = Message.objects.create(
-			conversation=conversation,
-			sender=request.user,
-			content=serializer.validated_data['content'],
-			encryption_type=get_current_mode(),
+		with transaction.atomic():
+			message = Message.objects.create(
+				conversation=conversation,
+				sender=request.user,
+				content=serializer.validated_data['content'],
+				encryption_type=get_current_mode(),
+			)
+			conversation.record_messages([message])
+		data = MessageSerializer(message).data
+		transaction.on_commit(lambda: publish_event(conversation.id, 'message.created', data))
+		return Response(data, status=status.HTTP_201_CREATED)
+
+
+class MessageReadView(ThreadAPIView):
+	def post(self, request, username, *args, **kwargs):
+		target = self.get_target_user(username)
+		if target is None:
+			return Response({'detail': 'User not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+		error_response = self.ensure_friendship(request.user, target)
+		if error_response:
+			return error_response
+
+		serializer = MessageReadSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+
+		conversation, _ = Conversation.get_or_create_between(request.user, target)
+		conversation.mark_read(request.user, serializer.validated_data.get('message_id'))
+		conversation.refresh_from_db()
+		return Response(
+			{
+				'last_read_id': conversation.last_read_id_for(request.user),
+				'unread_count': conversation.unread_count_for(request.user),
+			}
+		)
+
+
+class ConversationExportView(ThreadAPIView):
+	renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+	def finalize_response(self, request, response, *args, **kwargs):
+		# Errors are rendered as JSON, whichever export format was negotiated.
+		if isinstance(response, Response) and response.content_type is None:
+			response.content_type = 'application/json'
+		return super().finalize_response(request, response, *args, **kwargs)
+
+	def get(self, request, username, *args, **kwargs):
+		target = self.get_target_user(username)
+		if target is None:
+			return Response({'detail': 'User not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+		error_response = self.ensure_friendship(request.user, target)
+		if error_response:
+			return error_response
+
+		conversation, _ = Conversation.get_or_create_between(request.user, target)
+		export_format = request.accepted_renderer.format
+		chunks = export_lines(conversation, export_format)
+		if isinstance(request._request, ASGIRequest):
+			# A synchronous iterator would be read to the end before the first byte is sent.
+			chunks = aiter_chunks(chunks)
+		response = StreamingHttpResponse(
+			chunks,
+			content_type=f'{EXPORT_FORMATS[export_format]}; charset=utf-8',
 		)
-		return Response(MessageSerializer(message).data, status=status.HTTP_201_CREATED)
+		filename = f'conversation-{request.user.username}-{target.username}.{export_format}'
+		response['Content-Disposition'] = f'attachment; filename="{filename}"'
+		return response
+
+
+class ConversationImportView(ThreadAPIView):
+	def post(self, request, username, *args, **kwargs):
+		target = self.get_target_user(username)
+		if target is None:
+			return Response({'detail': 'User not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+		error_response = self.ensure_friendship(request.user, target)
+		if error_response:
+			return error_response
+
+		# The body is read line by line rather than through request.data, so
+		# DATA_UPLOAD_MAX_MEMORY_SIZE does not apply; these limits do instead.
+		max_bytes = getattr(settings, 'MESSAGE_IMPORT_MAX_BYTES', DEFAULT_IMPORT_MAX_BYTES)
+		max_records = getattr(settings, 'MESSAGE_IMPORT_MAX_RECORDS', DEFAULT_IMPORT_MAX_RECORDS)
+		try:
+			content_length = int(request.META.get('CONTENT_LENGTH') or '')
+		except ValueError:
+			# Django reads a body sent without a length, e.g. chunked, as empty.
+			return Response(
+				{'detail': 'Import requests must send a Content-Length header.'},
+				status=status.HTTP_411_LENGTH_REQUIRED,
+			)
+		if content_length > max_bytes:
+			return Response(
+				{'detail': f'Import bodies are limited to {max_bytes} bytes.'},
+				status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+			)
+		if request.stream is None:
+			return Response({'detail': 'The import body is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+
+		import_format = 'csv' if request.content_type.startswith('text/csv') else 'ndjson'
+		conversation, _ = Conversation.get_or_create_between(request.user, target)
+		lines = codecs.iterdecode(limit_bytes(request.stream, max_bytes), 'utf-8')
+		try:
+			# Users can only import their own messages; storing records as the
+			# other participant would let anyone put words in a friend's mouth.
+			imported = import_messages(
+				conversation,
+				parse_records(lines, import_format),
+				senders={request.user.username: request.user.id},
+				max_records=max_records,
+			)
+		except ImportTooLarge as exc:
+			return Response({'detail': str(exc)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+		except (InvalidImport, UnicodeDecodeError) as exc:
+			return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+		return Response({'imported': imported}, status=status.HTTP_201_CREATED)
@@ -19,6 +19,8 @@ export const setAuthToken = (token: string | null) => {
   authToken = token;
 };
 
+export const getAuthToken = () => authToken;
+
 interface RequestOptions extends RequestInit {
   json?: unknown;
 }
@@ -55,10 +57,23 @@ export async function apiRequest<T>(path: string, options: RequestOptions = {}):
   return data as T;
 }
 
-export async function fetchProxyLogs(): Promise<ProxyLogEntry[]> {
-  return apiRequest<ProxyLogEntry[]>('/logs/');
+export async function fetchProxyLogs(afterSeq = 0): Promise<ProxyLogEntry[]> {
+  return apiRequest<ProxyLogEntry[]>(afterSeq > 0 ? `/logs/?after_seq=${afterSeq}` : '/logs/');
 }
 
 export async function clearProxyLogs(): Promise<void> {
   await apiRequest('/logs/', { method: 'DELETE' });
 }
+
+export function subscribeToProxyLogs(
+  afterSeq: number,
+  onEntry: (entry: ProxyLogEntry) => void,
+  onStatus: (connected: boolean) => void,
+): () => void {
+  // EventSource reconnects on its own and resumes from the last `id` it saw.
+  const source = new EventSource(`${API_BASE}/logs/stream/?after_seq=${afterSeq}`);
+  source.onopen = () => onStatus(true);
+  source.onerror = () => onStatus(false);
+  source.onmessage = (event) => onEntry(JSON.parse(event.data) as ProxyLogEntry);
+  return () => source.close();
+}
@@ -1,14 +1,49 @@
-import { apiRequest } from './client';
+import { apiRequest, getAuthToken } from './client';
 import { fetchActiveEncryptionSetting } from './encryption';
 import { decryptContent, encryptContent } from '../utils/encryption';
-import type { Message } from '../types';
-
-export async function fetchMessages(username: string): Promise<Message[]> {
-  const data = await apiRequest<Message[]>(`/messages/${username}/`);
-  return data.map((message) => ({
-    ...message,
-    content: decryptContent(message.content, message.encryption_type),
-  }));
+import type { CompactMessagePage, ConversationSummary, Message, MessagePage, User } from '../types';
+
+const REALTIME_BASE = import.meta.env.VITE_REALTIME_URL || null;
+
+export interface FetchMessagesOptions {
+  before?: string;
+  after?: string;
+  sinceId?: number;
+  limit?: number;
+}
+
+export async function fetchMessages(username: string, options: FetchMessagesOptions = {}): Promise<MessagePage> {
+  const params = new URLSearchParams();
+  if (options.before) params.set('before', options.before);
+  if (options.after) params.set('after', options.after);
+  if (options.sinceId !== undefined) params.set('since_id', String(options.sinceId));
+  if (options.limit) params.set('limit', String(options.limit));
+  // Compact pages send each sender once and messages as positional rows.
+  params.set('format', 'compact');
+  const data = await apiRequest<CompactMessagePage>(`/messages/${username}/?${params.toString()}`);
+  const senders = new Map<number, User>(data.participants.map((user) => [user.id, user]));
+  return {
+    next: data.next,
+    previous: data.previous,
+    results: data.results.map(([id, senderId, content, encryptionType, createdAt]) => ({
+      id,
+      sender: senders.get(senderId) ?? { id: senderId, username: '', is_staff: false },
+      content: decryptContent(content, encryptionType),
+      encryption_type: encryptionType,
+      created_at: createdAt,
+    })),
+  };
+}
+
+export async function fetchInbox(): Promise<ConversationSummary[]> {
+  return apiRequest<ConversationSummary[]>('/messages/');
+}
+
+export async function markThreadRead(username: string, messageId?: number) {
+  return apiRequest<{ last_read_id: number; unread_count: number }>(`/messages/${username}/read/`, {
+    method: 'POST',
+    json: messageId !== undefined ? { message_id: messageId } : {},
+  });
 }
 
 export async function sendMessage(username: string, content: string): Promise<Message> {
@@ -23,3 +58,68 @@ export async function sendMessage(username: string, content: string): Promise<Me
     content: decryptContent(response.content, response.encryption_type),
   };
 }
+
+// Close codes the server uses for auth, friendship and routing failures; retrying cannot help.
+const PERMANENT_CLOSE_CODES = new Set([4401, 4403, 4404]);
+const RECONNECT_BASE_MS = 1_000;
+const RECONNECT_MAX_MS = 30_000;
+
+export interface ThreadSubscriptionHandlers {
+  onMessage: (message: Message) => void;
+  // The socket is subscribed; messages sent while it was down must be fetched over REST.
+  onLive: () => void;
+  // The socket dropped; updates have to come from polling until onLive fires again.
+  onDown: () => void;
+}
+
+export function subscribeToThread(username: string, handlers: ThreadSubscriptionHandlers): (() => void) | null {
+  if (!REALTIME_BASE || !getAuthToken()) {
+    return null;
+  }
+  let socket: WebSocket | null = null;
+  let retryTimer: number | null = null;
+  let attempts = 0;
+  let closed = false;
+
+  const connect = () => {
+    const token = getAuthToken();
+    if (closed || !token) {
+      return;
+    }
+    const current = new WebSocket(`${REALTIME_BASE}/ws/messages/${username}/`);
+    socket = current;
+    // The token goes in the first frame, not the URL, so it never reaches access logs.
+    current.onopen = () => current.send(JSON.stringify({ type: 'auth', token }));
+    current.onmessage = (event) => {
+      const { event: kind, data } = JSON.parse(event.data) as { event: string; data: Message };
+      if (kind === 'subscribed') {
+        attempts = 0;
+        handlers.onLive();
+      } else if (kind === 'message.created') {
+        handlers.onMessage({ ...data, content: decryptContent(data.content, data.encryption_type) });
+      }
+    };
+    current.onclose = (event) => {
+      if (closed) {
+        return;
+      }
+      handlers.onDown();
+      if (PERMANENT_CLOSE_CODES.has(event.code)) {
+        return;
+      }
+      // Exponential backoff with full jitter, so clients do not reconnect in lockstep.
+      const ceiling = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** attempts);
+      attempts += 1;
+      retryTimer = window.setTimeout(connect, Math.random() * ceiling);
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    if (retryTimer !== null) {
+      window.clearTimeout(retryTimer);
+    }
+    socket?.close();
+  };
+}
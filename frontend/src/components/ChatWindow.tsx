@@ -1,25 +1,31 @@
 import { useCallback, useEffect, useRef, useState } from 'react';
-import { fetchMessages, sendMessage } from '../api/messages';
+import { fetchMessages, markThreadRead, sendMessage, subscribeToThread } from '../api/messages';
 import type { Message, User } from '../types';
 
+const SYNC_INTERVAL_MS = 5_000;
+
 interface Props {
   friend: User | null;
 }
 
 export function ChatWindow({ friend }: Props) {
   const [messages, setMessages] = useState<Message[]>([]);
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
   const [messageText, setMessageText] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement | null>(null);
+  const lastSeenIdRef = useRef<number | null>(null);
 
   const scrollToBottom = useCallback(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, []);
 
   useEffect(() => {
+    lastSeenIdRef.current = null;
     if (!friend) {
       setMessages([]);
+      setOlderCursor(null);
       return;
     }
 
@@ -27,8 +33,10 @@ export function ChatWindow({ friend }: Props) {
       setLoading(true);
       setError(null);
       try {
-        const data = await fetchMessages(friend.username);
-        setMessages(data);
+        const page = await fetchMessages(friend.username);
+        setMessages(page.results);
+        setOlderCursor(page.previous);
+        lastSeenIdRef.current = page.results.length > 0 ? page.results[page.results.length - 1].id : 0;
       } catch (err) {
         console.error(err);
         setError('Failed to load messages.');
@@ -45,13 +53,109 @@ export function ChatWindow({ friend }: Props) {
     scrollToBottom();
   }, [messages.length, scrollToBottom]);
 
+  useEffect(() => {
+    if (messages.length > 0) {
+      lastSeenIdRef.current = messages[messages.length - 1].id;
+    }
+  }, [messages]);
+
+  const latestMessageId = messages.length > 0 ? messages[messages.length - 1].id : null;
+  useEffect(() => {
+    if (!friend || latestMessageId === null) {
+      return;
+    }
+    markThreadRead(friend.username, latestMessageId).catch((err) => console.error(err));
+  }, [friend, latestMessageId]);
+
+  useEffect(() => {
+    if (!friend) {
+      return;
+    }
+
+    const appendMessages = (incoming: Message[]) => {
+      setMessages((prev) => {
+        const known = new Set(prev.map((message) => message.id));
+        return [...prev, ...incoming.filter((message) => !known.has(message.id))];
+      });
+    };
+
+    let syncing = false;
+    const syncNewer = async () => {
+      const sinceId = lastSeenIdRef.current;
+      if (sinceId === null || syncing) {
+        return;
+      }
+      syncing = true;
+      try {
+        // since_id returns one page; follow `next` until nothing newer is left.
+        let page = await fetchMessages(friend.username, { sinceId });
+        for (;;) {
+          if (page.results.length > 0) {
+            appendMessages(page.results);
+          }
+          if (!page.next) {
+            break;
+          }
+          page = await fetchMessages(friend.username, { after: page.next });
+        }
+      } catch (err) {
+        console.error(err);
+      } finally {
+        syncing = false;
+      }
+    };
+
+    // Poll until the socket is live, and again whenever it drops.
+    let timer: number | null = null;
+    const startPolling = () => {
+      if (timer === null) {
+        timer = window.setInterval(syncNewer, SYNC_INTERVAL_MS);
+      }
+    };
+    const stopPolling = () => {
+      if (timer !== null) {
+        window.clearInterval(timer);
+        timer = null;
+      }
+    };
+
+    startPolling();
+    const unsubscribe = subscribeToThread(friend.username, {
+      onMessage: (message) => appendMessages([message]),
+      onLive: () => {
+        stopPolling();
+        syncNewer();
+      },
+      onDown: startPolling,
+    });
+
+    return () => {
+      stopPolling();
+      unsubscribe?.();
+    };
+  }, [friend]);
+
+  const handleLoadOlder = async () => {
+    if (!friend || !olderCursor) {
+      return;
+    }
+    try {
+      const page = await fetchMessages(friend.username, { before: olderCursor });
+      setMessages((prev) => [...page.results, ...prev]);
+      setOlderCursor(page.previous);
+    } catch (err) {
+      console.error(err);
+      setError('Failed to load older messages.');
+    }
+  };
+
   const handleSend = async () => {
     if (!friend || !messageText.trim()) {
       return;
     }
     try {
       const newMessage = await sendMessage(friend.username, messageText.trim());
-      setMessages((prev) => [...prev, newMessage]);
+      setMessages((prev) => (prev.some((message) => message.id === newMessage.id) ? prev : [...prev, newMessage]));
       setMessageText('');
       setError(null);
       scrollToBottom();
@@ -70,6 +174,7 @@ export function ChatWindow({ friend }: Props) {
         <>
           <div className="messages" aria-live="polite">
             {loading && <p>Loading conversation…</p>}
+            {olderCursor && <button onClick={handleLoadOlder}>Load older messages</button>}
             {messages.map((message) => (
               <div key={message.id} className="message">
                 <div className="message-meta">
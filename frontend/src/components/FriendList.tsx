@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react';
 import { fetchFriends, removeFriend } from '../api/friends';
+import { fetchInbox } from '../api/messages';
 import type { User } from '../types';
 
 interface Props {
@@ -10,6 +11,7 @@ interface Props {
 
 export function FriendList({ activeFriend, onSelectFriend, refreshTrigger }: Props) {
   const [friends, setFriends] = useState<User[]>([]);
+  const [unreadCounts, setUnreadCounts] = useState<Record<number, number>>({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -17,8 +19,11 @@ export function FriendList({ activeFriend, onSelectFriend, refreshTrigger }: Pro
     setLoading(true);
     setError(null);
     try {
-      const data = await fetchFriends();
+      const [data, inbox] = await Promise.all([fetchFriends(), fetchInbox()]);
       setFriends(data);
+      setUnreadCounts(
+        Object.fromEntries(inbox.map((conversation) => [conversation.participant.id, conversation.unread_count])),
+      );
       if (data.length > 0 && (!activeFriend || !data.some((f) => f.id === activeFriend.id))) {
         onSelectFriend(data[0]);
       }
@@ -69,6 +74,7 @@ export function FriendList({ activeFriend, onSelectFriend, refreshTrigger }: Pro
             <li key={friend.id} className={activeFriend?.id === friend.id ? 'active' : ''}>
               <button className="link" onClick={() => onSelectFriend(friend)}>
                 {friend.username}
+                {activeFriend?.id !== friend.id && (unreadCounts[friend.id] ?? 0) > 0 && ` (${unreadCounts[friend.id]})`}
               </button>
               <button className="danger" onClick={() => handleRemove(friend)}>
                 Remove
@@ -1,18 +1,29 @@
-import { useEffect, useState } from 'react';
-import { clearProxyLogs, fetchProxyLogs } from '../api/client';
+import { useEffect, useRef, useState } from 'react';
+import { clearProxyLogs, fetchProxyLogs, subscribeToProxyLogs } from '../api/client';
 import type { ProxyLogEntry } from '../types';
 
+const MAX_ENTRIES = 1000;
+
 export function ProxyLogViewer() {
   const [entries, setEntries] = useState<ProxyLogEntry[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [live, setLive] = useState(false);
+  const lastSeqRef = useRef(0);
+
+  const appendEntries = (data: ProxyLogEntry[]) => {
+    const fresh = data.filter((entry) => entry.seq > lastSeqRef.current);
+    if (fresh.length > 0) {
+      lastSeqRef.current = fresh[fresh.length - 1].seq;
+      setEntries((prev) => [...fresh.slice().reverse(), ...prev].slice(0, MAX_ENTRIES));
+    }
+  };
 
   const loadLogs = async () => {
     setLoading(true);
     setError(null);
     try {
-      const data = await fetchProxyLogs();
-      setEntries(data.slice().reverse());
+      appendEntries(await fetchProxyLogs(lastSeqRef.current));
     } catch (err) {
       console.error(err);
       setError('Failed to fetch proxy logs.');
@@ -22,12 +33,14 @@ export function ProxyLogViewer() {
   };
 
   useEffect(() => {
-    loadLogs();
+    // The stream replays everything after the last seen entry, then pushes new ones.
+    return subscribeToProxyLogs(lastSeqRef.current, (entry) => appendEntries([entry]), setLive);
   }, []);
 
   const handleClear = async () => {
     try {
       await clearProxyLogs();
+      setEntries([]);
       await loadLogs();
     } catch (err) {
       console.error(err);
@@ -38,7 +51,7 @@ export function ProxyLogViewer() {
   return (
     <section className="panel proxy-log">
       <div className="panel-header">
-        <h3>Proxy Traffic</h3>
+        <h3>Proxy Traffic {live ? '(live)' : '(offline)'}</h3>
         <div className="panel-actions">
           <button onClick={loadLogs}>Refresh</button>
           <button onClick={handleClear}>Clear</button>
@@ -51,8 +64,8 @@ export function ProxyLogViewer() {
           <p>No captured traffic yet.</p>
         ) : (
           <ul>
-            {entries.map((entry, index) => (
-              <li key={`${entry.timestamp}-${index}`}>
+            {entries.map((entry) => (
+              <li key={entry.seq}>
                 <div className="log-meta">
                   <span className={`direction ${entry.direction}`}>{entry.direction}</span>
                   <time>{new Date(entry.timestamp).toLocaleString()}</time>
@@ -31,6 +31,30 @@ export interface Message {
   created_at: string;
 }
 
+export interface MessagePage {
+  results: Message[];
+  next: string | null;
+  previous: string | null;
+}
+
+export type CompactMessageRow = [number, number, string, EncryptionMode, string];
+
+export interface CompactMessagePage {
+  participants: User[];
+  fields: string[];
+  results: CompactMessageRow[];
+  next: string | null;
+  previous: string | null;
+}
+
+export interface ConversationSummary {
+  id: number;
+  participant: User;
+  last_message: Message | null;
+  last_activity_at: string | null;
+  unread_count: number;
+}
+
 export type EncryptionMode =
   | 'PLAINTEXT'
   | 'WEAK_XOR'
@@ -43,6 +67,7 @@ export interface EncryptionSetting {
 }
 
 export interface ProxyLogEntry {
+  seq: number;
   direction: 'client_to_server' | 'server_to_client';
   timestamp: string;
   path: string;
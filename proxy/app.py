@@ -1,17 +1,133 @@
+import atexit
+import json
 import os
+import threading
+import time
+import zlib
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, make_response, request
 from flask_cors import CORS
+from requests.adapters import HTTPAdapter
+from requests.utils import get_encoding_from_headers
+from urllib3.util.retry import Retry
+
+try:
+    import brotli
+except ImportError:  # Only needed to show brotli-encoded bodies in the traffic log.
+    brotli = None
+
+from capture_store import CaptureStore
+from log_stream import (
+    KEEPALIVE,
+    OVERFLOW,
+    LogBroadcaster,
+    Subscription,
+    ThreadSubscription,
+    format_entry,
+    format_overflow,
+    format_retry,
+    resume_seq,
+)
+from metrics import ProxyMetrics
+from recorder import TrafficRecorder
+from response_cache import CacheKey, CachedResponse, ResponseCache
+from traffic_log import TrafficLog, parse_log_query
 
 app = Flask(__name__)
 CORS(app)
 app.url_map.strict_slashes = False
 
 BACKEND_URL = os.environ.get('BACKEND_URL', 'http://localhost:8000')
-TRAFFIC_LOG: list[Dict[str, Any]] = []
+CAPTURE_DIR = os.environ.get('PROXY_CAPTURE_DIR')
+CAPTURE_STORE: Optional[CaptureStore] = (
+    CaptureStore(
+        CAPTURE_DIR,
+        segment_bytes=int(os.environ.get('PROXY_CAPTURE_SEGMENT_BYTES', str(64 * 1024 * 1024))),
+        index_interval=int(os.environ.get('PROXY_CAPTURE_INDEX_INTERVAL', '256')),
+        max_segments=int(os.environ.get('PROXY_CAPTURE_MAX_SEGMENTS', '0')),
+    )
+    if CAPTURE_DIR
+    else None
+)
+TRAFFIC_LOG = TrafficLog(
+    capacity=int(os.environ.get('PROXY_LOG_CAPACITY', '1000')),
+    start_seq=CAPTURE_STORE.last_seq + 1 if CAPTURE_STORE else 1,
+)
+RECORD_LOCK = threading.Lock()
+LOG_BROADCASTER = LogBroadcaster(max_queue=int(os.environ.get('PROXY_LOG_STREAM_QUEUE_SIZE', '1000')))
+LOG_STREAM_KEEPALIVE = float(os.environ.get('PROXY_LOG_STREAM_KEEPALIVE', '15'))
+RESPONSE_CACHE = ResponseCache(
+    routes=[route for route in os.environ.get('PROXY_CACHE_ROUTES', '/encryption/mode/').split(',') if route],
+    ttl=float(os.environ.get('PROXY_CACHE_TTL', '30')),
+    max_entries=int(os.environ.get('PROXY_CACHE_MAX_ENTRIES', '1024')),
+    max_bytes=int(os.environ.get('PROXY_CACHE_MAX_BYTES', str(8 * 1024 * 1024))),
+)
+METRICS = ProxyMetrics(max_series=int(os.environ.get('PROXY_METRICS_MAX_SERIES', '500')))
+PASSTHROUGH_RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+STREAMED_RESPONSE_HEADERS = ('Content-Type', 'Content-Encoding', 'Content-Length', 'Vary') + PASSTHROUGH_RESPONSE_HEADERS
+CACHED_RESPONSE_HEADERS = ('Content-Type',) + PASSTHROUGH_RESPONSE_HEADERS
+PASSTHROUGH = os.environ.get('PROXY_PASSTHROUGH', 'true').lower() in {'1', 'true', 'yes'}
+STREAM_CHUNK_BYTES = int(os.environ.get('PROXY_STREAM_CHUNK_BYTES', '65536'))
+
+POOL_CONNECTIONS = int(os.environ.get('PROXY_POOL_CONNECTIONS', '4'))
+POOL_MAXSIZE = int(os.environ.get('PROXY_POOL_MAXSIZE', '32'))
+POOL_BLOCK = os.environ.get('PROXY_POOL_BLOCK', 'false').lower() in {'1', 'true', 'yes'}
+RETRY_TOTAL = int(os.environ.get('PROXY_RETRIES', '2'))
+RETRY_BACKOFF = float(os.environ.get('PROXY_RETRY_BACKOFF', '0.1'))
+CONNECT_TIMEOUT = float(os.environ.get('PROXY_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.environ.get('PROXY_READ_TIMEOUT', '10'))
+
+
+def build_session() -> requests.Session:
+    # Retries cover connection failures for every method and read failures
+    # only for idempotent ones, so a POST is never sent twice.
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        status_forcelist=(),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=POOL_BLOCK,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+SESSION = build_session()
+
+
+def pool_stats() -> Dict[str, Any]:
+    pools = {}
+    for adapter in set(SESSION.adapters.values()):
+        manager = adapter.poolmanager
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools[f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests,
+                'idle': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                'maxsize': POOL_MAXSIZE,
+            }
+    return {
+        'pool_connections': POOL_CONNECTIONS,
+        'pool_maxsize': POOL_MAXSIZE,
+        'pool_block': POOL_BLOCK,
+        'retries': RETRY_TOTAL,
+        'timeout': {'connect': CONNECT_TIMEOUT, 'read': READ_TIMEOUT},
+        'hosts': pools,
+    }
 
 
 def iso_timestamp() -> str:
@@ -19,7 +135,7 @@ def iso_timestamp() -> str:
 
 
 def filtered_headers(source_headers) -> Dict[str, str]:
-    allowed = {'authorization', 'content-type'}
+    allowed = {'authorization', 'content-type', 'accept', 'if-none-match', 'if-modified-since'}
     return {
         key: value
         for key, value in source_headers.items()
@@ -27,92 +143,388 @@ def filtered_headers(source_headers) -> Dict[str, str]:
     }
 
 
+def streamed_headers(source_headers) -> Dict[str, str]:
+    """Backend headers for a relay whose body reaches the client undecoded.
+
+    The backend may only use content codings the client itself accepts, so the
+    client's Accept-Encoding replaces the HTTP library's default.
+    """
+    headers = filtered_headers(source_headers)
+    accept_encoding = next(
+        (value for key, value in source_headers.items() if key.lower() == 'accept-encoding'),
+        'identity',
+    )
+    return {**headers, 'Accept-Encoding': accept_encoding}
+
+
+def media_type(content_type: Optional[str]) -> str:
+    return (content_type or '').split(';', 1)[0].strip().lower()
+
+
+def is_textual(content_type: Optional[str]) -> bool:
+    """Whether a body can be logged and re-served as JSON or text rather than raw bytes."""
+    kind = media_type(content_type)
+    return not kind or kind.startswith('text/') or kind == 'application/json' or kind.endswith('+json')
+
+
+def describe_body(body: bytes, content_type: Optional[str]) -> str:
+    return f'<{len(body)} bytes, {media_type(content_type) or "unknown type"}>'
+
+
 def record(entry: Dict[str, Any]) -> None:
-    TRAFFIC_LOG.append(entry)
-    if len(TRAFFIC_LOG) > 1000:
-        TRAFFIC_LOG.pop(0)
+    # One lock keeps the disk capture in the same seq order as the ring buffer.
+    with RECORD_LOCK:
+        TRAFFIC_LOG.append(entry)
+        if CAPTURE_STORE is not None:
+            CAPTURE_STORE.append(entry)
+        LOG_BROADCASTER.publish(entry)
+
+
+RECORDER = TrafficRecorder(
+    record,
+    queue_size=int(os.environ.get('PROXY_LOG_QUEUE_SIZE', '10000')),
+    sample_rate=float(os.environ.get('PROXY_LOG_SAMPLE_RATE', '1.0')),
+    max_payload_bytes=int(os.environ.get('PROXY_LOG_MAX_PAYLOAD_BYTES', '65536')),
+)
+# atexit runs handlers in reverse, so the recorder drains into the store before it closes.
+if CAPTURE_STORE is not None:
+    atexit.register(CAPTURE_STORE.close)
+atexit.register(RECORDER.stop)
+
+
+def query_logs(params: Dict[str, Any], source: Optional[str]) -> List[Dict[str, Any]]:
+    if source == 'capture':
+        if CAPTURE_STORE is None:
+            raise ValueError('Disk capture is disabled; set PROXY_CAPTURE_DIR.')
+        return CAPTURE_STORE.query(**params)
+    if source not in (None, '', 'memory'):
+        raise ValueError('source must be memory or capture.')
+    return TRAFFIC_LOG.query(**params)
+
+
+def open_log_stream(subscription: Subscription, after_seq: Optional[int]) -> List[Dict[str, Any]]:
+    """Register ``subscription`` and return the buffered entries it should replay first.
+
+    Holding ``RECORD_LOCK`` puts every entry either in the replay or in the
+    live queue, never both or neither.
+    """
+    with RECORD_LOCK:
+        LOG_BROADCASTER.subscribe(subscription)
+        if after_seq is None:
+            return []
+        return TRAFFIC_LOG.query(after_seq=after_seq, **subscription.filters)
+
+
+def route_paths(prefix: str, subpath: str = '') -> Tuple[str, str]:
+    normalized = subpath.strip('/')
+    backend_path = f"/api/{prefix}/{normalized}/" if normalized else f"/api/{prefix}/"
+    frontend_path = f"/{prefix}/{normalized}/" if normalized else f"/{prefix}/"
+    return backend_path, frontend_path
 
 
-def forward_request(
+def request_entry(
     method: str,
     frontend_path: str,
-    backend_path: str,
     payload: Optional[Dict[str, Any]],
-):
-    url = f"{BACKEND_URL}{backend_path}"
-    headers = filtered_headers(request.headers)
+    headers: Dict[str, str],
+    query: Dict[str, list],
+    timestamp: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        'direction': 'client_to_server',
+        'timestamp': timestamp or iso_timestamp(),
+        'path': frontend_path,
+        'method': method,
+        'payload': payload,
+        'headers': headers,
+        'query': query,
+    }
 
-    record(
-        {
-            'direction': 'client_to_server',
-            'timestamp': iso_timestamp(),
-            'path': frontend_path,
-            'method': method,
-            'payload': payload,
-            'headers': headers,
-            'query': request.args.to_dict(flat=False),
-        }
-    )
 
-    response = requests.request(
-        method,
-        url,
-        headers=headers,
-        json=payload,
-        params=request.args,
-        timeout=10,
-    )
+def response_entry(
+    method: str,
+    frontend_path: str,
+    status_code: int,
+    payload: Any,
+    headers: Dict[str, str],
+    timestamp: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        'direction': 'server_to_client',
+        'timestamp': timestamp or iso_timestamp(),
+        'path': frontend_path,
+        'method': method,
+        'payload': payload,
+        'status_code': status_code,
+        'headers': headers,
+    }
+
 
-    has_json = False
-    response_data: Optional[Any]
-    if response.status_code == 204 or not response.content:
-        response_data = None
-    else:
+def decode_response_body(
+    status_code: int,
+    content: bytes,
+    encoding: Optional[str],
+    content_type: Optional[str] = None,
+) -> Tuple[Optional[Any], bool]:
+    if status_code == 204 or not content:
+        return None, False
+    if not is_textual(content_type):
+        return describe_body(content, content_type), False
+    try:
+        return json.loads(content), True
+    except ValueError:
+        return content.decode(encoding or 'utf-8', errors='replace'), False
+
+
+def passthrough_headers(source_headers, names=PASSTHROUGH_RESPONSE_HEADERS) -> Dict[str, str]:
+    return {
+        key: source_headers[key]
+        for key in names
+        if key in source_headers
+    }
+
+
+def decode_streamed_body(status_code: int, chunks: List[bytes], source_headers) -> Optional[Any]:
+    """Rebuild the logged payload from relayed raw chunks; runs on the recorder thread."""
+    content = b''.join(chunks)
+    content_encoding = source_headers.get('Content-Encoding', '').lower()
+    if content and content_encoding in {'gzip', 'deflate'}:
         try:
-            response_data = response.json()
-            has_json = True
-        except ValueError:
-            response_data = response.text
-
-    record(
-        {
-            'direction': 'server_to_client',
-            'timestamp': iso_timestamp(),
-            'path': frontend_path,
-            'method': method,
-            'payload': response_data,
-            'status_code': response.status_code,
-            'headers': dict(response.headers),
-        }
+            content = zlib.decompress(content, zlib.MAX_WBITS | 32)
+        except zlib.error:
+            return f'<{len(content)} bytes, undecodable {content_encoding} body>'
+    elif content and content_encoding == 'br' and brotli is not None:
+        try:
+            content = brotli.decompress(content)
+        except brotli.error:
+            return f'<{len(content)} bytes, undecodable br body>'
+    elif content and content_encoding:
+        return f'<{len(content)} bytes, {content_encoding}-encoded>'
+    response_data, _ = decode_response_body(
+        status_code,
+        content,
+        get_encoding_from_headers(source_headers),
+        source_headers.get('Content-Type'),
     )
+    return response_data
+
+
+def submit_request_entry(method: str, frontend_path: str, headers: Dict[str, str], args) -> None:
+    body, content_type = request.get_data(), request.content_type
+    sent_at = iso_timestamp()
+    RECORDER.submit(
+        lambda: request_entry(
+            method,
+            frontend_path,
+            extract_payload(method, body, content_type),
+            headers,
+            args.to_dict(flat=False),
+            sent_at,
+        )
+    )
+
 
-    return response.status_code, response_data, has_json
+def forward_request(method: str, frontend_path: str, backend_path: str, started: float):
+    url = f"{BACKEND_URL}{backend_path}"
+    headers = filtered_headers(request.headers)
+    args = request.args
+
+    # Entries, including the parsed request payload, are only assembled on the
+    # recorder thread; the request path just captures timestamps and references.
+    sampled = RECORDER.sample()
+    if sampled:
+        submit_request_entry(method, frontend_path, headers, args)
+
+    backend_started = time.perf_counter()
+    try:
+        response = SESSION.request(
+            method,
+            url,
+            headers=headers,
+            data=request.get_data() or None,
+            params=request.args,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        )
+    except requests.RequestException:
+        failed_at = time.perf_counter()
+        METRICS.observe(method, frontend_path, None, failed_at - backend_started, failed_at - started)
+        raise
+    backend_seconds = time.perf_counter() - backend_started
+
+    content_type = response.headers.get('Content-Type')
+    response_data, has_json = decode_response_body(
+        response.status_code, response.content, response.encoding, content_type
+    )
+    if sampled:
+        received_at = iso_timestamp()
+        RECORDER.submit(
+            lambda: response_entry(
+                method, frontend_path, response.status_code, response_data, dict(response.headers), received_at
+            )
+        )
+
+    METRICS.observe(method, frontend_path, response.status_code, backend_seconds, time.perf_counter() - started)
+    passthrough = passthrough_headers(response.headers)
+    if response.content and not is_textual(content_type):
+        # Binary formats such as MessagePack are relayed byte for byte.
+        return response.status_code, response.content, False, {**passthrough, 'Content-Type': content_type}
+    return response.status_code, response_data, has_json, passthrough
+
+
+def stream_request(method: str, frontend_path: str, backend_path: str, started: float) -> Response:
+    """Relay the backend body to the client chunk by chunk without decoding it.
+
+    Chunks are only retained, and parsed later by the recorder, when the
+    exchange is sampled for the traffic log.
+    """
+    url = f"{BACKEND_URL}{backend_path}"
+    headers = streamed_headers(request.headers)
+    args = request.args
+
+    sampled = RECORDER.sample()
+    if sampled:
+        submit_request_entry(method, frontend_path, headers, args)
+
+    backend_started = time.perf_counter()
+    try:
+        response = SESSION.request(
+            method,
+            url,
+            headers=headers,
+            data=request.get_data() or None,
+            params=args,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True,
+        )
+    except requests.RequestException:
+        failed_at = time.perf_counter()
+        METRICS.observe(method, frontend_path, None, failed_at - backend_started, failed_at - started)
+        raise
+    backend_seconds = time.perf_counter() - backend_started
+    status_code = response.status_code
+    response_headers = response.headers
+    chunks: Optional[List[bytes]] = [] if sampled else None
+
+    def body():
+        for chunk in response.raw.stream(STREAM_CHUNK_BYTES, decode_content=False):
+            if chunks is not None:
+                chunks.append(chunk)
+            yield chunk
+
+    def finish():
+        # Runs when the WSGI server closes the response, even if the body was
+        # never iterated (204/304, HEAD, client gone).
+        response.close()
+        if chunks is not None:
+            received_at = iso_timestamp()
+            RECORDER.submit(
+                lambda: response_entry(
+                    method,
+                    frontend_path,
+                    status_code,
+                    decode_streamed_body(status_code, chunks, response_headers),
+                    dict(response_headers),
+                    received_at,
+                )
+            )
+
+    relayed = Response(
+        body(),
+        status=status_code,
+        headers=passthrough_headers(response_headers, STREAMED_RESPONSE_HEADERS),
+    )
+    relayed.call_on_close(finish)
+    # Body transfer depends on the client, so it counts towards neither histogram.
+    METRICS.observe(method, frontend_path, status_code, backend_seconds, time.perf_counter() - started)
+    return relayed
 
 
-def extract_payload() -> Optional[Dict[str, Any]]:
-    if request.method in {'GET', 'HEAD'}:
+def extract_payload(method: str, body: bytes, content_type: Optional[str]) -> Optional[Any]:
+    """Request body as shown in the traffic log; the raw bytes are what gets forwarded."""
+    if method in {'GET', 'HEAD'} or not body:
         return None
-    return request.get_json(silent=True)
+    kind = media_type(content_type)
+    if kind == 'application/json' or kind.endswith('+json'):
+        try:
+            return json.loads(body)
+        except ValueError:
+            pass
+    return describe_body(body, content_type)
+
+
+def buffered_response(status_code: int, response_data: Any, has_json: bool, passthrough: Dict[str, str]) -> Response:
+    if status_code in {204, 304} or response_data is None:
+        return make_response('', status_code, passthrough)
+    if isinstance(response_data, bytes):
+        return make_response(response_data, status_code, passthrough)
+    if has_json:
+        return make_response(jsonify(response_data), status_code, passthrough)
+    return make_response(response_data, status_code, {**passthrough, 'Content-Type': 'text/plain; charset=utf-8'})
+
+
+def cached_request(frontend_path: str, backend_path: str, cache_key: CacheKey, started: float) -> Response:
+    method = request.method
+    cached = RESPONSE_CACHE.get(cache_key)
+    if cached is None:
+        generation = RESPONSE_CACHE.generation
+        response = buffered_response(*forward_request(method, frontend_path, backend_path, started))
+        RESPONSE_CACHE.put(
+            cache_key,
+            CachedResponse(
+                response.status_code,
+                passthrough_headers(response.headers, CACHED_RESPONSE_HEADERS),
+                response.get_data(),
+            ),
+            generation,
+        )
+        response.headers['X-Proxy-Cache'] = 'MISS'
+        return response
+
+    headers = {**cached.headers, 'X-Proxy-Cache': 'HIT'}
+    if RECORDER.sample():
+        request_headers = filtered_headers(request.headers)
+        args = request.args
+        served_at = iso_timestamp()
+        RECORDER.submit(
+            lambda: request_entry(method, frontend_path, None, request_headers, args.to_dict(flat=False), served_at)
+        )
+        RECORDER.submit(
+            lambda: response_entry(
+                method,
+                frontend_path,
+                cached.status_code,
+                decode_response_body(cached.status_code, cached.body, None, cached.headers.get('Content-Type'))[0],
+                headers,
+                served_at,
+            )
+        )
+    METRICS.observe(method, frontend_path, cached.status_code, 0.0, time.perf_counter() - started)
+    return Response(cached.body, status=cached.status_code, headers=headers)
 
 
 def relay(prefix: str, subpath: str = ''):
-    normalized = subpath.strip('/')
-    backend_path = f"/api/{prefix}/{normalized}/" if normalized else f"/api/{prefix}/"
-    frontend_path = f"/{prefix}/{normalized}/" if normalized else f"/{prefix}/"
+    started = time.perf_counter()
+    backend_path, frontend_path = route_paths(prefix, subpath)
     if request.method == 'OPTIONS':
         return '', 204
-    payload = extract_payload()
-    status_code, response_data, has_json = forward_request(
+    cache_key = RESPONSE_CACHE.key_for(
         request.method,
         frontend_path,
-        backend_path,
-        payload,
+        request.query_string.decode('latin-1'),
+        request.headers.get('Authorization'),
+        request.headers.get('Accept'),
     )
-    if status_code == 204 or response_data is None:
-        return '', status_code
-    if has_json:
-        return jsonify(response_data), status_code
-    return response_data, status_code, {'Content-Type': 'text/plain; charset=utf-8'}
+    if cache_key is not None:
+        return cached_request(frontend_path, backend_path, cache_key, started)
+    if PASSTHROUGH:
+        return stream_request(request.method, frontend_path, backend_path, started)
+    return buffered_response(*forward_request(request.method, frontend_path, backend_path, started))
+
+
+@app.errorhandler(requests.RequestException)
+def backend_unavailable(error: requests.RequestException):
+    # Connection failures and timeouts towards the backend; same reply as the ASGI engine.
+    return jsonify({'detail': 'Backend unavailable.'}), 502
 
 
 @app.route('/auth/', defaults={'subpath': ''}, methods=['GET', 'POST'])
@@ -142,20 +554,77 @@ def proxy_encryption(subpath: str):
 @app.route('/admin/', defaults={'subpath': ''}, methods=['GET', 'POST', 'PATCH', 'PUT', 'DELETE', 'OPTIONS'])
 @app.route('/admin/<path:subpath>', methods=['GET', 'POST', 'PATCH', 'PUT', 'DELETE', 'OPTIONS'])
 def proxy_admin(subpath: str):
-    return relay('admin', subpath)
+    response = relay('admin', subpath)
+    if request.method not in {'GET', 'OPTIONS'}:
+        # Admin writes change what the cached encryption routes return.
+        RESPONSE_CACHE.invalidate()
+    return response
 
 
 @app.route('/logs/', methods=['GET', 'DELETE'])
 def message_logs():
     if request.method == 'DELETE':
         TRAFFIC_LOG.clear()
+        if CAPTURE_STORE is not None and request.args.get('source') == 'capture':
+            CAPTURE_STORE.clear()
         return jsonify({'detail': 'Log cleared.'})
-    return jsonify(TRAFFIC_LOG)
+    try:
+        params = parse_log_query(request.args.get)
+        entries = query_logs(params, request.args.get('source'))
+    except ValueError as exc:
+        return jsonify({'detail': str(exc)}), 400
+    return jsonify(entries)
+
+
+@app.route('/logs/stream/', methods=['GET'])
+def stream_logs():
+    try:
+        params = parse_log_query(request.args.get)
+        after_seq = resume_seq(params, request.headers.get('Last-Event-ID'))
+    except ValueError as exc:
+        return jsonify({'detail': str(exc)}), 400
+    subscription = ThreadSubscription(params, LOG_BROADCASTER.max_queue)
+    backlog = open_log_stream(subscription, after_seq)
+
+    def events():
+        yield format_retry()
+        for entry in backlog:
+            yield format_entry(entry)
+        while True:
+            item = subscription.get(LOG_STREAM_KEEPALIVE)
+            if item is None:
+                yield KEEPALIVE
+            elif item is OVERFLOW:
+                yield format_overflow()
+                return
+            else:
+                yield format_entry(item)
+
+    response = Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+    response.call_on_close(lambda: LOG_BROADCASTER.unsubscribe(subscription))
+    return response
+
+
+@app.route('/metrics/', methods=['GET'])
+def metrics():
+    return Response(METRICS.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/health/', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok', 'backend_url': BACKEND_URL})
+    return jsonify({
+        'status': 'ok',
+        'backend_url': BACKEND_URL,
+        'pool': pool_stats(),
+        'capture': CAPTURE_STORE.stats() if CAPTURE_STORE is not None else None,
+        'recorder': RECORDER.stats(),
+        'stream': LOG_BROADCASTER.stats(),
+        'cache': RESPONSE_CACHE.stats(),
+    })
 
 
 if __name__ == '__main__':
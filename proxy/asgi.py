@@ -0,0 +1,527 @@
+"""Asyncio serving mode for the interception proxy.
+
+Exposes the same routes as the Flask app in ``app.py`` but forwards with an
+async HTTP client, so one process can keep many backend calls in flight.
+Traffic is recorded through the same ``RECORDER`` and ``TRAFFIC_LOG``. Run with::
+
+    uvicorn asgi:application --port 5000
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+
+from app import (
+    BACKEND_URL,
+    CACHED_RESPONSE_HEADERS,
+    CAPTURE_STORE,
+    CONNECT_TIMEOUT,
+    LOG_BROADCASTER,
+    LOG_STREAM_KEEPALIVE,
+    METRICS,
+    PASSTHROUGH,
+    READ_TIMEOUT,
+    RECORDER,
+    RESPONSE_CACHE,
+    TRAFFIC_LOG,
+    STREAMED_RESPONSE_HEADERS,
+    decode_response_body,
+    decode_streamed_body,
+    describe_body,
+    filtered_headers,
+    is_textual,
+    iso_timestamp,
+    open_log_stream,
+    passthrough_headers,
+    query_logs,
+    request_entry,
+    response_entry,
+    route_paths,
+    streamed_headers,
+)
+from log_stream import (
+    KEEPALIVE,
+    OVERFLOW,
+    AsyncSubscription,
+    format_entry,
+    format_overflow,
+    format_retry,
+    resume_seq,
+)
+from response_cache import CacheKey, CachedResponse
+from traffic_log import parse_log_query
+
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('PROXY_ASYNC_MAX_CONNECTIONS', '1000'))
+ASYNC_MAX_KEEPALIVE = int(os.environ.get('PROXY_ASYNC_MAX_KEEPALIVE', '100'))
+
+ROOT_METHODS = {'GET', 'POST'}
+SUBPATH_METHODS = {'GET', 'POST', 'PATCH', 'PUT', 'DELETE'}
+ADMIN_METHODS = {'GET', 'POST', 'PATCH', 'PUT', 'DELETE', 'OPTIONS'}
+
+# prefix -> (methods on "/<prefix>/", methods on "/<prefix>/<subpath>")
+RELAY_ROUTES: Dict[str, Tuple[set, set]] = {
+    'auth': (ROOT_METHODS, SUBPATH_METHODS),
+    'friends': (ROOT_METHODS, SUBPATH_METHODS),
+    'messages': (ROOT_METHODS, SUBPATH_METHODS),
+    'encryption': ({'GET'}, {'GET'}),
+    'admin': (ADMIN_METHODS, ADMIN_METHODS),
+}
+CORS_METHODS = 'GET, HEAD, POST, OPTIONS, PUT, PATCH, DELETE'
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class Request:
+    def __init__(self, scope, body: bytes):
+        self.method: str = scope['method']
+        self.path: str = scope['path']
+        self.query_string: str = scope.get('query_string', b'').decode('latin-1')
+        # Case-insensitive and multi-valued: get() joins repeated headers with
+        # commas, as WSGI servers do for Flask, and get_list() keeps them apart.
+        self.headers = httpx.Headers([
+            (key.decode('latin-1'), value.decode('latin-1'))
+            for key, value in scope.get('headers', [])
+        ])
+        self.body = body
+
+    @property
+    def query(self) -> Dict[str, List[str]]:
+        return parse_qs(self.query_string, keep_blank_values=True)
+
+    def query_param(self, name: str) -> Optional[str]:
+        values = self.query.get(name)
+        return values[0] if values else None
+
+    def json_payload(self) -> Optional[Any]:
+        # Mirrors Flask's request.get_json(silent=True).
+        if self.method in {'GET', 'HEAD'}:
+            return None
+        content_type = self.headers.get('content-type', '').split(';')[0].strip().lower()
+        if content_type != 'application/json' and not content_type.endswith('+json'):
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+    def logged_payload(self) -> Optional[Any]:
+        """Request body as shown in the traffic log; the raw bytes are what gets forwarded."""
+        payload = self.json_payload()
+        if payload is None and self.body and self.method not in {'GET', 'HEAD'}:
+            return describe_body(self.body, self.headers.get('content-type'))
+        return payload
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(chunks)
+
+
+async def send_response(send, status_code: int, body: bytes = b'', headers: Optional[Dict[str, str]] = None) -> None:
+    raw_headers = [(b'access-control-allow-origin', b'*')]
+    for key, value in (headers or {}).items():
+        raw_headers.append((key.lower().encode('latin-1'), value.encode('latin-1')))
+    if body:
+        raw_headers.append((b'content-length', str(len(body)).encode('ascii')))
+    await send({'type': 'http.response.start', 'status': status_code, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, status_code: int, data: Any, headers: Optional[Dict[str, str]] = None) -> None:
+    body = json.dumps(data).encode('utf-8')
+    await send_response(send, status_code, body, {**(headers or {}), 'Content-Type': 'application/json'})
+
+
+async def forward_request(req: Request, frontend_path: str, backend_path: str, started: float):
+    headers = filtered_headers(req.headers)
+    sampled = RECORDER.sample()
+    if sampled:
+        sent_at = iso_timestamp()
+        RECORDER.submit(
+            lambda: request_entry(req.method, frontend_path, req.logged_payload(), headers, req.query, sent_at)
+        )
+
+    url = f"{BACKEND_URL}{backend_path}"
+    if req.query_string:
+        url = f"{url}?{req.query_string}"
+    backend_started = time.perf_counter()
+    try:
+        response = await get_client().request(
+            req.method,
+            url,
+            headers=headers,
+            content=req.body or None,
+        )
+    except httpx.HTTPError:
+        failed_at = time.perf_counter()
+        METRICS.observe(req.method, frontend_path, None, failed_at - backend_started, failed_at - started)
+        raise
+    backend_seconds = time.perf_counter() - backend_started
+
+    content_type = response.headers.get('content-type')
+    response_data, has_json = decode_response_body(
+        response.status_code, response.content, response.encoding, content_type
+    )
+    if sampled:
+        received_at = iso_timestamp()
+        RECORDER.submit(
+            lambda: response_entry(
+                req.method, frontend_path, response.status_code, response_data, dict(response.headers), received_at
+            )
+        )
+
+    METRICS.observe(req.method, frontend_path, response.status_code, backend_seconds, time.perf_counter() - started)
+    passthrough = passthrough_headers(response.headers)
+    if response.content and not is_textual(content_type):
+        # Binary formats such as MessagePack are relayed byte for byte.
+        return response.status_code, response.content, False, {**passthrough, 'Content-Type': content_type}
+    return response.status_code, response_data, has_json, passthrough
+
+
+async def stream_request(
+    req: Request,
+    send,
+    frontend_path: str,
+    backend_path: str,
+    started: float,
+) -> None:
+    headers = streamed_headers(req.headers)
+    sampled = RECORDER.sample()
+    if sampled:
+        sent_at = iso_timestamp()
+        RECORDER.submit(
+            lambda: request_entry(req.method, frontend_path, req.logged_payload(), headers, req.query, sent_at)
+        )
+
+    url = f"{BACKEND_URL}{backend_path}"
+    if req.query_string:
+        url = f"{url}?{req.query_string}"
+    client = get_client()
+    backend_request = client.build_request(
+        req.method,
+        url,
+        headers=headers,
+        content=req.body or None,
+    )
+    backend_started = time.perf_counter()
+    try:
+        response = await client.send(backend_request, stream=True)
+    except httpx.HTTPError:
+        failed_at = time.perf_counter()
+        METRICS.observe(req.method, frontend_path, None, failed_at - backend_started, failed_at - started)
+        await send_json(send, 502, {'detail': 'Backend unavailable.'})
+        return
+    backend_seconds = time.perf_counter() - backend_started
+
+    chunks: Optional[List[bytes]] = [] if sampled else None
+    try:
+        raw_headers = [(b'access-control-allow-origin', b'*')]
+        for key, value in passthrough_headers(response.headers, STREAMED_RESPONSE_HEADERS).items():
+            raw_headers.append((key.lower().encode('latin-1'), value.encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': raw_headers})
+        # Body transfer depends on the client, so it counts towards neither histogram.
+        METRICS.observe(req.method, frontend_path, response.status_code, backend_seconds, time.perf_counter() - started)
+        async for chunk in response.aiter_raw():
+            if chunks is not None:
+                chunks.append(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        await response.aclose()
+        if chunks is not None:
+            received_at = iso_timestamp()
+            RECORDER.submit(
+                lambda: response_entry(
+                    req.method,
+                    frontend_path,
+                    response.status_code,
+                    decode_streamed_body(response.status_code, chunks, response.headers),
+                    dict(response.headers),
+                    received_at,
+                )
+            )
+
+
+def render_buffered(
+    status_code: int,
+    response_data: Any,
+    has_json: bool,
+    passthrough: Dict[str, str],
+) -> Tuple[int, bytes, Dict[str, str]]:
+    if status_code in {204, 304} or response_data is None:
+        return status_code, b'', passthrough
+    if isinstance(response_data, bytes):
+        return status_code, response_data, passthrough
+    if has_json:
+        body = json.dumps(response_data).encode('utf-8')
+        return status_code, body, {**passthrough, 'Content-Type': 'application/json'}
+    body = response_data.encode('utf-8')
+    return status_code, body, {**passthrough, 'Content-Type': 'text/plain; charset=utf-8'}
+
+
+async def cached_request(
+    req: Request,
+    send,
+    frontend_path: str,
+    backend_path: str,
+    cache_key: CacheKey,
+    started: float,
+) -> None:
+    cached = RESPONSE_CACHE.get(cache_key)
+    if cached is None:
+        generation = RESPONSE_CACHE.generation
+        try:
+            status_code, body, headers = render_buffered(
+                *await forward_request(req, frontend_path, backend_path, started)
+            )
+        except httpx.HTTPError:
+            await send_json(send, 502, {'detail': 'Backend unavailable.'})
+            return
+        RESPONSE_CACHE.put(
+            cache_key,
+            CachedResponse(status_code, passthrough_headers(headers, CACHED_RESPONSE_HEADERS), body),
+            generation,
+        )
+        await send_response(send, status_code, body, {**headers, 'X-Proxy-Cache': 'MISS'})
+        return
+
+    headers = {**cached.headers, 'X-Proxy-Cache': 'HIT'}
+    if RECORDER.sample():
+        request_headers = filtered_headers(req.headers)
+        served_at = iso_timestamp()
+        RECORDER.submit(lambda: request_entry(req.method, frontend_path, None, request_headers, req.query, served_at))
+        RECORDER.submit(
+            lambda: response_entry(
+                req.method,
+                frontend_path,
+                cached.status_code,
+                decode_response_body(cached.status_code, cached.body, None, cached.headers.get('Content-Type'))[0],
+                headers,
+                served_at,
+            )
+        )
+    METRICS.observe(req.method, frontend_path, cached.status_code, 0.0, time.perf_counter() - started)
+    await send_response(send, cached.status_code, cached.body, headers)
+
+
+async def relay(req: Request, send, prefix: str, subpath: str) -> None:
+    started = time.perf_counter()
+    backend_path, frontend_path = route_paths(prefix, subpath)
+    cache_key = RESPONSE_CACHE.key_for(
+        req.method,
+        frontend_path,
+        req.query_string,
+        req.headers.get('authorization'),
+        req.headers.get('accept'),
+    )
+    if cache_key is not None:
+        await cached_request(req, send, frontend_path, backend_path, cache_key, started)
+        return
+    if PASSTHROUGH:
+        await stream_request(req, send, frontend_path, backend_path, started)
+        return
+    try:
+        response = render_buffered(*await forward_request(req, frontend_path, backend_path, started))
+    except httpx.HTTPError:
+        await send_json(send, 502, {'detail': 'Backend unavailable.'})
+        return
+    await send_response(send, *response)
+
+
+async def stream_logs(req: Request, receive, send) -> None:
+    try:
+        params = parse_log_query(req.query_param)
+        after_seq = resume_seq(params, req.headers.get('last-event-id'))
+    except ValueError as exc:
+        await send_json(send, 400, {'detail': str(exc)})
+        return
+    loop = asyncio.get_running_loop()
+    subscription = AsyncSubscription(params, LOG_BROADCASTER.max_queue, loop)
+    # The request body has been read, so the next message is the disconnect.
+    disconnected = asyncio.ensure_future(receive())
+    getter: Optional[asyncio.Future] = None
+
+    async def send_text(text: str) -> None:
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+    try:
+        # RECORD_LOCK is held by the recorder thread across disk writes; wait for it off the event loop.
+        backlog = await loop.run_in_executor(None, open_log_stream, subscription, after_seq)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'access-control-allow-origin', b'*'),
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send_text(format_retry())
+        for entry in backlog:
+            await send_text(format_entry(entry))
+        while True:
+            getter = getter or asyncio.ensure_future(subscription.get())
+            await asyncio.wait(
+                {getter, disconnected}, timeout=LOG_STREAM_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected.done():
+                return
+            if not getter.done():
+                await send_text(KEEPALIVE)
+                continue
+            item, getter = getter.result(), None
+            if item is OVERFLOW:
+                await send_text(format_overflow())
+                break
+            await send_text(format_entry(item))
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        LOG_BROADCASTER.unsubscribe(subscription)
+        for task in (getter, disconnected):
+            if task is not None:
+                task.cancel()
+
+
+async def preflight(req: Request, send) -> None:
+    headers = {'Access-Control-Allow-Methods': CORS_METHODS}
+    requested = req.headers.get('access-control-request-headers')
+    if requested:
+        headers['Access-Control-Allow-Headers'] = requested
+    await send_response(send, 204, headers=headers)
+
+
+async def handle_http(scope, receive, send) -> None:
+    req = Request(scope, await read_body(receive))
+    segments = req.path.strip('/').split('/', 1)
+    prefix = segments[0]
+    subpath = segments[1] if len(segments) > 1 else ''
+
+    if prefix in RELAY_ROUTES:
+        root_methods, subpath_methods = RELAY_ROUTES[prefix]
+        allowed = subpath_methods if subpath else root_methods
+        if req.method == 'OPTIONS':
+            await preflight(req, send)
+        elif req.method not in allowed:
+            await send_json(send, 405, {'detail': 'Method not allowed.'})
+        else:
+            await relay(req, send, prefix, subpath)
+            if prefix == 'admin' and req.method != 'GET':
+                # Admin writes change what the cached encryption routes return.
+                RESPONSE_CACHE.invalidate()
+        return
+
+    if prefix == 'logs' and subpath.strip('/') == 'stream':
+        if req.method == 'OPTIONS':
+            await preflight(req, send)
+        elif req.method == 'GET':
+            await stream_logs(req, receive, send)
+        else:
+            await send_json(send, 405, {'detail': 'Method not allowed.'})
+        return
+
+    if prefix == 'logs' and not subpath:
+        if req.method == 'OPTIONS':
+            await preflight(req, send)
+        elif req.method == 'DELETE':
+            TRAFFIC_LOG.clear()
+            if CAPTURE_STORE is not None and req.query_param('source') == 'capture':
+                await asyncio.get_running_loop().run_in_executor(None, CAPTURE_STORE.clear)
+            await send_json(send, 200, {'detail': 'Log cleared.'})
+        elif req.method == 'GET':
+            source = req.query_param('source')
+            try:
+                params = parse_log_query(req.query_param)
+                if source == 'capture':
+                    # File and mmap reads; keep them off the event loop.
+                    entries = await asyncio.get_running_loop().run_in_executor(None, query_logs, params, source)
+                else:
+                    entries = query_logs(params, source)
+            except ValueError as exc:
+                await send_json(send, 400, {'detail': str(exc)})
+                return
+            await send_json(send, 200, entries)
+        else:
+            await send_json(send, 405, {'detail': 'Method not allowed.'})
+        return
+
+    if prefix == 'metrics' and not subpath and req.method == 'GET':
+        await send_response(
+            send,
+            200,
+            METRICS.render_prometheus().encode('utf-8'),
+            {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+        )
+        return
+
+    if prefix == 'health' and not subpath and req.method == 'GET':
+        await send_json(
+            send,
+            200,
+            {
+                'status': 'ok',
+                'backend_url': BACKEND_URL,
+                'engine': 'asyncio',
+                'capture': CAPTURE_STORE.stats() if CAPTURE_STORE is not None else None,
+                'recorder': RECORDER.stats(),
+                'stream': LOG_BROADCASTER.stats(),
+                'cache': RESPONSE_CACHE.stats(),
+                'pool': {
+                    'max_connections': ASYNC_MAX_CONNECTIONS,
+                    'max_keepalive_connections': ASYNC_MAX_KEEPALIVE,
+                    'timeout': {'connect': CONNECT_TIMEOUT, 'read': READ_TIMEOUT},
+                },
+            },
+        )
+        return
+
+    await send_json(send, 404, {'detail': 'Not found.'})
+
+
+async def handle_lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            get_client()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send) -> None:
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
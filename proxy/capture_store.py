@@ -0,0 +1,322 @@
+"""Append-only on-disk capture of proxy traffic.
+
+Entries are written as compact JSON lines into segment files named after the
+first sequence number they hold. Every ``index_interval`` entries form a block;
+a sidecar ``.idx`` file records each closed block's sequence range, time range,
+byte range and distinct paths. Queries use that sparse index to skip blocks and
+read only the matching byte ranges through ``mmap``, mapping each segment
+once per query. Segments rotated out while a query reads them are deleted
+when the last reader is done.
+"""
+
+import json
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from traffic_log import parse_timestamp
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.idx'
+
+
+def entry_time(entry: Dict[str, Any]) -> float:
+    return parse_timestamp(entry['timestamp'])
+
+
+@dataclass
+class IndexBlock:
+    first_seq: int
+    last_seq: int
+    first_ts: float
+    last_ts: float
+    offset: int
+    length: int
+    paths: List[str] = field(default_factory=list)
+
+    def matches(
+        self,
+        after_seq: int,
+        since: Optional[float],
+        until: Optional[float],
+        path: Optional[str],
+    ) -> bool:
+        if self.last_seq <= after_seq:
+            return False
+        if since is not None and self.last_ts < since:
+            return False
+        if until is not None and self.first_ts > until:
+            return False
+        if path and not any(candidate.startswith(path) for candidate in self.paths):
+            return False
+        return True
+
+
+class _PendingBlock:
+    def __init__(self, offset: int):
+        self.offset = offset
+        self.length = 0
+        self.count = 0
+        self.first_seq = 0
+        self.last_seq = 0
+        self.first_ts = 0.0
+        self.last_ts = 0.0
+        self.paths: Set[str] = set()
+
+    def add(self, entry: Dict[str, Any], size: int) -> None:
+        timestamp = entry_time(entry)
+        if self.count == 0:
+            self.first_seq = self.last_seq = entry['seq']
+            self.first_ts = self.last_ts = timestamp
+        self.first_seq = min(self.first_seq, entry['seq'])
+        self.last_seq = max(self.last_seq, entry['seq'])
+        self.first_ts = min(self.first_ts, timestamp)
+        self.last_ts = max(self.last_ts, timestamp)
+        self.paths.add(entry['path'])
+        self.length += size
+        self.count += 1
+
+    def freeze(self) -> IndexBlock:
+        return IndexBlock(
+            first_seq=self.first_seq,
+            last_seq=self.last_seq,
+            first_ts=self.first_ts,
+            last_ts=self.last_ts,
+            offset=self.offset,
+            length=self.length,
+            paths=sorted(self.paths),
+        )
+
+
+class Segment:
+    def __init__(self, directory: str, first_seq: int):
+        self.first_seq = first_seq
+        stem = os.path.join(directory, f'{SEGMENT_PREFIX}{first_seq:020d}')
+        self.data_path = stem + SEGMENT_SUFFIX
+        self.index_path = stem + INDEX_SUFFIX
+        self.blocks: List[IndexBlock] = []
+        self.pending = _PendingBlock(0)
+        # Both guarded by CaptureStore._lock.
+        self.readers = 0
+        self.retired = False
+
+    @property
+    def size(self) -> int:
+        return self.pending.offset + self.pending.length
+
+    def load(self) -> int:
+        """Load the sparse index and rescan the unindexed tail; returns the highest seq seen."""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as handle:
+                self.blocks = [IndexBlock(**json.loads(line)) for line in handle if line.strip()]
+        offset = self.blocks[-1].offset + self.blocks[-1].length if self.blocks else 0
+        self.pending = _PendingBlock(offset)
+        last_seq = self.blocks[-1].last_seq if self.blocks else 0
+        if not os.path.exists(self.data_path):
+            return last_seq
+        with open(self.data_path, 'rb') as handle:
+            handle.seek(offset)
+            for line in handle:
+                if not line.endswith(b'\n'):
+                    # Torn write from a crash; CaptureStore truncates it away.
+                    break
+                try:
+                    entry = json.loads(line)
+                    seq = entry['seq']
+                except (ValueError, KeyError, TypeError):
+                    # A complete but undecodable record, e.g. from a write cut
+                    # short by a full disk. Stop here like at a torn write.
+                    break
+                self.pending.add(entry, len(line))
+                last_seq = max(last_seq, seq)
+        return last_seq
+
+    def close_block(self) -> None:
+        if self.pending.count == 0:
+            return
+        block = self.pending.freeze()
+        self.blocks.append(block)
+        with open(self.index_path, 'a', encoding='utf-8') as handle:
+            handle.write(json.dumps(asdict(block), separators=(',', ':')) + '\n')
+        self.pending = _PendingBlock(block.offset + block.length)
+
+    def all_blocks(self) -> List[IndexBlock]:
+        if self.pending.count:
+            return self.blocks + [self.pending.freeze()]
+        return list(self.blocks)
+
+    @contextmanager
+    def view(self) -> Iterator[Optional[mmap.mmap]]:
+        """Read-only map of the data file as it is now; None while it is empty."""
+        with open(self.data_path, 'rb') as handle:
+            if os.fstat(handle.fileno()).st_size == 0:
+                yield None
+                return
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    @staticmethod
+    def read_block(view: Optional[mmap.mmap], block: IndexBlock) -> Iterator[Dict[str, Any]]:
+        if block.length == 0 or view is None:
+            return
+        for line in view[block.offset:block.offset + block.length].splitlines():
+            if line:
+                yield json.loads(line)
+
+    def remove(self) -> None:
+        for path in (self.data_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class CaptureStore:
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        index_interval: int = 256,
+        max_segments: int = 0,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._segments: List[Segment] = []
+        self._handle = None
+        self.last_seq = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _open(self) -> None:
+        first_seqs = sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        for first_seq in first_seqs:
+            segment = Segment(self.directory, first_seq)
+            self.last_seq = max(self.last_seq, segment.load())
+            self._segments.append(segment)
+        if self._segments:
+            active = self._segments[-1]
+            with open(active.data_path, 'r+b') as handle:
+                handle.truncate(active.size)
+            self._handle = open(active.data_path, 'ab')
+
+    def _rotate(self, first_seq: int) -> Segment:
+        if self._segments:
+            self._segments[-1].close_block()
+        if self._handle is not None:
+            self._handle.close()
+        segment = Segment(self.directory, first_seq)
+        self._segments.append(segment)
+        self._handle = open(segment.data_path, 'ab')
+        if self.max_segments and len(self._segments) > self.max_segments:
+            self._retire(self._segments.pop(0))
+        return segment
+
+    def _retire(self, segment: Segment) -> None:
+        # Called with the lock held; a segment that queries still read is
+        # deleted by the last of them (see _release).
+        segment.retired = True
+        if segment.readers == 0:
+            segment.remove()
+
+    def _release(self, segments: List[Segment]) -> None:
+        with self._lock:
+            for segment in segments:
+                segment.readers -= 1
+                if segment.retired and segment.readers == 0:
+                    segment.remove()
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(',', ':'), default=str).encode('utf-8') + b'\n'
+        with self._lock:
+            if not self._segments or self._segments[-1].size >= self.segment_bytes:
+                self._rotate(entry['seq'])
+            segment = self._segments[-1]
+            self._handle.write(line)
+            self._handle.flush()
+            segment.pending.add(entry, len(line))
+            self.last_seq = max(self.last_seq, entry['seq'])
+            if segment.pending.count >= self.index_interval:
+                segment.close_block()
+
+    def query(
+        self,
+        after_seq: int = 0,
+        limit: int = 1000,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        path: Optional[str] = None,
+        method: Optional[str] = None,
+        direction: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` matching entries, oldest first."""
+        method = method.upper() if method else None
+        with self._lock:
+            plan = [(segment, segment.all_blocks()) for segment in self._segments]
+            for segment, _ in plan:
+                segment.readers += 1
+        try:
+            return self._scan(plan, after_seq, limit, since, until, path, method, direction)
+        finally:
+            self._release([segment for segment, _ in plan])
+
+    def _scan(self, plan, after_seq, limit, since, until, path, method, direction) -> List[Dict[str, Any]]:
+        matches: List[Dict[str, Any]] = []
+        for segment, blocks in plan:
+            blocks = [block for block in blocks if block.matches(after_seq, since, until, path)]
+            if not blocks:
+                continue
+            with segment.view() as view:
+                for block in blocks:
+                    for entry in segment.read_block(view, block):
+                        if entry['seq'] <= after_seq:
+                            continue
+                        if path and not entry['path'].startswith(path):
+                            continue
+                        if method and entry['method'] != method:
+                            continue
+                        if direction and entry['direction'] != direction:
+                            continue
+                        if since is not None or until is not None:
+                            timestamp = entry_time(entry)
+                            if (since is not None and timestamp < since) or (until is not None and timestamp > until):
+                                continue
+                        matches.append(entry)
+                        if len(matches) >= limit:
+                            return matches
+        return matches
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+            for segment in self._segments:
+                self._retire(segment)
+            self._segments = []
+
+    def close(self) -> None:
+        """Index the open block and close the active segment; the store is not used afterwards."""
+        with self._lock:
+            if self._segments:
+                self._segments[-1].close_block()
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'segments': len(self._segments),
+                'bytes': sum(segment.size for segment in self._segments),
+                'last_seq': self.last_seq,
+            }
@@ -0,0 +1,160 @@
+"""Live delivery of traffic log entries for ``/logs/stream``.
+
+``record()`` publishes every stored entry to the ``LogBroadcaster`` on the
+recorder thread. Each subscriber owns a bounded queue; a subscriber that falls
+``max_queue`` entries behind is sent an overflow marker and dropped instead of
+slowing the recorder down, and its client resumes from the last ``seq`` it saw.
+"""
+
+import asyncio
+import json
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+from traffic_log import entry_matches
+
+STREAM_FILTERS = ('path', 'method', 'direction')
+RETRY_MILLISECONDS = 1000
+KEEPALIVE = ': keep-alive\n\n'
+
+# Queued after a subscription's last entry when it overflows.
+OVERFLOW = object()
+
+
+class Subscription:
+    def __init__(self, filters: Dict[str, Any], max_queue: int):
+        self.filters = {key: filters[key] for key in STREAM_FILTERS if filters.get(key)}
+        if 'method' in self.filters:
+            self.filters['method'] = self.filters['method'].upper()
+        self.max_queue = max_queue
+        self.closed = False
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        return entry_matches(entry, **self.filters)
+
+    def offer(self, entry: Dict[str, Any]) -> bool:
+        """Queue ``entry`` without blocking; returns False once the subscription is closed."""
+        with self._lock:
+            if self.closed:
+                return False
+            if self._pending >= self.max_queue:
+                self.closed = True
+                overflowed = True
+            else:
+                self._pending += 1
+                overflowed = False
+        self._put(OVERFLOW if overflowed else entry)
+        return not overflowed
+
+    def _taken(self, item: Any) -> Any:
+        if item is not OVERFLOW:
+            with self._lock:
+                self._pending -= 1
+        return item
+
+    def _put(self, item: Any) -> None:
+        raise NotImplementedError
+
+
+class ThreadSubscription(Subscription):
+    """Subscription read from a WSGI worker thread."""
+
+    def __init__(self, filters: Dict[str, Any], max_queue: int):
+        super().__init__(filters, max_queue)
+        self._queue: 'queue.SimpleQueue[Any]' = queue.SimpleQueue()
+
+    def _put(self, item: Any) -> None:
+        self._queue.put(item)
+
+    def get(self, timeout: float) -> Optional[Any]:
+        """Next entry or ``OVERFLOW``; ``None`` if nothing arrived within ``timeout``."""
+        try:
+            return self._taken(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """Subscription read from an event loop; entries are handed over thread-safely."""
+
+    def __init__(self, filters: Dict[str, Any], max_queue: int, loop: asyncio.AbstractEventLoop):
+        super().__init__(filters, max_queue)
+        self._loop = loop
+        self._queue: 'asyncio.Queue[Any]' = asyncio.Queue()
+
+    def _put(self, item: Any) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            # The loop is gone; the broadcaster drops closed subscriptions.
+            self.closed = True
+
+    async def get(self) -> Any:
+        return self._taken(await self._queue.get())
+
+
+class LogBroadcaster:
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.overflowed = 0
+
+    def subscribe(self, subscription: Subscription) -> Subscription:
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if not subscription.matches(entry):
+                continue
+            if subscription.offer(entry):
+                self.delivered += 1
+            elif subscription.closed:
+                self.overflowed += 1
+                self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscribers = len(self._subscriptions)
+        return {
+            'subscribers': subscribers,
+            'max_queue': self.max_queue,
+            'delivered': self.delivered,
+            'overflowed': self.overflowed,
+        }
+
+
+def resume_seq(params: Dict[str, Any], last_event_id: Optional[str]) -> Optional[int]:
+    """Pick the replay point: the browser's ``Last-Event-ID`` wins over ``after_seq``."""
+    if last_event_id:
+        try:
+            return int(last_event_id)
+        except ValueError as exc:
+            raise ValueError('Last-Event-ID must be an integer.') from exc
+    return params.get('after_seq')
+
+
+def format_entry(entry: Dict[str, Any]) -> str:
+    return f"id: {entry['seq']}\ndata: {json.dumps(entry, default=str)}\n\n"
+
+
+def format_overflow() -> str:
+    return 'event: overflow\ndata: {"detail": "Subscriber fell behind; reconnect to resume."}\n\n'
+
+
+def format_retry() -> str:
+    return f'retry: {RETRY_MILLISECONDS}\n\n'
+
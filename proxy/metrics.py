@@ -0,0 +1,227 @@
+"""Latency and throughput metrics for relayed requests.
+
+Durations go into fixed log-spaced histograms, four buckets per doubling from
+1 ms to about 65 s, so every series costs a constant ~70 counters and
+percentiles are accurate to one bucket width (~19%). ``render_prometheus``
+exposes counters, histograms, quantiles and recent rates in the Prometheus
+text format for ``/metrics/``.
+"""
+
+import bisect
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+BUCKETS_PER_DOUBLING = 4
+MIN_BOUND_SECONDS = 0.001
+BUCKET_BOUNDS: Tuple[float, ...] = tuple(
+    MIN_BOUND_SECONDS * 2 ** (index / BUCKETS_PER_DOUBLING) for index in range(16 * BUCKETS_PER_DOUBLING + 1)
+)
+# Exported ``le`` bounds: every power of two from 1 ms, a subset of the real bounds.
+EXPORTED_BUCKETS = frozenset(range(0, len(BUCKET_BOUNDS), BUCKETS_PER_DOUBLING))
+QUANTILES = (0.5, 0.95, 0.99)
+RATE_WINDOW_SECONDS = 60
+OTHER_ROUTE = '{other}'
+
+# Path segments that are part of a backend route rather than a parameter.
+ROUTE_LITERALS = {'requests', 'send', 'respond', 'read', 'remove'}
+# Prefixes whose first subpath segment is a username.
+USERNAME_PREFIXES = {'messages', 'friends'}
+
+
+def route_template(frontend_path: str) -> str:
+    """Collapse ids and usernames so one backend route maps to one series."""
+    segments = [segment for segment in frontend_path.split('/') if segment]
+    if not segments:
+        return '/'
+    templated = [segments[0]]
+    for position, segment in enumerate(segments[1:]):
+        if segment.isdigit():
+            templated.append('{id}')
+        elif position == 0 and segments[0] in USERNAME_PREFIXES and segment not in ROUTE_LITERALS:
+            templated.append('{username}')
+        else:
+            templated.append(segment)
+    return '/' + '/'.join(templated) + '/'
+
+
+class Histogram:
+    def __init__(self):
+        # One slot per bound plus the +Inf overflow slot.
+        self.counts: List[int] = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else math.inf
+        return math.inf
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        running = 0
+        cumulative = []
+        for index, bucket_count in enumerate(self.counts[:-1]):
+            running += bucket_count
+            if index in EXPORTED_BUCKETS:
+                cumulative.append((BUCKET_BOUNDS[index], running))
+        return cumulative
+
+
+class RateWindow:
+    """Per-second request and error counts over the last ``seconds`` seconds."""
+
+    def __init__(self, seconds: int = RATE_WINDOW_SECONDS):
+        self.seconds = seconds
+        self._slots = [[-1, 0, 0] for _ in range(seconds)]
+
+    def add(self, now: float, error: bool) -> None:
+        second = int(now)
+        slot = self._slots[second % self.seconds]
+        if slot[0] != second:
+            slot[:] = [second, 0, 0]
+        slot[1] += 1
+        slot[2] += int(error)
+
+    def totals(self, now: float) -> Tuple[int, int]:
+        cutoff = int(now) - self.seconds
+        requests = errors = 0
+        for second, slot_requests, slot_errors in self._slots:
+            if second > cutoff:
+                requests += slot_requests
+                errors += slot_errors
+        return requests, errors
+
+
+@dataclass
+class RouteSeries:
+    backend: Histogram = field(default_factory=Histogram)
+    overhead: Histogram = field(default_factory=Histogram)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    window: RateWindow = field(default_factory=RateWindow)
+
+
+class ProxyMetrics:
+    def __init__(self, max_series: int = 500):
+        self.max_series = max_series
+        self._series: Dict[Tuple[str, str], RouteSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        method: str,
+        frontend_path: str,
+        status_code: Optional[int],
+        backend_seconds: float,
+        total_seconds: float,
+    ) -> None:
+        """Record one relayed request; ``status_code`` is None when the backend call failed."""
+        route = route_template(frontend_path)
+        error = status_code is None or status_code >= 500
+        status = 'error' if status_code is None else str(status_code)
+        with self._lock:
+            key = (route, method)
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    key = (OTHER_ROUTE, method)
+                    series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = RouteSeries()
+            series.backend.observe(backend_seconds)
+            series.overhead.observe(max(total_seconds - backend_seconds, 0.0))
+            series.statuses[status] = series.statuses.get(status, 0) + 1
+            series.errors += int(error)
+            series.window.add(time.time(), error)
+
+    def render_prometheus(self) -> str:
+        now = time.time()
+        lines: List[str] = []
+        with self._lock:
+            series = sorted(self._series.items())
+
+            lines += [
+                '# HELP proxy_requests_total Relayed requests by route, method and response status.',
+                '# TYPE proxy_requests_total counter',
+            ]
+            for (route, method), data in series:
+                for status, count in sorted(data.statuses.items()):
+                    lines.append(f'proxy_requests_total{labels(route, method, status=status)} {count}')
+
+            lines += [
+                '# HELP proxy_request_errors_total Relayed requests that failed or returned 5xx.',
+                '# TYPE proxy_request_errors_total counter',
+            ]
+            for (route, method), data in series:
+                lines.append(f'proxy_request_errors_total{labels(route, method)} {data.errors}')
+
+            for name, attribute, help_text in (
+                ('proxy_backend_duration_seconds', 'backend', 'Backend round trip until response headers arrive.'),
+                ('proxy_overhead_duration_seconds', 'overhead', 'Time spent in the proxy outside the backend call.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (route, method), data in series:
+                    histogram: Histogram = getattr(data, attribute)
+                    for bound, cumulative in histogram.cumulative():
+                        lines.append(f'{name}_bucket{labels(route, method, le=format_value(bound))} {cumulative}')
+                    lines.append(f'{name}_bucket{labels(route, method, le="+Inf")} {histogram.count}')
+                    lines.append(f'{name}_sum{labels(route, method)} {format_value(histogram.total)}')
+                    lines.append(f'{name}_count{labels(route, method)} {histogram.count}')
+
+                quantile_name = name.replace('_seconds', '_quantile_seconds')
+                lines += [
+                    f'# HELP {quantile_name} Bucket upper bound for p50/p95/p99 of {name}.',
+                    f'# TYPE {quantile_name} gauge',
+                ]
+                for (route, method), data in series:
+                    histogram = getattr(data, attribute)
+                    for q in QUANTILES:
+                        value = format_value(histogram.quantile(q))
+                        lines.append(f'{quantile_name}{labels(route, method, quantile=str(q))} {value}')
+
+            lines += [
+                f'# HELP proxy_requests_per_second Request rate over the last {RATE_WINDOW_SECONDS} seconds.',
+                '# TYPE proxy_requests_per_second gauge',
+            ]
+            rates = [((route, method), data.window.totals(now)) for (route, method), data in series]
+            for (route, method), (requests, _) in rates:
+                lines.append(
+                    f'proxy_requests_per_second{labels(route, method)} {format_value(requests / RATE_WINDOW_SECONDS)}'
+                )
+            lines += [
+                f'# HELP proxy_error_ratio Share of failed requests over the last {RATE_WINDOW_SECONDS} seconds.',
+                '# TYPE proxy_error_ratio gauge',
+            ]
+            for (route, method), (requests, errors) in rates:
+                ratio = errors / requests if requests else 0.0
+                lines.append(f'proxy_error_ratio{labels(route, method)} {format_value(ratio)}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(route: str, method: str, **extra: str) -> str:
+    pairs = [('route', route), ('method', method), *extra.items()]
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in pairs) + '}'
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf'
+    return repr(round(value, 9))
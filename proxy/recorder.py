@@ -0,0 +1,110 @@
+import json
+import queue
+import random
+import threading
+from typing import Any, Callable, Dict, Optional
+
+EntryBuilder = Callable[[], Dict[str, Any]]
+
+
+class TrafficRecorder:
+    """Builds and stores log entries on a background thread.
+
+    The request path only decides whether to sample an exchange and enqueues
+    cheap builder callables. The writer thread turns them into entries, applies
+    payload truncation and hands them to ``sink``. When the bounded queue is full
+    new entries are dropped and counted instead of blocking the caller.
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[Dict[str, Any]], None],
+        queue_size: int = 10_000,
+        sample_rate: float = 1.0,
+        max_payload_bytes: int = 0,
+    ):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.max_payload_bytes = max_payload_bytes
+        self._queue: 'queue.Queue[Optional[EntryBuilder]]' = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.failed = 0
+
+    def sample(self) -> bool:
+        if self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def submit(self, build: EntryBuilder) -> bool:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(build)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Block until everything submitted so far has reached the sink."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+            'failed': self.failed,
+            'sample_rate': self.sample_rate,
+            'max_payload_bytes': self.max_payload_bytes,
+        }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='traffic-recorder', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            build = self._queue.get()
+            try:
+                if build is None:
+                    return
+                entry = build()
+                if self.max_payload_bytes:
+                    entry['payload'] = self._truncate(entry.get('payload'))
+                self.sink(entry)
+                self.recorded += 1
+            except Exception:  # noqa: BLE001 - a bad entry must not kill the writer
+                self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    def _truncate(self, payload: Any) -> Any:
+        if payload is None:
+            return None
+        text = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+        encoded = text.encode('utf-8')
+        if len(encoded) <= self.max_payload_bytes:
+            return payload
+        return {
+            'truncated': True,
+            'size': len(encoded),
+            'preview': encoded[:self.max_payload_bytes].decode('utf-8', errors='ignore'),
+        }
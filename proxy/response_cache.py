@@ -0,0 +1,123 @@
+"""Short-lived cache for idempotent GET routes relayed by the proxy.
+
+Only paths listed in ``routes`` are cached, and only their 200 responses.
+Entries are keyed on path, normalised query, Accept header and a hash of the
+Authorization header, so users never see each other's responses and each
+negotiated format is cached separately. Writes through the admin
+routes call ``invalidate()``. Its generation counter also stops a read that
+was in flight during the write from storing the old value afterwards.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...], str, str]
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+    expires_at: float = 0.0
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        routes: Iterable[str],
+        ttl: float = 30.0,
+        max_entries: int = 1024,
+        max_bytes: int = 8 * 1024 * 1024,
+    ):
+        self.routes = frozenset(routes)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self._entries: 'OrderedDict[CacheKey, CachedResponse]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key_for(
+        self,
+        method: str,
+        frontend_path: str,
+        query_string: str,
+        authorization: Optional[str],
+        accept: Optional[str] = None,
+    ) -> Optional[CacheKey]:
+        """Cache key for a request, or None when the request is not cacheable."""
+        if method != 'GET' or frontend_path not in self.routes or self.ttl <= 0:
+            return None
+        query = tuple(sorted(parse_qsl(query_string, keep_blank_values=True)))
+        identity = hashlib.sha256((authorization or '').encode('utf-8')).hexdigest()
+        return frontend_path, query, identity, accept or ''
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: CacheKey, response: CachedResponse, generation: int) -> bool:
+        """Store ``response`` unless an invalidation happened since ``generation`` was read."""
+        if response.status_code != 200 or 'no-store' in response.headers.get('Cache-Control', ''):
+            return False
+        if len(response.body) > self.max_bytes:
+            return False
+        response.expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self._discard(key)
+            self._entries[key] = response
+            self._bytes += len(response.body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'routes': sorted(self.routes),
+                'ttl': self.ttl,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _discard(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
@@ -0,0 +1,154 @@
+import asyncio
+import gzip
+import json
+import unittest
+from unittest import mock
+
+import httpx
+
+import app
+import asgi
+from log_stream import format_entry, format_retry
+
+
+def http_scope(method: str, path: str, headers=(), query_string: bytes = b''):
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query_string,
+        'headers': [(key.encode('latin-1'), value.encode('latin-1')) for key, value in headers],
+    }
+
+
+async def call(scope, body: bytes = b'', on_send=None):
+    """Run one request through the ASGI app and return the sent messages.
+
+    After the request body, ``receive`` waits for ``on_send`` to return true,
+    then reports the client as gone.
+    """
+    sent = []
+    gone = asyncio.Event()
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await gone.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+        if on_send is not None and on_send(sent):
+            gone.set()
+
+    await asyncio.wait_for(asgi.application(scope, receive, send), 5)
+    return sent
+
+
+def response_parts(sent):
+    start = sent[0]
+    headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in start['headers']}
+    bodies = [message['body'] for message in sent[1:]]
+    return start['status'], headers, bodies
+
+
+class AsgiRelayTests(unittest.TestCase):
+    def setUp(self):
+        self.backend_requests = []
+
+    def run_with_backend(self, handler, coroutine_factory):
+        async def run():
+            asgi._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            try:
+                return await coroutine_factory()
+            finally:
+                await asgi.close_client()
+
+        return asyncio.run(run())
+
+    def test_buffered_relay_keeps_repeated_headers(self):
+        def handler(request: httpx.Request):
+            self.backend_requests.append(request)
+            return httpx.Response(201, json={'id': 1}, headers={'ETag': '"v1"'})
+
+        scope = http_scope(
+            'POST',
+            '/messages/bob/',
+            [('Content-Type', 'application/json'), ('Accept', 'application/json'), ('Accept', 'text/plain')],
+        )
+        with mock.patch.object(asgi, 'PASSTHROUGH', False):
+            sent = self.run_with_backend(handler, lambda: call(scope, b'{"content": "hi"}'))
+        status, headers, bodies = response_parts(sent)
+        self.assertEqual((status, headers['etag']), (201, '"v1"'))
+        self.assertEqual(json.loads(b''.join(bodies)), {'id': 1})
+
+        backend_request = self.backend_requests[0]
+        self.assertEqual(str(backend_request.url), f'{asgi.BACKEND_URL}/api/messages/bob/')
+        self.assertEqual(backend_request.content, b'{"content": "hi"}')
+        self.assertEqual(backend_request.headers['accept'], 'application/json, text/plain')
+
+    def test_passthrough_relays_chunks_unchanged(self):
+        chunks = [gzip.compress(b'{"results": []}')[:10], gzip.compress(b'{"results": []}')[10:]]
+
+        async def body():
+            for chunk in chunks:
+                yield chunk
+
+        def handler(request: httpx.Request):
+            self.backend_requests.append(request)
+            return httpx.Response(
+                200,
+                headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'},
+                content=body(),
+            )
+
+        scope = http_scope('GET', '/messages/bob/', [('Accept-Encoding', 'gzip')])
+        with mock.patch.object(asgi, 'PASSTHROUGH', True):
+            sent = self.run_with_backend(handler, lambda: call(scope))
+        status, headers, bodies = response_parts(sent)
+        self.assertEqual((status, headers['content-encoding']), (200, 'gzip'))
+        self.assertEqual(bodies, chunks + [b''])
+        self.assertEqual([message.get('more_body', False) for message in sent[1:]], [True, True, False])
+        self.assertEqual(self.backend_requests[0].headers['accept-encoding'], 'gzip')
+
+    def test_backend_failure_is_a_502(self):
+        def handler(request: httpx.Request):
+            raise httpx.ConnectError('refused', request=request)
+
+        with mock.patch.object(asgi, 'PASSTHROUGH', True):
+            sent = self.run_with_backend(handler, lambda: call(http_scope('GET', '/friends/')))
+        self.assertEqual(response_parts(sent)[0], 502)
+
+
+class AsgiLogStreamTests(unittest.TestCase):
+    def record(self, path: str):
+        app.record(app.request_entry('GET', path, None, {}, {}))
+        return app.TRAFFIC_LOG.last_seq
+
+    def test_replay_then_live_entries_are_framed_as_events(self):
+        replayed_seq = self.record('/messages/replayed/')
+        live = []
+
+        def on_send(sent):
+            text = b''.join(message.get('body', b'') for message in sent[1:]).decode('utf-8')
+            if 'replayed' in text and not live:
+                live.append(self.record('/messages/live/'))
+            return '/messages/live/' in text
+
+        scope = http_scope('GET', '/logs/stream/', [('Last-Event-ID', str(replayed_seq - 1))])
+        sent = asyncio.run(call(scope, on_send=on_send))
+        status, headers, bodies = response_parts(sent)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], 'text/event-stream; charset=utf-8')
+        entries = app.TRAFFIC_LOG.query(after_seq=replayed_seq - 1)
+        expected = format_retry() + ''.join(format_entry(entry) for entry in entries[:2])
+        self.assertEqual(b''.join(bodies).decode('utf-8'), expected)
+
+    def test_invalid_last_event_id(self):
+        sent = asyncio.run(call(http_scope('GET', '/logs/stream/', [('Last-Event-ID', 'x')])))
+        self.assertEqual(response_parts(sent)[0], 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
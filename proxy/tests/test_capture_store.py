@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from capture_store import CaptureStore
+from traffic_log import parse_timestamp
+
+
+def make_entry(seq, path='/messages/', method='GET', direction='client_to_server', second=0):
+    return {
+        'seq': seq,
+        'path': path,
+        'method': method,
+        'direction': direction,
+        'timestamp': f'2024-01-01T00:00:{second:02d}Z',
+    }
+
+
+class CaptureStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open_store(self, **options):
+        options.setdefault('index_interval', 4)
+        store = CaptureStore(self.directory, **options)
+        self.addCleanup(store.close)
+        return store
+
+    def segment_files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.jsonl'))
+
+    def test_query_filters(self):
+        store = self.open_store()
+        for seq in range(1, 11):
+            path = '/messages/bob/' if seq % 2 else '/friends/'
+            store.append(make_entry(seq, path, 'POST' if seq == 3 else 'GET', second=seq))
+
+        self.assertEqual([e['seq'] for e in store.query()], list(range(1, 11)))
+        self.assertEqual([e['seq'] for e in store.query(after_seq=7)], [8, 9, 10])
+        self.assertEqual([e['seq'] for e in store.query(limit=3)], [1, 2, 3])
+        self.assertEqual([e['seq'] for e in store.query(path='/friends/')], [2, 4, 6, 8, 10])
+        self.assertEqual([e['seq'] for e in store.query(method='post')], [3])
+        since = parse_timestamp('2024-01-01T00:00:05Z')
+        until = parse_timestamp('2024-01-01T00:00:06Z')
+        self.assertEqual([e['seq'] for e in store.query(since=since, until=until)], [5, 6])
+        self.assertEqual(store.query(direction='server_to_client'), [])
+
+    def test_reopen_restores_index_and_tail(self):
+        store = self.open_store()
+        for seq in range(1, 7):
+            store.append(make_entry(seq))
+        # A torn write after the last complete line.
+        data_path = os.path.join(self.directory, self.segment_files()[-1])
+        with open(data_path, 'ab') as handle:
+            handle.write(b'{"seq": 7, "pa')
+
+        store.close()
+        store = self.open_store()
+        self.assertEqual(store.last_seq, 6)
+        store.append(make_entry(7))
+        self.assertEqual([e['seq'] for e in store.query()], list(range(1, 8)))
+
+    def test_reopen_stops_at_an_undecodable_record(self):
+        store = self.open_store()
+        for seq in range(1, 6):
+            store.append(make_entry(seq))
+        data_path = os.path.join(self.directory, self.segment_files()[-1])
+        with open(data_path, 'ab') as handle:
+            handle.write(b'{"seq": 6, "pa\x00\n' + b'{"seq": 7}\n')
+
+        store.close()
+        store = self.open_store()
+        self.assertEqual(store.last_seq, 5)
+        store.append(make_entry(6))
+        self.assertEqual([e['seq'] for e in store.query()], list(range(1, 7)))
+
+    def test_rotation_drops_oldest_segments(self):
+        store = self.open_store(segment_bytes=200, max_segments=2)
+        for seq in range(1, 21):
+            store.append(make_entry(seq))
+        self.assertEqual(len(self.segment_files()), 2)
+        seqs = [e['seq'] for e in store.query()]
+        self.assertEqual(seqs, list(range(seqs[0], 21)))
+        self.assertEqual(store.stats()['segments'], 2)
+
+    def test_segment_rotated_during_query_is_removed_afterwards(self):
+        store = self.open_store(segment_bytes=400, max_segments=1)
+        for seq in range(1, 4):
+            store.append(make_entry(seq))
+        oldest = store._segments[0]
+        seen = []
+        scan = store._scan
+
+        def rotate_while_reading(plan, *args):
+            # Force a rotation between planning the query and reading the segment.
+            for seq in range(4, 12):
+                store.append(make_entry(seq))
+            self.assertTrue(oldest.retired)
+            self.assertTrue(os.path.exists(oldest.data_path))
+            seen.extend(scan(plan, *args))
+            return seen
+
+        store._scan = rotate_while_reading
+        store.query()
+        self.assertEqual([e['seq'] for e in seen][:3], [1, 2, 3])
+        self.assertFalse(os.path.exists(oldest.data_path))
+
+    def test_clear(self):
+        store = self.open_store()
+        for seq in range(1, 4):
+            store.append(make_entry(seq))
+        store.clear()
+        self.assertEqual(store.query(), [])
+        self.assertEqual(self.segment_files(), [])
+        store.append(make_entry(4))
+        self.assertEqual([e['seq'] for e in store.query()], [4])
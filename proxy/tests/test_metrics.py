@@ -0,0 +1,90 @@
+import math
+import unittest
+
+from metrics import BUCKET_BOUNDS, OTHER_ROUTE, Histogram, ProxyMetrics, RateWindow, route_template
+
+
+class RouteTemplateTests(unittest.TestCase):
+    def test_ids_and_usernames_collapse(self):
+        cases = {
+            '': '/',
+            'messages/': '/messages/',
+            'messages/bob/': '/messages/{username}/',
+            'messages/bob/read/': '/messages/{username}/read/',
+            'friends/requests/': '/friends/requests/',
+            'friends/requests/12/respond/': '/friends/requests/{id}/respond/',
+            'friends/bob/remove/': '/friends/{username}/remove/',
+        }
+        for path, route in cases.items():
+            self.assertEqual(route_template(path), route, path)
+
+
+class HistogramTests(unittest.TestCase):
+    def test_quantiles_are_bucket_upper_bounds(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.quantile(0.5), 0.0)
+        for _ in range(90):
+            histogram.observe(0.010)
+        for _ in range(10):
+            histogram.observe(1.0)
+        p50 = histogram.quantile(0.5)
+        self.assertGreaterEqual(p50, 0.010)
+        self.assertLess(p50, 0.010 * 2 ** 0.25 + 1e-12)
+        self.assertGreaterEqual(histogram.quantile(0.99), 1.0)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.total, 10.9)
+
+    def test_overflow(self):
+        histogram = Histogram()
+        histogram.observe(BUCKET_BOUNDS[-1] * 2)
+        self.assertEqual(histogram.quantile(0.5), math.inf)
+        self.assertEqual(histogram.cumulative()[-1][1], 0)
+
+    def test_cumulative_counts(self):
+        histogram = Histogram()
+        for seconds in (0.0005, 0.003, 0.003, 0.5):
+            histogram.observe(seconds)
+        counts = [count for _, count in histogram.cumulative()]
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(counts[0], 1)
+        self.assertEqual(counts[-1], 4)
+
+
+class RateWindowTests(unittest.TestCase):
+    def test_old_seconds_expire(self):
+        window = RateWindow(seconds=10)
+        window.add(100.2, error=False)
+        window.add(100.7, error=True)
+        window.add(105.0, error=False)
+        self.assertEqual(window.totals(105.5), (3, 1))
+        self.assertEqual(window.totals(110.5), (1, 0))
+        # The slot of second 100 is reused for second 110.
+        window.add(110.0, error=False)
+        self.assertEqual(window.totals(110.5), (2, 0))
+
+
+class ProxyMetricsTests(unittest.TestCase):
+    def test_prometheus_output(self):
+        metrics = ProxyMetrics()
+        metrics.observe('GET', 'messages/bob/', 200, 0.010, 0.012)
+        metrics.observe('GET', 'messages/carol/', 502, 0.020, 0.021)
+        metrics.observe('POST', 'messages/bob/', None, 0.5, 0.5)
+        text = metrics.render_prometheus()
+
+        self.assertIn('proxy_requests_total{route="/messages/{username}/",method="GET",status="200"} 1', text)
+        self.assertIn('proxy_requests_total{route="/messages/{username}/",method="GET",status="502"} 1', text)
+        self.assertIn('proxy_requests_total{route="/messages/{username}/",method="POST",status="error"} 1', text)
+        self.assertIn('proxy_request_errors_total{route="/messages/{username}/",method="GET"} 1', text)
+        self.assertIn('proxy_backend_duration_seconds_count{route="/messages/{username}/",method="GET"} 2', text)
+        self.assertIn('proxy_backend_duration_seconds_bucket{route="/messages/{username}/",method="GET",le="+Inf"} 2', text)
+        self.assertIn('proxy_error_ratio{route="/messages/{username}/",method="POST"} 1.0', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_series_are_bounded(self):
+        metrics = ProxyMetrics(max_series=2)
+        for path in ('auth/me/', 'friends/', 'encryption/mode/', 'admin/encryption/'):
+            metrics.observe('GET', path, 200, 0.001, 0.001)
+        text = metrics.render_prometheus()
+        self.assertIn(f'route="{OTHER_ROUTE}"', text)
+        self.assertIn(f'proxy_requests_total{{route="{OTHER_ROUTE}",method="GET",status="200"}} 2', text)
+        self.assertNotIn('route="/encryption/mode/"', text)
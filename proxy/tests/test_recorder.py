@@ -0,0 +1,85 @@
+import threading
+import unittest
+from unittest import mock
+
+import app
+from recorder import TrafficRecorder
+
+
+class TrafficRecorderTests(unittest.TestCase):
+    def make_recorder(self, **kwargs):
+        self.entries = []
+        recorder = TrafficRecorder(self.entries.append, **kwargs)
+        self.addCleanup(recorder.stop)
+        return recorder
+
+    def test_sampling(self):
+        recorder = self.make_recorder(sample_rate=0.25)
+        with mock.patch('recorder.random.random', side_effect=[0.1, 0.3, 0.24, 0.9]):
+            self.assertEqual([recorder.sample() for _ in range(4)], [True, False, True, False])
+        self.assertEqual(recorder.stats()['sampled_out'], 2)
+        self.assertTrue(self.make_recorder().sample())
+
+    def test_full_queue_drops_and_counts(self):
+        release = threading.Event()
+        recorder = self.make_recorder(queue_size=2)
+        recorder.sink = lambda entry: release.wait(5) and self.entries.append(entry)
+        started = threading.Event()
+        # The writer takes the first entry off the queue and blocks in the sink.
+        self.assertTrue(recorder.submit(lambda: started.set() or {'n': 0}))
+        started.wait(5)
+        results = [recorder.submit(lambda n=n: {'n': n}) for n in range(1, 5)]
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(recorder.stats()['dropped'], 2)
+        release.set()
+        recorder.flush()
+        self.assertEqual([entry['n'] for entry in self.entries], [0, 1, 2])
+        self.assertEqual(recorder.stats()['recorded'], 3)
+
+    def test_failed_builders_are_counted(self):
+        recorder = self.make_recorder()
+        recorder.submit(lambda: 1 / 0)
+        recorder.submit(lambda: {'ok': True})
+        recorder.flush()
+        self.assertEqual(self.entries, [{'ok': True}])
+        self.assertEqual(recorder.stats()['failed'], 1)
+
+    def test_payload_truncation(self):
+        recorder = self.make_recorder(max_payload_bytes=4)
+        recorder.submit(lambda: {'payload': 'abc'})
+        recorder.submit(lambda: {'payload': 'abcdef'})
+        recorder.flush()
+        self.assertEqual(self.entries[0]['payload'], 'abc')
+        self.assertEqual(self.entries[1]['payload'], {'truncated': True, 'size': 6, 'preview': 'abcd'})
+
+
+class RelayRecordingTests(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+        response = mock.Mock(
+            status_code=201, content=b'{}', encoding='utf-8', headers={'Content-Type': 'application/json'}
+        )
+        patcher = mock.patch.object(app.SESSION, 'request', return_value=response)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self):
+        return self.client.post('/messages/bob/', json={'content': 'hi'}, headers={'Authorization': 'Token alice'})
+
+    def test_unsampled_requests_skip_payload_parsing(self):
+        with mock.patch.object(app, 'PASSTHROUGH', False), mock.patch.object(
+            app.RECORDER, 'sample_rate', 0.0
+        ), mock.patch.object(app, 'extract_payload') as extract:
+            self.assertEqual(self.post().status_code, 201)
+        extract.assert_not_called()
+
+    def test_sampled_payload_is_parsed_on_the_recorder(self):
+        with mock.patch.object(app, 'PASSTHROUGH', False):
+            self.assertEqual(self.post().status_code, 201)
+        app.RECORDER.flush()
+        entry = app.TRAFFIC_LOG.query(direction='client_to_server')[-1]
+        self.assertEqual(entry['payload'], {'content': 'hi'})
+
+
+if __name__ == '__main__':
+    unittest.main()
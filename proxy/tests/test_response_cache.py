@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+
+import app
+from response_cache import CachedResponse, ResponseCache
+
+ROUTE = '/encryption/mode/'
+
+
+def ok(body: bytes = b'{}') -> CachedResponse:
+    return CachedResponse(200, {'Content-Type': 'application/json'}, body)
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache([ROUTE], ttl=30)
+
+    def key(self, authorization='Token alice', query='', accept='application/json'):
+        return self.cache.key_for('GET', ROUTE, query, authorization, accept)
+
+    def test_only_listed_get_routes_are_cacheable(self):
+        self.assertIsNone(self.cache.key_for('POST', ROUTE, '', 'Token alice'))
+        self.assertIsNone(self.cache.key_for('GET', '/messages/', '', 'Token alice'))
+        self.assertEqual(self.key(query='b=2&a=1'), self.key(query='a=1&b=2'))
+
+    def test_identities_are_isolated(self):
+        self.cache.put(self.key('Token alice'), ok(b'alice'), self.cache.generation)
+        self.assertEqual(self.cache.get(self.key('Token alice')).body, b'alice')
+        self.assertIsNone(self.cache.get(self.key('Token bob')))
+        self.assertIsNone(self.cache.get(self.key(None)))
+        self.assertIsNone(self.cache.get(self.key('Token alice', accept='application/msgpack')))
+
+    def test_entries_expire_after_ttl(self):
+        with mock.patch('response_cache.time.monotonic', return_value=100.0):
+            self.cache.put(self.key(), ok(), self.cache.generation)
+        with mock.patch('response_cache.time.monotonic', return_value=129.9):
+            self.assertIsNotNone(self.cache.get(self.key()))
+        with mock.patch('response_cache.time.monotonic', return_value=130.0):
+            self.assertIsNone(self.cache.get(self.key()))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_byte_bound_evicts_least_recently_used(self):
+        cache = ResponseCache([ROUTE], max_bytes=10)
+        keys = [cache.key_for('GET', ROUTE, '', f'Token {name}') for name in ('a', 'b', 'c')]
+        cache.put(keys[0], ok(b'1234'), cache.generation)
+        cache.put(keys[1], ok(b'1234'), cache.generation)
+        cache.get(keys[0])
+        cache.put(keys[2], ok(b'1234'), cache.generation)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual((cache.stats()['bytes'], cache.stats()['evictions']), (8, 1))
+        self.assertFalse(cache.put(keys[1], ok(b'x' * 11), cache.generation))
+
+    def test_uncacheable_responses_are_not_stored(self):
+        self.assertFalse(self.cache.put(self.key(), CachedResponse(404, {}, b''), self.cache.generation))
+        self.assertFalse(self.cache.put(self.key(), CachedResponse(200, {'Cache-Control': 'no-store'}, b''), 0))
+
+    def test_invalidation_during_fetch_is_not_overwritten(self):
+        generation = self.cache.generation
+        self.cache.invalidate()
+        self.assertFalse(self.cache.put(self.key(), ok(b'stale'), generation))
+        self.assertIsNone(self.cache.get(self.key()))
+
+
+class CachedRequestTests(unittest.TestCase):
+    def setUp(self):
+        app.RESPONSE_CACHE.invalidate()
+        self.client = app.app.test_client()
+
+    def get_mode(self):
+        return self.client.get(ROUTE, headers={'Authorization': 'Token alice'})
+
+    def test_hit_after_miss(self):
+        with mock.patch.object(app, 'forward_request', return_value=(200, {'mode': 'PLAINTEXT'}, True, {})) as forward:
+            self.assertEqual(self.get_mode().headers['X-Proxy-Cache'], 'MISS')
+            response = self.get_mode()
+        self.assertEqual(response.headers['X-Proxy-Cache'], 'HIT')
+        self.assertEqual(response.get_json(), {'mode': 'PLAINTEXT'})
+        self.assertEqual(forward.call_count, 1)
+
+    def test_admin_write_during_fetch_does_not_repopulate(self):
+        def fetch_while_admin_writes(*args):
+            self.client.post('/admin/encryption-mode/', json={'mode': 'WEAK_XOR'})
+            return 200, {'mode': 'PLAINTEXT'}, True, {}
+
+        with mock.patch.object(app, 'forward_request', side_effect=fetch_while_admin_writes), mock.patch.object(
+            app, 'stream_request', return_value=('', 200)
+        ), mock.patch.object(app, 'PASSTHROUGH', True):
+            self.assertEqual(self.get_mode().headers['X-Proxy-Cache'], 'MISS')
+        self.assertEqual(app.RESPONSE_CACHE.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
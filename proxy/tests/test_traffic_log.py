@@ -0,0 +1,62 @@
+import unittest
+
+from traffic_log import TrafficLog, parse_log_query
+
+
+def make_entry(path='/messages/', method='GET', direction='client_to_server', timestamp='2024-01-01T00:00:00Z'):
+    return {'path': path, 'method': method, 'direction': direction, 'timestamp': timestamp}
+
+
+class TrafficLogTests(unittest.TestCase):
+    def test_sequence_numbers(self):
+        log = TrafficLog(capacity=4)
+        self.assertEqual([log.append(make_entry()) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(log.last_seq, 3)
+        self.assertEqual(len(log), 3)
+
+    def test_oldest_entries_are_overwritten(self):
+        log = TrafficLog(capacity=3)
+        for _ in range(5):
+            log.append(make_entry())
+        self.assertEqual(len(log), 3)
+        self.assertEqual([entry['seq'] for entry in log.query()], [3, 4, 5])
+        # A cursor that fell out of the buffer resumes at the oldest entry kept.
+        self.assertEqual([entry['seq'] for entry in log.query(after_seq=1)], [3, 4, 5])
+        self.assertEqual([entry['seq'] for entry in log.query(after_seq=4)], [5])
+
+    def test_filters_and_limit(self):
+        log = TrafficLog(capacity=10)
+        log.append(make_entry('/messages/bob/', 'POST'))
+        log.append(make_entry('/friends/', 'GET', 'server_to_client'))
+        log.append(make_entry('/messages/carol/', 'GET', timestamp='2024-01-02T00:00:00Z'))
+
+        self.assertEqual([e['seq'] for e in log.query(path='/messages/')], [1, 3])
+        self.assertEqual([e['seq'] for e in log.query(method='post')], [1])
+        self.assertEqual([e['seq'] for e in log.query(direction='server_to_client')], [2])
+        self.assertEqual([e['seq'] for e in log.query(limit=2)], [1, 2])
+        since = parse_log_query({'since': '2024-01-01T12:00:00Z'}.get)['since']
+        self.assertEqual([e['seq'] for e in log.query(since=since)], [3])
+        self.assertEqual([e['seq'] for e in log.query(until=since)], [1, 2])
+
+    def test_clear_keeps_sequence(self):
+        log = TrafficLog(capacity=3)
+        log.append(make_entry())
+        log.clear()
+        self.assertEqual(len(log), 0)
+        self.assertEqual(log.query(), [])
+        self.assertEqual(log.append(make_entry()), 2)
+
+    def test_capacity_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            TrafficLog(capacity=0)
+
+
+class ParseLogQueryTests(unittest.TestCase):
+    def test_valid(self):
+        params = parse_log_query({'after_seq': '5', 'limit': '10', 'direction': 'client_to_server', 'path': '/x/'}.get)
+        self.assertEqual(params, {'after_seq': 5, 'limit': 10, 'direction': 'client_to_server', 'path': '/x/'})
+
+    def test_invalid(self):
+        for query in ({'limit': '0'}, {'after_seq': '-1'}, {'limit': 'x'}, {'direction': 'up'}, {'since': 'yesterday'}):
+            with self.assertRaises(ValueError):
+                parse_log_query(query.get)
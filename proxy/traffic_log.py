@@ -0,0 +1,127 @@
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+LOG_DIRECTIONS = {'client_to_server', 'server_to_client'}
+
+
+class TrafficLog:
+    """Fixed-capacity, thread-safe ring buffer of captured exchanges.
+
+    Every entry gets a monotonic ``seq``; the entry with sequence ``s`` lives in
+    slot ``s % capacity``, so appends and ``after_seq`` lookups are O(1) and the
+    oldest entries are overwritten once the buffer is full.
+    """
+
+    def __init__(self, capacity: int = 1000, start_seq: int = 1):
+        if capacity < 1:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self._slots: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._next_seq = start_seq
+        self._first_seq = start_seq
+        self._lock = threading.Lock()
+
+    def append(self, entry: Dict[str, Any]) -> int:
+        with self._lock:
+            seq = self._next_seq
+            entry['seq'] = seq
+            self._slots[seq % self.capacity] = entry
+            self._next_seq = seq + 1
+            self._first_seq = max(self._first_seq, self._next_seq - self.capacity)
+            return seq
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._first_seq = self._next_seq
+
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._next_seq - self._first_seq
+
+    def query(
+        self,
+        after_seq: int = 0,
+        limit: Optional[int] = None,
+        path: Optional[str] = None,
+        method: Optional[str] = None,
+        direction: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return matching entries with ``seq > after_seq``, oldest first."""
+        method = method.upper() if method else None
+        limit = self.capacity if limit is None else limit
+        matches: List[Dict[str, Any]] = []
+        with self._lock:
+            for seq in range(max(after_seq + 1, self._first_seq), self._next_seq):
+                if len(matches) >= limit:
+                    break
+                entry = self._slots[seq % self.capacity]
+                if entry_matches(entry, path, method, direction, since, until):
+                    matches.append(entry)
+        return matches
+
+
+def entry_matches(
+    entry: Dict[str, Any],
+    path: Optional[str] = None,
+    method: Optional[str] = None,
+    direction: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> bool:
+    """Apply the ``/logs/`` filters to one entry; ``method`` must already be upper-cased."""
+    if path and not entry['path'].startswith(path):
+        return False
+    if method and entry['method'] != method:
+        return False
+    if direction and entry['direction'] != direction:
+        return False
+    if since is not None or until is not None:
+        timestamp = parse_timestamp(entry['timestamp'])
+        if (since is not None and timestamp < since) or (until is not None and timestamp > until):
+            return False
+    return True
+
+
+def parse_timestamp(value: str) -> float:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def parse_log_query(get: Callable[[str], Optional[str]]) -> Dict[str, Any]:
+    """Validate ``/logs/`` query parameters; raises ``ValueError`` with a client-facing message."""
+    params: Dict[str, Any] = {}
+    for name in ('after_seq', 'limit'):
+        raw = get(name)
+        if raw in (None, ''):
+            continue
+        try:
+            value = int(raw)
+        except ValueError as exc:
+            raise ValueError(f'{name} must be an integer.') from exc
+        if value < 0 or (name == 'limit' and value == 0):
+            raise ValueError(f'{name} must be positive.')
+        params[name] = value
+    direction = get('direction')
+    if direction:
+        if direction not in LOG_DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(sorted(LOG_DIRECTIONS))}.")
+        params['direction'] = direction
+    for name in ('since', 'until'):
+        raw = get(name)
+        if raw:
+            try:
+                params[name] = parse_timestamp(raw)
+            except ValueError as exc:
+                raise ValueError(f'{name} must be an ISO 8601 timestamp.') from exc
+    for name in ('path', 'method'):
+        value = get(name)
+        if value:
+            params[name] = value
+    return params